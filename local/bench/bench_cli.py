@@ -0,0 +1,210 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Benchmark for the local CLI modules.  Each task runs a module script the
+# way Ansible does, as a new Python process fed a JSON argument file, and
+# the harness reports tasks per second and latency percentiles per module,
+# plus the median login phases from the modules' 'timings' result.
+#
+# Start the stand-in router first, e.g.
+#
+#   python local/bench/mock_xr.py --devices 4 --latency 0.05 &
+#   python local/bench/bench_cli.py --devices 4 --tasks 40 --concurrency 8
+#
+# PYTHONPATH must let the modules import ansible, as set up by ansible_env;
+# local/common is added by the harness.
+#
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'library')
+COMMON_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'common')
+
+# module name -> function of task number returning the module arguments
+SCENARIOS = dict(
+    iosxr_cli=lambda n: dict(command='show version'),
+    iosxr_get_facts=lambda n: dict(),
+    iosxr_get_config=lambda n: dict(),
+    # add a package per task; a device runs one install at a time, so
+    # give each device its own tasks with --concurrency <= --devices
+    iosxr_install_package=lambda n: dict(pkgpath='tftp://192.0.2.1/bench',
+                                         pkgname='xrv9k-bench-%d.0.0.0-r612' % n,
+                                         state='present'),
+)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+def median(values):
+    return percentile(sorted(values), 50)
+
+
+class Runner(object):
+
+    def __init__(self, options, workdir):
+        self.options = options
+        self.workdir = workdir
+        self.env = dict(os.environ)
+        path = [COMMON_DIR]
+        if self.env.get('PYTHONPATH'):
+            path.append(self.env['PYTHONPATH'])
+        self.env['PYTHONPATH'] = os.pathsep.join(path)
+        self.env['IOSXR_STATE_DIR'] = os.path.join(workdir, 'state')
+        if options.persistent:
+            self.env['IOSXR_PERSISTENT'] = 'yes'
+
+    def task(self, module, n):
+        """Run one module task, return (seconds, result or None)."""
+        args = dict(host=self.options.host,
+                    port=self.options.port + n % self.options.devices,
+                    username=self.options.username,
+                    password=self.options.password)
+        args.update(SCENARIOS[module](n))
+        argsfile = os.path.join(self.workdir, '%s-%d.json' % (module, n))
+        with open(argsfile, 'w') as fh:
+            json.dump(dict(ANSIBLE_MODULE_ARGS=args), fh)
+
+        start = time.time()
+        proc = subprocess.Popen([self.options.python,
+                                 os.path.join(LIBRARY_DIR, module + '.py'),
+                                 argsfile],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                env=self.env)
+        out, err = proc.communicate()
+        elapsed = time.time() - start
+        try:
+            result = json.loads(out.decode('utf8').strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            result = dict(failed=True, msg=err.decode('utf8', 'replace')[-500:])
+        return elapsed, result
+
+    def run(self, module):
+        latencies = list()
+        failures = list()
+        phases = dict()
+        lock = threading.Lock()
+        queue = list(range(self.options.tasks))
+
+        def worker():
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    n = queue.pop(0)
+                elapsed, result = self.task(module, n)
+                with lock:
+                    latencies.append(elapsed)
+                    if result.get('failed'):
+                        failures.append(result.get('msg'))
+                    for phase, seconds in (result.get('timings') or dict()).items():
+                        if phase != 'commands':
+                            phases.setdefault(phase, list()).append(seconds)
+
+        start = time.time()
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.options.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.time() - start
+
+        latencies.sort()
+        return dict(module=module, tasks=len(latencies),
+                    failed=len(failures), errors=failures[:3],
+                    tasks_per_sec=len(latencies) / wall if wall else 0.0,
+                    p50=percentile(latencies, 50),
+                    p90=percentile(latencies, 90),
+                    p99=percentile(latencies, 99),
+                    max=latencies[-1] if latencies else 0.0,
+                    phases=dict((phase, median(values))
+                                for phase, values in phases.items()))
+
+
+def report(results):
+    header = '%-24s %6s %6s %8s %8s %8s %8s %8s' % (
+        'module', 'tasks', 'failed', 'tasks/s', 'p50', 'p90', 'p99', 'max')
+    print(header)
+    print('-' * len(header))
+    for res in results:
+        print('%-24s %6d %6d %8.2f %8.3f %8.3f %8.3f %8.3f' % (
+            res['module'], res['tasks'], res['failed'], res['tasks_per_sec'],
+            res['p50'], res['p90'], res['p99'], res['max']))
+    print('')
+    print('median login phases (seconds)')
+    for res in results:
+        phases = ' '.join('%s=%.3f' % (phase, seconds)
+                          for phase, seconds in sorted(res['phases'].items()))
+        print('%-24s %s' % (res['module'], phases))
+    for res in results:
+        for error in res['errors']:
+            print('%s failed: %s' % (res['module'], error))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local CLI modules')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2222,
+                        help='first device port, as given to mock_xr.py')
+    parser.add_argument('--devices', type=int, default=1,
+                        help='devices on consecutive ports to spread tasks over')
+    parser.add_argument('--username', default='cisco')
+    parser.add_argument('--password', default='cisco')
+    parser.add_argument('--modules', nargs='+', default=sorted(SCENARIOS),
+                        choices=sorted(SCENARIOS))
+    parser.add_argument('--tasks', type=int, default=20,
+                        help='tasks per module')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='tasks running at the same time')
+    parser.add_argument('--persistent', action='store_true',
+                        help='use the session broker')
+    parser.add_argument('--python', default=sys.executable,
+                        help='interpreter the modules run under')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    options = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='iosxr-bench-')
+    try:
+        runner = Runner(options, workdir)
+        results = [runner.run(module) for module in options.modules]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if options.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        report(results)
+
+if __name__ == '__main__':
+    main()
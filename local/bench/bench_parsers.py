@@ -0,0 +1,128 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Benchmark for the 'show install' parsers in local/common.  Each fixture in
+# local/bench/fixtures is one block of device output; it is repeated with
+# {i} replaced by the block number to build responses of growing size, and
+# the best time of several runs is reported per KB of output.  The parsers
+# are linear if the time per KB stays flat as the output grows; the run
+# fails if it varies by more than --tolerance between sizes.
+#
+#   python local/bench/bench_parsers.py
+#   python local/bench/bench_parsers.py --sizes 100,400,1600 --json
+#
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'common'))
+
+from iosxr_install_parser import *
+
+# fixture name suffix -> parser
+PARSERS = [
+    ('active', package_records),
+    ('inactive', package_records),
+    ('committed', package_records),
+    ('request', parse_install_request),
+    ('log', parse_install_log),
+]
+
+def load_fixtures():
+    fixtures = list()
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        base, ext = os.path.splitext(name)
+        if ext != '.txt':
+            continue
+        for kind, parser in PARSERS:
+            if base.endswith('_' + kind):
+                with open(os.path.join(FIXTURE_DIR, name)) as fh:
+                    fixtures.append((base, parser, fh.read()))
+                break
+    return fixtures
+
+def scale(block, count):
+    return ''.join(block.replace('{i}', str(i)) for i in range(count))
+
+def best_time(parser, response, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        parser(response)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the show install parsers')
+    parser.add_argument('--sizes', default='100,200,400,800,1600',
+                        help='comma separated block counts per response')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per size, the best one counts')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help='largest allowed ratio of the slowest to the '
+                             'fastest time per KB of a parser')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = list()
+    for name, parse, block in load_fixtures():
+        runs = list()
+        for count in sizes:
+            response = scale(block, count)
+            elapsed = best_time(parse, response, args.repeat)
+            kbytes = len(response) / 1024.0
+            runs.append(dict(blocks=count, kbytes=round(kbytes, 1),
+                             seconds=round(elapsed, 6),
+                             us_per_kb=round(1e6 * elapsed / kbytes, 2)))
+        per_kb = [run['us_per_kb'] for run in runs]
+        ratio = max(per_kb) / min(per_kb) if min(per_kb) else None
+        results.append(dict(fixture=name, runs=runs,
+                            ratio=round(ratio, 2) if ratio else None,
+                            linear=ratio is not None and
+                                   ratio <= args.tolerance))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print('%-20s %8s %10s %10s %10s' %
+              ('fixture', 'blocks', 'KB', 'seconds', 'us/KB'))
+        for result in results:
+            for run in result['runs']:
+                print('%-20s %8d %10.1f %10.6f %10.2f' %
+                      (result['fixture'], run['blocks'], run['kbytes'],
+                       run['seconds'], run['us_per_kb']))
+            print('%-20s ratio %s %s' %
+                  (result['fixture'], result['ratio'],
+                   'ok' if result['linear'] else 'NOT LINEAR'))
+
+    if not all(result['linear'] for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Benchmark for the show commands of the remote iosxr_get_facts module.  The
+# commands run through remote/module_utils/iosxr_xrcli.XrCliPool the way the
+# module runs them, but on a plain shell with a stand-in xr_cli that sleeps
+# for the time the command takes on a router (scaled by --scale) and prints
+# --output-lines lines.  Each parallelism level is timed against the serial
+# run (parallelism 1), best of --repeat runs.
+#
+#   python local/bench/bench_remote_facts.py
+#   python local/bench/bench_remote_facts.py --parallelism 1,2,4,8 --json
+#
+# PYTHONPATH must let the helper import ansible, as set up by ansible_env.
+#
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_UTILS_DIR = os.path.join(os.path.dirname(os.path.dirname(BENCH_DIR)),
+                                'remote', 'module_utils')
+sys.path.insert(0, MODULE_UTILS_DIR)
+
+from iosxr_xrcli import *
+
+# iosxr_get_facts commands, in the module's order, and seconds they take
+# on a router with a full table
+COMMANDS = [
+    ('show running-config', 2.0),
+    ('show route', 1.5),
+    ('show platform', 0.2),
+    ('show version', 0.2),
+    ('show inventory all', 0.3),
+    ('show memory summary', 0.2),
+    ('show install active', 0.3),
+    ('show filesystem', 0.2),
+    ('show media', 0.2),
+    ('show license all', 0.3),
+    ('show arp', 0.3),
+    ('show ipv4 int brief', 0.3),
+    ('show ipv6 int brief', 0.3),
+]
+
+def write_xr_cli(bindir, scale, lines):
+    """Write the stand-in xr_cli into bindir."""
+    cases = ''.join("  '%s') delay=%s ;;\n" % (command, seconds * scale)
+                    for command, seconds in COMMANDS)
+    script = ("#!/bin/sh\n"
+              "case \"$1\" in\n%s  *) delay=0 ;;\nesac\n"
+              "sleep $delay\n"
+              "i=0\n"
+              "while [ $i -lt %d ] ; do echo \"$1 line $i\" ; i=$((i+1)) ; done\n"
+              % (cases, lines))
+    path = os.path.join(bindir, 'xr_cli')
+    with open(path, 'w') as fh:
+        fh.write(script)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+def best_time(pool, commands, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        results = pool.run(commands)
+        elapsed = time.time() - start
+        if any(result['rc'] != 0 for result in results):
+            sys.exit('command failed: %s' % [result for result in results
+                                             if result['rc'] != 0][0])
+        if best is None or elapsed < best[0]:
+            best = (elapsed, results)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the remote '
+                                     'iosxr_get_facts commands')
+    parser.add_argument('--parallelism', default='1,2,4,8',
+                        help='comma separated parallelism levels, 1 is '
+                             'the serial baseline')
+    parser.add_argument('--scale', type=float, default=0.25,
+                        help='factor applied to the command times')
+    parser.add_argument('--output-lines', type=int, default=200,
+                        help='lines each command prints')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per level, the best one counts')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.parallelism.split(',')]
+    if 1 not in levels:
+        levels.insert(0, 1)
+
+    bindir = tempfile.mkdtemp(prefix='bench_facts_')
+    try:
+        write_xr_cli(bindir, args.scale, args.output_lines)
+        shell = 'PATH=%s:${PATH} ; export PATH ; exec /bin/sh' % bindir
+        commands = [command for command, _ in COMMANDS]
+        runs = list()
+        for level in levels:
+            elapsed, results = best_time(XrCliPool(level, shell), commands,
+                                         args.repeat)
+            runs.append(dict(parallelism=level, seconds=round(elapsed, 3),
+                             slowest=max(results,
+                                         key=lambda r: r['seconds'])['command']))
+    finally:
+        shutil.rmtree(bindir)
+
+    serial = [run for run in runs if run['parallelism'] == 1][0]['seconds']
+    for run in runs:
+        run['speedup'] = round(serial / run['seconds'], 2)
+
+    if args.json:
+        print(json.dumps(runs, indent=2))
+    else:
+        print('%-12s %10s %8s  %s' % ('parallelism', 'seconds', 'speedup',
+                                      'slowest command'))
+        for run in runs:
+            print('%-12d %10.3f %8.2f  %s' % (run['parallelism'],
+                                              run['seconds'], run['speedup'],
+                                              run['slowest']))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Stand-in IOS-XR CLI over SSH for measuring the local modules without a
+# router.  It answers the commands the modules send with canned output:
+#
+#   - exec, config and admin prompts (RP/0/RP0/CPU0:<hostname>#,
+#     ...(config)#, ...(admin)#)
+#   - 'reload' asks [confirm], 'clear logging' asks [confirm] [y/n],
+#     'commit replace' and reload-type 'install activate' ask [yes/no]
+#   - show version (eXR, or classic XR with --classic), show running-config
+#     of --config-lines lines, and any other show command answered with
+#     --output-lines lines
+#   - install add/remove/activate/deactivate/update/commit run in the
+#     background for --install-time seconds and are reported by
+#     show install request/active/inactive/committed/log
+#
+# Every listening port is a separate device with its own install state.
+# Any username and password are accepted.
+#
+# Usage: python mock_xr.py [--port 2222] [--devices 1] [--latency 0.05] ...
+#
+
+import argparse
+import os
+import re
+import socket
+import sys
+import threading
+import time
+
+import paramiko
+
+EXR_VERSION = """Cisco IOS XR Software, Version 6.1.2
+Copyright (c) 2013-2016 by Cisco Systems, Inc.
+
+Build Information:
+ Built By     : bench
+ Built On     : Mon Nov 21 10:00:00 PST 2016
+ Build Host   : iox-bench
+ Workspace    : /auto/srcarchive/bench
+ Version      : 6.1.2
+ Location     : /opt/cisco/XR/packages/
+
+cisco IOS-XRv 9000 () processor
+System uptime is %(uptime)s
+"""
+
+CLASSIC_VERSION = """Cisco IOS XR Software, Version 5.3.3[Default]
+Copyright (c) 2016 by Cisco Systems, Inc.
+
+ROM: System Bootstrap, Version 2.04(20140424:063844) [ASR9K ROMMON],
+
+%(hostname)s uptime is %(uptime)s
+System image file is "disk0:asr9k-os-mbi-5.3.3/0x100305/mbiasr9k-rsp3.vm"
+
+cisco ASR9K Series (Intel 686 F6M14S4) processor with 12582912K bytes of memory.
+"""
+
+BASE_PACKAGES = ['xrv9k-xr-6.1.2', 'xrv9k-mgbl-3.0.0.0-r612']
+
+INVALID_INPUT = "% Invalid input detected at '^' marker."
+
+
+def package_names(args):
+    """Return the package names in install command arguments."""
+    names = list()
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in ('source', 'version'):
+            skip = True
+        elif arg not in ('synchronous', 'noprompt', 'prepare'):
+            names.append(re.sub(r'(\.x86_64)?\.(rpm|iso)$', '', arg))
+    return names
+
+def uptime(seconds):
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    return '%d days, %d hours, %d minutes' % (days, hours, rest // 60)
+
+
+class Device(object):
+    """Install state of one emulated router, shared by its sessions."""
+
+    def __init__(self, hostname, options):
+        self.hostname = hostname
+        self.options = options
+        self.booted = time.time() - 86400
+        self.lock = threading.Lock()
+        self.active = list(BASE_PACKAGES)
+        self.inactive = list()
+        self.committed = list(BASE_PACKAGES)
+        self.operation = 0
+        self.running = None
+        self.log = dict()
+
+    def show_version(self):
+        text = CLASSIC_VERSION if self.options.classic else EXR_VERSION
+        return text % dict(hostname=self.hostname,
+                           uptime=uptime(time.time() - self.booted))
+
+    def install(self, verb, args):
+        with self.lock:
+            self._settle()
+            if self.running is not None:
+                return ('Install operation %d is still in progress, '
+                        'try again later\n' % self.running[0])
+            self.operation += 1
+            op = self.operation
+            self.running = (op, time.time() + self.options.install_time,
+                            verb, args)
+            self.log[op] = 'Install operation %d started by bench:\n  install %s %s\n' % (
+                op, verb, ' '.join(args))
+        return ('Install operation %d started by bench:\n  install %s %s\n'
+                'Install operation will continue in the background\n' %
+                (op, verb, ' '.join(args)))
+
+    # apply a finished background operation
+    def _settle(self):
+        if self.running is None or time.time() < self.running[1]:
+            return
+        op, _, verb, args = self.running
+        self.running = None
+        names = package_names(args)
+        if verb in ('add', 'update'):
+            for name in names:
+                if name not in self.inactive and name not in self.active:
+                    self.inactive.append(name)
+            if verb == 'update':
+                self._move(names, self.inactive, self.active)
+        elif verb == 'activate':
+            self._move(names, self.inactive, self.active)
+        elif verb == 'deactivate':
+            self._move(names, self.active, self.inactive)
+        elif verb == 'remove':
+            self.inactive = [p for p in self.inactive if p not in names]
+        elif verb == 'commit':
+            self.committed = list(self.active)
+        self.log[op] += 'Install operation %d finished successfully\n' % op
+
+    def _move(self, names, source, dest):
+        for name in names:
+            if name in source:
+                source.remove(name)
+                dest.append(name)
+
+    def show_install(self, what):
+        with self.lock:
+            self._settle()
+            if what == 'request':
+                if self.running is None:
+                    return 'No install operation in progress\n'
+                op, done, _, _ = self.running
+                left = max(0.0, done - time.time())
+                percent = 100 - int(100 * left / max(self.options.install_time, 0.001))
+                return 'The install operation %d is %d%% complete\n' % (op, percent)
+            if what.startswith('log'):
+                words = what.split()
+                ops = [int(words[1])] if len(words) > 1 else sorted(self.log)
+                return ''.join(self.log.get(op, '') for op in ops)
+            kind = what.split()[0] if what else 'active'
+            packages = dict(active=self.active, inactive=self.inactive,
+                            committed=self.committed).get(kind)
+            if packages is None:
+                return INVALID_INPUT + '\n'
+            return ('Node 0/RP0/CPU0 [RP]\n  Boot Partition: xr_lv0\n'
+                    '  %s Packages: %d\n%s' %
+                    (kind.capitalize(), len(packages),
+                     ''.join('    %s\n' % p for p in packages)))
+
+
+class Server(paramiko.ServerInterface):
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OR_UNKNOWN_CHANNEL_TYPE_REQUEST
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+
+class Session(object):
+    """One interactive CLI session."""
+
+    def __init__(self, channel, device, options):
+        self.channel = channel
+        self.device = device
+        self.options = options
+        self.mode = ''
+        self.confirm = None
+
+    def prompt(self):
+        return 'RP/0/RP0/CPU0:%s%s#' % (self.device.hostname, self.mode)
+
+    def write(self, text):
+        self.channel.sendall(text.replace('\n', '\r\n').encode('utf8'))
+
+    def run(self):
+        self.write('\n\n' + self.prompt())
+        pending = ''
+        last = ''
+        while True:
+            data = self.channel.recv(65536)
+            if not data:
+                return
+            for char in data.decode('utf8', 'replace'):
+                # '\r\n' ends one line, a lone '\r' or '\n' ends one each
+                if char == '\n' and last == '\r':
+                    last = ''
+                    continue
+                last = char
+                if char in '\r\n':
+                    line, pending = pending, ''
+                    self.write(line + '\n')
+                    if self.options.latency:
+                        time.sleep(self.options.latency)
+                    reply = self.answer(line.strip())
+                    if reply is None:
+                        self.channel.close()
+                        return
+                    self.write(reply)
+                else:
+                    pending += char
+
+    # output followed by the next prompt, None to drop the session
+    def answer(self, line):
+        if self.confirm is not None:
+            action, self.confirm = self.confirm, None
+            if line.lower() in ('', 'y', 'yes'):
+                return action()
+            return self.prompt()
+
+        words = line.split()
+        if not words:
+            return self.prompt()
+        if words[0] == 'show':
+            return self.show(words[1:]) + self.prompt()
+        if self.mode:
+            return self.config(line, words)
+        return self.exec_(line, words)
+
+    def show(self, words):
+        what = ' '.join(words)
+        if what == 'version':
+            return self.device.show_version()
+        if what in ('running-config', 'run'):
+            return self.running_config()
+        if words[:1] == ['install']:
+            return self.device.show_install(' '.join(words[1:]))
+        if what.startswith('config commit changes'):
+            return 'Building configuration...\n!! IOS XR Configuration 6.1.2\nend\n'
+        return ''.join('%s line %d\n' % (what, n)
+                       for n in range(self.options.output_lines))
+
+    def running_config(self):
+        lines = ['Building configuration...',
+                 '!! IOS XR Configuration 6.1.2',
+                 'hostname %s' % self.device.hostname]
+        lines.extend('interface GigabitEthernet0/0/0/%d\n description bench %d\n!' % (n, n)
+                     for n in range(self.options.config_lines // 3))
+        lines.append('end')
+        return '\n'.join(lines) + '\n'
+
+    def exec_(self, line, words):
+        verb = words[0]
+        if verb == 'terminal':
+            return self.prompt()
+        if verb in ('configure', 'conf'):
+            self.mode = '(config)'
+            return self.prompt()
+        if verb == 'admin':
+            self.mode = '(admin)' if self.options.classic else ''
+            return self.prompt()
+        if verb == 'exit':
+            return None
+        if verb == 'reload':
+            self.confirm = self.reload
+            return 'Proceed with reload? [confirm]'
+        if verb == 'clear' and words[1:2] == ['logging']:
+            self.confirm = lambda: self.prompt()
+            return 'Clear logging buffer [confirm] [y/n] :'
+        if verb == 'install' and len(words) > 1:
+            reply = self.device.install(words[1], words[2:])
+            if words[1] == 'activate' and self.options.activate_prompt:
+                self.confirm = lambda: reply + self.prompt()
+                return ('This install operation will reload the system, '
+                        'continue?\n [yes/no]:[yes] ')
+            return reply + self.prompt()
+        if verb in ('netconf', 'xml', 'run'):
+            return self.prompt()
+        return INVALID_INPUT + '\n' + self.prompt()
+
+    # the prompt comes back, then the session drops as the device goes down
+    def reload(self):
+        self.device.booted = time.time()
+        timer = threading.Timer(1.0, self.channel.close)
+        timer.daemon = True
+        timer.start()
+        return self.prompt()
+
+    def config(self, line, words):
+        verb = words[0]
+        if verb in ('end', 'abort'):
+            self.mode = ''
+            return self.prompt()
+        if verb == 'exit':
+            self.mode = '' if self.mode in ('(config)', '(admin)') else '(config)'
+            return self.prompt()
+        if line == 'commit replace':
+            self.confirm = lambda: self.prompt()
+            return ('This commit will replace or remove the entire running '
+                    'configuration.\nDo you wish to proceed? [no]: ')
+        if self.mode == '(admin)':
+            return self.exec_(line, words)
+        if verb == 'interface':
+            self.mode = '(config-if)'
+        return self.prompt()
+
+
+def serve_device(sock, device, host_key, options):
+    while True:
+        client, _ = sock.accept()
+        thread = threading.Thread(target=handle, args=(client, device, host_key, options))
+        thread.daemon = True
+        thread.start()
+
+def handle(client, device, host_key, options):
+    transport = paramiko.Transport(client)
+    transport.add_server_key(host_key)
+    try:
+        transport.start_server(server=Server())
+        channel = transport.accept(30)
+        if channel is None:
+            return
+        if options.login_delay:
+            time.sleep(options.login_delay)
+        Session(channel, device, options).run()
+    except (EOFError, socket.error, paramiko.SSHException):
+        pass
+    finally:
+        transport.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in IOS-XR CLI SSH server')
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2222,
+                        help='first port, one per device')
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--hostname', default='mock')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds before each command is answered')
+    parser.add_argument('--login-delay', type=float, default=0.0,
+                        help='seconds before the first prompt')
+    parser.add_argument('--output-lines', type=int, default=20,
+                        help='lines answered to other show commands')
+    parser.add_argument('--config-lines', type=int, default=300,
+                        help='lines of show running-config')
+    parser.add_argument('--install-time', type=float, default=1.0,
+                        help='seconds an install operation runs')
+    parser.add_argument('--activate-prompt', action='store_true',
+                        help='ask [yes/no] on install activate')
+    parser.add_argument('--classic', action='store_true',
+                        help='answer as 32-bit (classic) IOS-XR')
+    parser.add_argument('--host-key', default=os.path.expanduser('~/.ansible/iosxr/mock_xr.key'))
+    options = parser.parse_args()
+
+    if os.path.exists(options.host_key):
+        host_key = paramiko.RSAKey(filename=options.host_key)
+    else:
+        host_key = paramiko.RSAKey.generate(2048)
+        if not os.path.isdir(os.path.dirname(options.host_key)):
+            os.makedirs(os.path.dirname(options.host_key))
+        host_key.write_private_key_file(options.host_key)
+
+    threads = list()
+    for n in range(options.devices):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((options.bind, options.port + n))
+        sock.listen(128)
+        hostname = options.hostname if options.devices == 1 else '%s%d' % (options.hostname, n)
+        device = Device(hostname, options)
+        thread = threading.Thread(target=serve_device, args=(sock, device, host_key, options))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+        sys.stdout.write('%s listening on %s:%d\n' % (hostname, options.bind, options.port + n))
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
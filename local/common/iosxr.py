@@ -17,11 +17,23 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import fcntl
+import inspect
+import json
+import os
 import re
+import socket
+import time
 
 from ansible.module_utils.basic import AnsibleModule, env_fallback, get_exception
 from ansible.module_utils.shell import Shell, ShellError, HAS_PARAMIKO
-from ansible.module_utils.netcfg import parse
+from ansible.module_utils.netcfg import NetworkConfig
+
+try:
+    import paramiko
+except ImportError:
+    # reported by get_module() through HAS_PARAMIKO
+    pass
 
 NET_PASSWD_RE = re.compile(r"[\r\n]?password: $", re.I)
 
@@ -31,6 +43,8 @@ NET_COMMON_ARGS = dict(
     username=dict(fallback=(env_fallback, ['ANSIBLE_NET_USERNAME'])),
     password=dict(no_log=True, fallback=(env_fallback, ['ANSIBLE_NET_PASSWORD'])),
     ssh_keyfile=dict(fallback=(env_fallback, ['ANSIBLE_NET_SSH_KEYFILE']), type='path'),
+    timings_file=dict(fallback=(env_fallback, ['IOSXR_TIMINGS_FILE']), type='path'),
+    persistent=dict(fallback=(env_fallback, ['IOSXR_PERSISTENT']), type='bool', default=False),
     provider=dict()
 )
 
@@ -49,6 +63,52 @@ CLI_ERRORS_RE = [
     re.compile(r"'[^']' +returned error code: ?\d+"),
 ]
 
+# commands that may stop for a confirmation or change the session in a way
+# later commands depend on; these are never pipelined
+CLI_INTERACTIVE_RE = re.compile(
+    r"^\s*(?:(?:y|yes|n|no|exit|end)?\s*$|"
+    r"(?:reload|install|clear|copy|delete|format|commit\s+replace|"
+    r"rollback|crypto|admin|run|conf(?:ig(?:ure)?)?)\b)", re.I)
+
+# commands that take the session from exec mode to a mode the commands
+# after them run in
+CLI_MODE_RE = re.compile(r"^\s*(?:admin|conf(?:ig(?:ure)?)?(?:\s+\w+)?)\s*$",
+                         re.I)
+
+# commands that only read device state and can be sent again after a
+# reconnect without side effects
+CLI_READ_ONLY_RE = re.compile(
+    r"^\s*(?:show|terminal|dir|more|ping|traceroute)\b", re.I)
+
+# commands written to the channel per pipelined batch, small enough not to
+# overrun the vty typeahead buffer
+PIPELINE_BATCH = 16
+
+# bytes asked of the channel per receive
+RECV_SIZE = 8192
+
+# end of a chunk that may be the start of a sequence Shell.strip() removes,
+# '\x1b[?1h\x1b=' or a backspace and the character it erases
+UNFINISHED_ESCAPE_RE = re.compile(r"(\x1b(\[[0-9;?]*([A-Za-z]\x1b?)?)?|\x08)$")
+
+# seconds between SSH keepalives, so a session through a NAT or firewall
+# stays up during long waits and a dead peer is noticed
+KEEPALIVE_INTERVAL = int(os.environ.get('IOSXR_KEEPALIVE_INTERVAL', 30))
+
+# times Cli reopens a dropped session for one send()
+RECONNECT_RETRIES = 2
+
+# Shell.open() takes the connect timeout in Ansible 2.2, Shell() in 2.3
+if hasattr(inspect, 'getfullargspec'):
+    SHELL_OPEN_TIMEOUT = 'timeout' in inspect.getfullargspec(Shell.open).args
+else:
+    SHELL_OPEN_TIMEOUT = 'timeout' in inspect.getargspec(Shell.open).args
+
+# already scanned text that is scanned again with the next chunk; prompt and
+# error patterns never span lines, so only the unfinished last line (capped
+# at this size) can complete a match
+MATCH_OVERLAP = 512
+
 
 def to_list(val):
     if isinstance(val, (list, tuple)):
@@ -58,12 +118,473 @@ def to_list(val):
     else:
         return list()
 
+def is_interactive(commands):
+    """Return True if any of commands prompts or changes device state."""
+    return any(CLI_INTERACTIVE_RE.search(str(cmd)) for cmd in to_list(commands))
+
+def is_config_prompt(prompt):
+    """Return True for a configuration mode prompt, e.g. 'r1(config)#'."""
+    return '(' in prompt and 'config' in prompt
+
+def is_read_only(commands):
+    """Return True if every one of commands can safely be sent twice."""
+    return all(CLI_READ_ONLY_RE.search(str(cmd)) for cmd in to_list(commands))
+
+def can_pipeline(commands):
+    """Return True if commands can be written to the device in one go."""
+    commands = to_list(commands)
+    if len(commands) < 2:
+        return False
+    return not is_interactive(commands)
+
+
+class ConnectError(ShellError):
+    """No session could be opened to the device."""
+    pass
+
+
+class CommandError(ShellError):
+    """The device answered a command with an error.  The response has been
+    read up to the prompt, so the session is still in sync and can be used
+    for the next command.
+    """
+    pass
+
+
+class StreamMatch(object):
+
+    def __init__(self, kind, index, start, end, text):
+        self.kind = kind
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def group(self):
+        return self.text
+
+
+class StreamMatcher(object):
+    """Incremental prompt and error matcher for a growing response.
+
+    All prompt and error regexes are folded into one alternation per set of
+    regex flags, and each feed() only scans the new text plus the
+    unfinished last line of what came before, so reading a response is
+    linear in its size.  Matches carry absolute offsets into the response,
+    so callers can slice it instead of searching it again.
+    """
+
+    def __init__(self, prompts, errors, overlap=MATCH_OVERLAP):
+        self.overlap = overlap
+        self.offset = 0
+        self._carry = ''
+        self._regexes = list()
+        self._tail_regexes = list()
+
+        # prompts anchored with '$' can only match on the last line, so
+        # they are kept apart and never run over the body of the output
+        groups = dict()
+        for kind, regexes in (('error', errors), ('prompt', prompts)):
+            for index, regex in enumerate(regexes):
+                name = '%s%d' % (kind[0], index)
+                tail = kind == 'prompt' and regex.pattern.endswith('$')
+                groups.setdefault((regex.flags, tail), list()).append(
+                    '(?P<%s>%s)' % (name, regex.pattern))
+        for (flags, tail), patterns in groups.items():
+            regex = re.compile('|'.join(patterns), flags)
+            if tail:
+                self._tail_regexes.append(regex)
+            else:
+                self._regexes.append(regex)
+
+    def feed(self, data):
+        """Scan data, the text received since the last call.  Returns
+        the first StreamMatch found, errors taking precedence, or None.
+        """
+        window = self._carry + data
+        found = self.search(window, self.offset - len(self._carry))
+        self.offset += len(data)
+
+        newline = window.rfind('\n')
+        self._carry = window[newline + 1:][-self.overlap:]
+        return found
+
+    def search(self, text, base=0):
+        """Search a standalone text, offsets are relative to base."""
+        # start of the last line, keeping the newline before it for the
+        # optional [\r\n] that leads the prompt patterns
+        last = text.rfind('\n', 0, len(text) - 1)
+        last = max(last, 0)
+
+        found = None
+        for regex, start in ([(r, 0) for r in self._regexes] +
+                             [(r, last) for r in self._tail_regexes]):
+            m = regex.search(text, start)
+            if m is None:
+                continue
+            name = [k for k, v in m.groupdict().items() if v is not None][0]
+            match = StreamMatch('error' if name[0] == 'e' else 'prompt',
+                                int(name[1:]), base + m.start(),
+                                base + m.end(), m.group())
+            if found is None:
+                found = match
+            elif match.kind == found.kind and match.start < found.start:
+                found = match
+            elif match.kind == 'error' and found.kind == 'prompt':
+                found = match
+        return found
+
+
+class IosxrShell(Shell):
+    """Shell with an incremental reader and a pipelined send mode.
+
+    receive() runs every chunk through a StreamMatcher instead of matching
+    the prompt and error regexes against the accumulated response, and
+    receive_stream() hands the lines out as they arrive.
+
+    send_batch() writes a batch of commands in one go and splits the
+    returned stream at the prompt lines, so a list of commands costs one
+    round trip per batch instead of one per command.
+
+    Only Shell.open() and the helpers it shares with Ansible 2.2 and 2.3
+    are used from the base class, so it runs on both.
+    """
+
+    def __init__(self, prompts_re=None, errors_re=None, kickstart=True):
+        # not Shell.__init__(): the one of Ansible 2.3 installs a SIGALRM
+        # handler, which fails outside the main thread (in the session
+        # broker) and is only used by the send() replaced here
+        self.ssh = None
+        self.shell = None
+        self.kickstart = kickstart
+        self._matched_prompt = None
+        self.prompts = prompts_re or list()
+        self.errors = errors_re or list()
+        self._timeout = None
+        # seconds spent per login phase, and one entry per command
+        self.phases = dict()
+        self.timings = list()
+        self._first_byte = None
+        self._received = 0
+        self._opened = None
+        self._login_done = None
+
+    def open(self, host, port=22, username=None, password=None, timeout=10,
+             key_filename=None, pkey=None, look_for_keys=None,
+             allow_agent=False, key_policy="loose"):
+        """Shell.open(), timed in two phases: 'connect' up to the shell
+        channel (TCP connect and SSH login) and 'shell' up to the first
+        prompt, split where Shell.open() first calls receive().
+        """
+        kwargs = dict(port=port, username=username, password=password,
+                      key_filename=key_filename, pkey=pkey,
+                      look_for_keys=look_for_keys, allow_agent=allow_agent,
+                      key_policy=key_policy)
+        if SHELL_OPEN_TIMEOUT:
+            kwargs['timeout'] = timeout
+        else:
+            self._timeout = timeout
+        self._opened = time.time()
+        self._login_done = None
+        try:
+            super(IosxrShell, self).open(host, **kwargs)
+        finally:
+            now = time.time()
+            login_done = self._login_done or now
+            self.phases['connect'] = login_done - self._opened
+            if self._login_done is not None:
+                self.phases['shell'] = now - login_done
+            self._opened = None
+        if KEEPALIVE_INTERVAL > 0:
+            self.ssh.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+
+    def alive(self):
+        """Return False once the channel or its transport is gone."""
+        if self.shell is None or self.shell.closed:
+            return False
+        if self.shell.exit_status_ready():
+            return False
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _decode(self, data):
+        if not isinstance(data, str):
+            data = data.decode('utf8', 'replace')
+        return data
+
+    # stripped text chunks from the channel
+    def _chunks(self, cmd=None):
+        held = ''
+        while True:
+            data = self.shell.recv(RECV_SIZE)
+            if not data:
+                raise ShellError('connection closed by remote device', command=cmd)
+            if self._first_byte is None:
+                self._first_byte = time.time()
+            self._received += len(data)
+
+            # keep an escape sequence cut by the chunk boundary for the
+            # next round so strip() sees all of it
+            data = held + self._decode(data)
+            match = UNFINISHED_ESCAPE_RE.search(data)
+            if match:
+                data, held = data[:match.start()], match.group()
+            else:
+                held = ''
+            yield self.strip(data)
+
+    def _start(self):
+        self._first_byte = None
+        self._received = 0
+        return time.time()
+
+    # time to first byte and to the prompt, measured from the send
+    def _record(self, cmd, start, size=None):
+        if cmd is None:
+            return
+        now = time.time()
+        first = self._first_byte or now
+        self.timings.append(dict(command=str(cmd),
+                                 first_byte=round(first - start, 4),
+                                 last_byte=round(now - start, 4),
+                                 bytes=self._received if size is None else size))
+
+    def receive(self, cmd=None):
+        if self._opened is not None and self._login_done is None:
+            self._login_done = time.time()
+        start = self._start()
+        matcher = StreamMatcher(self.prompts, self.errors)
+        stream = self._chunks(cmd)
+        chunks = list()
+        handled = False
+
+        for data in stream:
+            chunks.append(data)
+
+            if hasattr(cmd, 'prompt') and not handled:
+                handled = self.handle_prompt(data, cmd)
+
+            match = matcher.feed(data)
+            if match is None:
+                continue
+
+            resp = ''.join(chunks)
+            if match.kind == 'error':
+                line = resp.rfind('\n', 0, match.start) + 1
+                error = self._read_to_prompt(stream, resp[line:])
+                raise CommandError('matched error in response: %s' % error,
+                                 command=cmd)
+
+            self._matched_prompt = match.group()
+            self._record(cmd, start)
+            return self.sanitize(cmd, resp[:match.start])
+
+    # the device prints its prompt after an error message too; reading on
+    # to it keeps the rest of the response from being taken for the
+    # answer to the next command
+    def _read_to_prompt(self, stream, text):
+        matcher = StreamMatcher(self.prompts, [])
+        match = matcher.feed(text)
+        while match is None:
+            data = next(stream)
+            text += data
+            match = matcher.feed(data)
+        self._matched_prompt = match.group()
+        return text[:match.start].strip()
+
+    # Shell.send() of Ansible 2.2; the one of 2.3 takes a dict per command
+    # and returns (rc, out, err)
+    def send(self, commands):
+        responses = list()
+        try:
+            for command in to_list(commands):
+                cmd = '%s\r' % str(command)
+                self.shell.sendall(cmd)
+                responses.append(self.receive(command))
+        except socket.timeout:
+            raise ShellError("timeout trying to send command: %s" % cmd)
+        except socket.error:
+            e = get_exception()
+            raise ShellError("problem sending command to host: %s" % str(e))
+        return responses
+
+    def receive_stream(self, cmd=None):
+        """Yield the response line by line as it arrives.  Only the
+        unfinished last line is held, so memory use does not grow with
+        the size of the response.
+        """
+        start = self._start()
+        matcher = StreamMatcher(self.prompts, self.errors)
+        stream = self._chunks(cmd)
+        echo = str(cmd) if cmd is not None else None
+        pending = ''
+        offset = 0
+
+        for data in stream:
+            pending += data
+            match = matcher.feed(data)
+
+            if match is not None and match.kind == 'error':
+                start = max(match.start - offset, 0)
+                line = pending.rfind('\n', 0, start) + 1
+                error = self._read_to_prompt(stream, pending[line:])
+                raise CommandError('matched error in response: %s' % error,
+                                 command=cmd)
+
+            if match is not None:
+                lines = pending[:match.start - offset].split('\n')
+                if not lines[-1].strip():
+                    lines.pop()
+            else:
+                lines = pending.split('\n')
+                pending = lines.pop()
+                offset = matcher.offset - len(pending)
+
+            for line in lines:
+                line = line.rstrip('\r')
+                if echo is None or not line.startswith(echo):
+                    yield line
+
+            if match is not None:
+                self._matched_prompt = match.group()
+                self._record(cmd, start)
+                return
+
+    def send_stream(self, command):
+        """Send one command and yield its response line by line."""
+        try:
+            self.shell.sendall('%s\r' % str(command))
+            for line in self.receive_stream(command):
+                yield line
+        except socket.timeout:
+            raise ShellError("timeout trying to send command: %s" % command)
+        except socket.error:
+            e = get_exception()
+            raise ShellError("problem sending command to host: %s" % str(e))
+
+    # output ends where the prompt match starts, so only echoed command
+    # lines have to be dropped
+    def sanitize(self, cmd, resp):
+        if cmd is None:
+            return resp
+        cmd = str(cmd)
+        return '\n'.join(line for line in resp.splitlines()
+                         if not line.startswith(cmd))
+
+    def send_batch(self, commands):
+        commands = [str(command) for command in to_list(commands)]
+        responses = list()
+        try:
+            for i in range(0, len(commands), PIPELINE_BATCH):
+                batch = commands[i:i + PIPELINE_BATCH]
+                self.shell.sendall(''.join('%s\r' % cmd for cmd in batch))
+                responses.extend(self.receive_batch(batch))
+        except socket.timeout:
+            raise ShellError("timeout trying to send command: %s" %
+                             commands[len(responses)])
+        except socket.error:
+            e = get_exception()
+            raise ShellError("problem sending command to host: %s" % str(e))
+
+        # the whole batch has been read, so reporting the first failure
+        # leaves the session in sync
+        for cmd, (resp, error) in zip(commands, responses):
+            if error:
+                raise CommandError('matched error in response: %s' % error,
+                                 command=cmd)
+        return [resp for resp, error in responses]
+
+    def receive_batch(self, commands):
+        # every prompt seen so far starts with the same node/host stem,
+        # which keeps output lines ending in '#' or '>' from being taken
+        # for a prompt
+        stem = re.split(r'[\(#>]', (self._matched_prompt or '').strip())[0]
+        prompts = StreamMatcher(self.prompts, [])
+        errors = StreamMatcher([], self.errors)
+
+        # a pipelined command is timed from the start of its batch, and
+        # its bytes are counted per chunk
+        start = self._start()
+        mark = 0
+
+        responses = list()
+        lines = list()
+        pending = ''
+        while len(responses) < len(commands):
+            data = self.shell.recv(RECV_SIZE)
+            if not data:
+                raise ShellError('connection closed by remote device')
+            if self._first_byte is None:
+                self._first_byte = time.time()
+            self._received += len(data)
+            pending += self.strip(self._decode(data))
+            complete = pending.split('\n')
+            pending = complete.pop()
+            for line in complete:
+                line = line.rstrip('\r')
+                nxt = len(responses) + 1
+                if nxt < len(commands) and self._is_boundary(prompts, line, stem, commands[nxt]):
+                    responses.append(self._collect(errors, commands[nxt - 1], lines, commands))
+                    self._record(commands[nxt - 1], start, self._received - mark)
+                    mark = self._received
+                    lines = list()
+                else:
+                    lines.append(line)
+            # the final prompt is not followed by a newline
+            if (len(responses) == len(commands) - 1 and
+                    self._is_boundary(prompts, pending, stem, None)):
+                responses.append(self._collect(errors, commands[-1], lines, commands))
+                self._record(commands[-1], start, self._received - mark)
+        return responses
+
+    def _is_boundary(self, prompts, line, stem, echo):
+        if not line.startswith(stem):
+            return False
+        if echo and line.rstrip().endswith(echo):
+            line = line.rstrip()[:-len(echo)]
+        match = prompts.search(line)
+        if match:
+            self._matched_prompt = match.group()
+            return True
+        return False
+
+    # drop the command echo at the start of the response; typeahead may
+    # be echoed there too, ahead of the output
+    def _collect(self, errors, cmd, lines, commands):
+        start = 0
+        while start < len(lines) and (lines[start].startswith(cmd) or
+                                      lines[start].strip() in commands):
+            start += 1
+        resp = '\n'.join(lines[start:])
+        if errors.search(resp):
+            return (resp, resp)
+        return (resp, None)
+
 
 class Cli(object):
+    """CLI session that reopens itself when the device drops it.
+
+    Before each send() a dead session is reopened, the terminal settings
+    sent so far are applied again and admin mode is entered again if the
+    lost session was in it.  A session lost in configuration mode is not
+    reopened, as its uncommitted changes are gone with it.  If the
+    session breaks while commands are in flight, the ones not answered
+    yet are sent again on a new session, provided they are all
+    read-only; anything else could run twice, so the error is raised
+    instead.
+    """
 
     def __init__(self, module):
         self.module = module
         self.shell = None
+        self.terminal = list()
+        # mode commands in effect, and the exec prompt seen at login
+        self.modes = list()
+        self.base_prompt = None
+        # login phase seconds, summed over reconnects, and per command
+        # entries kept across shells
+        self.phases = dict()
+        self.timings = list()
 
     def connect(self, **kwargs):
         host = self.module.params['host']
@@ -73,20 +594,97 @@ class Cli(object):
         password = self.module.params['password']
         key_filename = self.module.params['ssh_keyfile']
 
+        shell = None
         try:
-            self.shell = Shell(kickstart=False, prompts_re=CLI_PROMPTS_RE, errors_re=CLI_ERRORS_RE)
-            self.shell.open(host, port=port, username=username, password=password, key_filename=key_filename)
-        except ShellError:
+            shell = IosxrShell(kickstart=False, prompts_re=CLI_PROMPTS_RE, errors_re=CLI_ERRORS_RE)
+            shell.timings = self.timings
+            self.shell = shell
+            shell.open(host, port=port, username=username, password=password, key_filename=key_filename)
+            self.base_prompt = (shell._matched_prompt or '').strip()
+        except Exception:
+            # Shell.open() lets socket and paramiko errors through
             e = get_exception()
             msg = 'failed to connect to %s:%s - %s' % (host, port, str(e))
-            self.module.fail_json(msg=msg)
+            raise ConnectError(msg)
+        finally:
+            # a shell that could not even be made has no phases to add
+            if shell is not None:
+                for phase, seconds in shell.phases.items():
+                    self.phases[phase] = round(self.phases.get(phase, 0) + seconds, 4)
+
+    def reconnect(self):
+        # the commands after a configure must not run in exec mode; the
+        # session opened next time around starts afresh
+        if any(mode.lower() != 'admin' for mode in self.modes):
+            self.modes = list()
+            raise ConnectError('session to %s lost in configuration mode' %
+                               self.module.params['host'])
+        timeout = self.shell.shell.gettimeout()
+        self.close()
+        self.connect()
+        # modules waiting on long operations change the channel timeout
+        self.shell.shell.settimeout(timeout)
+        if self.terminal:
+            self.shell.send(self.terminal)
+        if self.modes:
+            self.shell.send(self.modes)
+
+    # follow the session mode through commands the device answered; the
+    # prompt tells whether they left it, mode commands how to get back
+    def _track_modes(self, commands):
+        self.modes.extend(str(cmd).strip() for cmd in commands
+                          if CLI_MODE_RE.search(str(cmd)))
+        prompt = (self.shell._matched_prompt or '').strip()
+        if prompt == self.base_prompt:
+            self.modes = list()
+        elif not is_config_prompt(prompt):
+            self.modes = [mode for mode in self.modes
+                          if mode.lower() == 'admin']
+
+    def send(self, commands, pipeline=False):
+        commands = to_list(commands)
+        responses = list()
+        retries = RECONNECT_RETRIES
+        while True:
+            pending = commands[len(responses):]
+            if not self.shell.alive():
+                if retries <= 0:
+                    raise ConnectError('session to %s lost' %
+                                       self.module.params['host'])
+                retries -= 1
+                self.reconnect()
+            try:
+                if pipeline and can_pipeline(pending):
+                    sent = pending
+                    responses.extend(self.shell.send_batch(pending))
+                    self._track_modes(sent)
+                else:
+                    for command in pending:
+                        sent = [command]
+                        responses.extend(self.shell.send(command))
+                        self._track_modes(sent)
+                break
+            except CommandError:
+                self._track_modes(sent)
+                raise
+            except ShellError:
+                # whatever was in flight may have run already
+                if self.shell.alive() or not is_read_only(pending):
+                    raise
+
+        self.terminal.extend(str(cmd) for cmd in commands
+                             if str(cmd).startswith('terminal ') and
+                             str(cmd) not in self.terminal)
+        return responses
 
-    def send(self, commands):
-        try:
-            return self.shell.send(commands)
-        except ShellError:
-            e = get_exception()
-            self.module.fail_json(msg=e.message, commands=commands)
+    def send_stream(self, command):
+        if not self.shell.alive():
+            self.reconnect()
+        return self.shell.send_stream(command)
+
+    def close(self):
+        self.shell.close()
+        self.shell.ssh.close()
 
 
 class NetworkModule(AnsibleModule):
@@ -115,11 +713,39 @@ class NetworkModule(AnsibleModule):
                 if self.params.get(key) is None and value is not None:
                     self.params[key] = value
 
-    def connect(self):
-        self.connection = Cli(self)
+    def connect(self, persistent=None):
+        try:
+            self.open(persistent)
+        except ShellError:
+            e = get_exception()
+            self.fail_json(msg=str(e))
+
+    def open(self, persistent=None):
+        """Same as connect(), but raises ShellError instead of failing
+        the module, so callers can decide whether to try again.
+        """
+        # modules that drive connection.shell.shell directly need a private
+        # session and pass persistent=False
+        if persistent is None:
+            persistent = self.params.get('persistent')
+
+        if persistent:
+            from iosxr_broker import BrokerCli
+            self.connection = BrokerCli(self)
+        else:
+            self.connection = Cli(self)
 
         self.connection.connect()
-        self.connection.send('terminal length 0')
+        # pooled sessions are handed out with the terminal already set up
+        if not persistent:
+            start = time.time()
+            try:
+                self.connection.send('terminal length 0')
+            except ShellError:
+                e = get_exception()
+                self.connection.close()
+                raise ConnectError(str(e))
+            self.connection.phases['terminal'] = round(time.time() - start, 4)
         self._connected = True
 
     def configure(self, commands):
@@ -132,16 +758,89 @@ class NetworkModule(AnsibleModule):
         return responses
 
     def execute(self, commands, **kwargs):
+        try:
+            return self.run_commands(commands, **kwargs)
+        except ShellError:
+            e = get_exception()
+            self.fail_json(msg=str(e), commands=commands)
+
+    def run_commands(self, commands, **kwargs):
+        """Same as execute(), but raises ShellError instead of failing
+        the module.
+        """
         if not self.connected:
-            self.connect()
+            self.open()
         return self.connection.send(commands, **kwargs)
 
+    def execute_stream(self, command, dest=None):
+        """Run one command and yield its response line by line as it
+        arrives.  With dest, the lines are also written to that file on
+        the controller, so callers can keep the output out of memory.
+        """
+        if not self.connected:
+            self.connect()
+        try:
+            lines = self.connection.send_stream(command)
+            if dest is None:
+                for line in lines:
+                    yield line
+                return
+
+            with open(dest, 'w') as fh:
+                for line in lines:
+                    fh.write(line + '\n')
+                    yield line
+        except ShellError:
+            e = get_exception()
+            self.fail_json(msg=str(e), commands=command)
+
     def disconnect(self):
-        self.connection.close()
-        self._connected = False
+        try:
+            self.connection.close()
+        finally:
+            # a session that failed to reopen is half closed already
+            self._connected = False
+
+    @property
+    def timings(self):
+        """Seconds spent per login phase, and per command the seconds to
+        first and last byte after the send and the bytes received.
+        """
+        # fail_json() may run before __init__ has set up the connection
+        if getattr(self, 'connection', None) is None:
+            return None
+        timings = dict(self.connection.phases)
+        timings['commands'] = self.connection.timings
+        return timings
+
+    def _report_timings(self, result):
+        timings = self.timings
+        if timings is None:
+            return
+        result.setdefault('timings', timings)
+        path = self.params.get('timings_file')
+        if not path:
+            return
+        record = dict(time=time.time(), module=self._name,
+                      host=self.params['host'], timings=timings)
+        # best effort, losing a sample must not fail the task
+        try:
+            with open(path, 'a') as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                fh.write(json.dumps(record) + '\n')
+        except (IOError, OSError):
+            pass
+
+    def exit_json(self, **kwargs):
+        self._report_timings(kwargs)
+        super(NetworkModule, self).exit_json(**kwargs)
+
+    def fail_json(self, **kwargs):
+        self._report_timings(kwargs)
+        super(NetworkModule, self).fail_json(**kwargs)
 
     def parse_config(self, cfg):
-        return parse(cfg, indent=1)
+        return NetworkConfig(indent=1, contents=cfg).items
 
     def get_config(self):
         return self.execute('show running-config')[0]
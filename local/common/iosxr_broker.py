@@ -0,0 +1,531 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Controller-side session broker for the local CLI modules.
+#
+# Every local module runs in its own process, so an SSH session opened by
+# one task cannot be handed to the next one directly.  The broker is a small
+# daemon listening on a Unix socket under IOSXR_STATE_DIR.  It keeps
+# authenticated shells, already set to 'terminal length 0', per
+# (host, port, username, credentials) and leases one to each module process
+# for the lifetime of its socket connection.
+#
+# The daemon is started on demand by the first module that asks for a
+# persistent session and exits on its own after IOSXR_BROKER_IDLE_TIMEOUT
+# seconds without sessions or clients.
+#
+# Wire protocol: one JSON object per line in each direction.
+#   {"op": "open", "host": ..., "port": ..., "username": ..., "password": ...,
+#    "ssh_keyfile": ...}
+#   {"op": "send", "commands": [...], "prompts": [[pattern, flags], ...],
+#    "errors": [[pattern, flags], ...], "pipeline": false}
+#   {"op": "stream", "command": ..., "prompts": ..., "errors": ...}
+# Replies are {"ok": true, ...} or {"ok": false, "error": "...",
+# "command_error": false}, the flag telling a device error reply from a
+# broken session.  A stream
+# request gets {"ok": true, "lines": [...]} replies as the output arrives,
+# the last one carrying "done": true.
+#
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from ansible.module_utils.shell import ShellError
+from ansible.module_utils._text import to_native
+
+from iosxr import CLI_PROMPTS_RE, CLI_ERRORS_RE, IosxrShell, can_pipeline
+from iosxr import CommandError, ConnectError
+from iosxr_state import state_path
+
+BROKER_SOCKET = state_path('broker.sock')
+BROKER_IDLE_TIMEOUT = int(os.environ.get('IOSXR_BROKER_IDLE_TIMEOUT', 300))
+BROKER_MAX_SESSIONS = int(os.environ.get('IOSXR_BROKER_MAX_SESSIONS', 4))
+BROKER_LEASE_TIMEOUT = int(os.environ.get('IOSXR_BROKER_LEASE_TIMEOUT', 60))
+STREAM_BATCH = 256
+
+
+class BrokerError(ShellError):
+    pass
+
+
+def _compile(patterns):
+    return [re.compile(pattern, flags) for pattern, flags in patterns]
+
+def _export(regexes):
+    return [[regex.pattern, regex.flags] for regex in regexes]
+
+def session_key(host, port, username, password, ssh_keyfile):
+    """Return the pool key for a set of connection parameters.  The
+    credentials are folded in as a digest so a lease is never handed to a
+    caller that could not have opened the session itself.
+    """
+    secret = '\0'.join([str(username), str(password), str(ssh_keyfile)])
+    digest = hashlib.sha256(secret.encode('utf8')).hexdigest()
+    return (str(host), int(port), str(username), digest)
+
+
+class Session(object):
+    """A pooled shell together with the exec prompt seen at login."""
+
+    def __init__(self, key, shell):
+        self.key = key
+        self.shell = shell
+        self.base_prompt = (shell._matched_prompt or '').strip()
+        self.last_used = time.time()
+        self.dirty = False
+
+    @property
+    def prompt(self):
+        return (self.shell._matched_prompt or '').strip()
+
+    def send(self, commands, prompts=None, errors=None, pipeline=False):
+        self.shell.timings = list()
+        self.shell.prompts = prompts or CLI_PROMPTS_RE
+        self.shell.errors = errors or CLI_ERRORS_RE
+        try:
+            if pipeline and can_pipeline(commands):
+                return self.shell.send_batch(commands)
+            return self.shell.send(commands)
+        except CommandError:
+            # read up to the prompt, the session is still in sync
+            raise
+        except ShellError:
+            # a timeout leaves the rest of the response on the channel,
+            # where it would leak into the next lease
+            self.dirty = True
+            raise
+        except Exception:
+            self.dirty = True
+            raise ShellError(str(sys.exc_info()[1]))
+
+    def send_stream(self, command, prompts=None, errors=None):
+        self.shell.timings = list()
+        self.shell.prompts = prompts or CLI_PROMPTS_RE
+        self.shell.errors = errors or CLI_ERRORS_RE
+        # stays dirty unless the whole response, prompt included, was read
+        self.dirty = True
+        try:
+            for line in self.shell.send_stream(command):
+                yield line
+        except CommandError:
+            self.dirty = False
+            raise
+        except ShellError:
+            raise
+        except Exception:
+            raise ShellError(str(sys.exc_info()[1]))
+        self.dirty = False
+
+    # bring the session back to the exec prompt it started from
+    def reset(self):
+        if self.dirty:
+            return False
+        for _ in range(3):
+            if self.prompt == self.base_prompt:
+                return True
+            if '(' in self.prompt and 'config' in self.prompt:
+                command = 'abort'
+            else:
+                command = 'exit'
+            try:
+                self.send(command)
+            except ShellError:
+                return False
+        return self.prompt == self.base_prompt
+
+    def close(self):
+        try:
+            self.shell.close()
+            self.shell.ssh.close()
+        except Exception:
+            pass
+
+
+class SessionPool(object):
+    """Idle sessions per key, capped at max_sessions open per device."""
+
+    def __init__(self, max_sessions=BROKER_MAX_SESSIONS,
+                 idle_timeout=BROKER_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._idle = dict()
+        self._open = dict()
+        self._cond = threading.Condition()
+
+    def acquire(self, key, params, timeout=BROKER_LEASE_TIMEOUT):
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    session = idle.pop()
+                    if session.shell.alive():
+                        session.last_used = time.time()
+                        return session
+                    # dropped by the device while idle
+                    self._open[key] -= 1
+                    session.close()
+                    continue
+                if self._open.get(key, 0) < self.max_sessions:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise BrokerError('all %d sessions to %s:%s are busy' %
+                                      (self.max_sessions, key[0], key[1]))
+                self._cond.wait(remaining)
+
+        # connect outside the lock so one slow device does not stall others
+        try:
+            return Session(key, self._open_shell(params))
+        except Exception:
+            with self._cond:
+                self._open[key] -= 1
+                self._cond.notify_all()
+            raise
+
+    def _open_shell(self, params):
+        shell = IosxrShell(kickstart=False, prompts_re=CLI_PROMPTS_RE,
+                      errors_re=CLI_ERRORS_RE)
+        shell.open(params['host'], port=params.get('port') or 22,
+                   username=params.get('username'),
+                   password=params.get('password'),
+                   key_filename=params.get('ssh_keyfile'))
+        shell.send('terminal length 0')
+        return shell
+
+    def release(self, session):
+        reusable = session.reset()
+        with self._cond:
+            if reusable:
+                session.last_used = time.time()
+                self._idle.setdefault(session.key, list()).append(session)
+            else:
+                self._open[session.key] -= 1
+            self._cond.notify_all()
+        if not reusable:
+            session.close()
+
+    # close sessions that have been idle for longer than idle_timeout
+    def evict(self):
+        expired = list()
+        now = time.time()
+        with self._cond:
+            for key, idle in self._idle.items():
+                for session in list(idle):
+                    if now - session.last_used > self.idle_timeout:
+                        idle.remove(session)
+                        self._open[key] -= 1
+                        expired.append(session)
+            self._cond.notify_all()
+        for session in expired:
+            session.close()
+
+    def size(self):
+        with self._cond:
+            return sum(self._open.values())
+
+    def close(self):
+        with self._cond:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle = dict()
+        for session in sessions:
+            session.close()
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, **kwargs):
+        self.wfile.write((json.dumps(kwargs) + '\n').encode('utf8'))
+        self.wfile.flush()
+
+    def handle(self):
+        pool = self.server.pool
+        session = None
+        self.server.touch(1)
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode('utf8'))
+                    if request.get('op') == 'open' and session is None:
+                        key = session_key(request['host'],
+                                          request.get('port') or 22,
+                                          request.get('username'),
+                                          request.get('password'),
+                                          request.get('ssh_keyfile'))
+                        session = pool.acquire(key, request)
+                        reply = dict(ok=True, prompt=session.base_prompt)
+                    elif request.get('op') == 'send' and session is not None:
+                        responses = session.send(
+                            request['commands'],
+                            prompts=_compile(request.get('prompts') or []),
+                            errors=_compile(request.get('errors') or []),
+                            pipeline=request.get('pipeline', False))
+                        reply = dict(ok=True, responses=responses,
+                                     timings=session.shell.timings)
+                    elif request.get('op') == 'stream' and session is not None:
+                        lines = session.send_stream(
+                            request['command'],
+                            prompts=_compile(request.get('prompts') or []),
+                            errors=_compile(request.get('errors') or []))
+                        batch = list()
+                        for line in lines:
+                            batch.append(line)
+                            if len(batch) >= STREAM_BATCH:
+                                self.reply(ok=True, lines=batch)
+                                batch = list()
+                        reply = dict(ok=True, lines=batch, done=True,
+                                     timings=session.shell.timings)
+                    else:
+                        reply = dict(ok=False, error='unexpected request')
+                except Exception:
+                    e = sys.exc_info()[1]
+                    reply = dict(ok=False, error=str(e),
+                                 command_error=isinstance(e, CommandError))
+                self.reply(**reply)
+        finally:
+            if session is not None:
+                pool.release(session)
+            self.server.touch(-1)
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        self.clients = 0
+        self.last_active = time.time()
+        self._lock = threading.Lock()
+        socketserver.UnixStreamServer.__init__(self, path, BrokerHandler)
+        os.chmod(path, 0o600)
+
+    def touch(self, delta):
+        with self._lock:
+            self.clients += delta
+            self.last_active = time.time()
+
+    # evict idle sessions and stop once nothing has used the broker
+    def reaper(self, interval=10):
+        while True:
+            time.sleep(interval)
+            self.pool.evict()
+            with self._lock:
+                idle = (self.clients == 0 and
+                        time.time() - self.last_active > self.pool.idle_timeout)
+            if idle and self.pool.size() == 0:
+                self.shutdown()
+                return
+
+
+def serve(path=BROKER_SOCKET):
+    """Run the broker in the foreground.  Only one broker runs per socket;
+    a second instance exits quietly.
+    """
+    lock = open(path + '.lock', 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        return
+
+    if os.path.exists(path):
+        os.unlink(path)
+
+    pool = SessionPool()
+    server = BrokerServer(path, pool)
+    reaper = threading.Thread(target=server.reaper)
+    reaper.daemon = True
+    reaper.start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        pool.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        lock.close()
+
+def spawn(path=BROKER_SOCKET, script=None):
+    """Start a detached broker process for path.  script selects another
+    daemon speaking the same protocol, run as 'python script path'.
+    """
+    script = os.path.abspath(script or __file__)
+    if script.endswith('.pyc'):
+        script = script[:-1]
+    devnull = open(os.devnull, 'r+')
+    subprocess.Popen([sys.executable, script, path],
+                     stdin=devnull, stdout=devnull, stderr=devnull,
+                     close_fds=True, preexec_fn=os.setsid)
+    devnull.close()
+
+
+class BrokerClient(object):
+    """Module-side end of a broker connection holding one session lease."""
+
+    def __init__(self, path=BROKER_SOCKET, timeout=10, script=None,
+                 name='session broker'):
+        self.path = path
+        self.name = name
+        self.timeout = timeout
+        self.script = script
+        self.sock = None
+        self.rfile = None
+        self.timings = list()
+
+    def connect(self):
+        deadline = time.time() + self.timeout
+        spawned = False
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                break
+            except socket.error:
+                sock.close()
+                err = sys.exc_info()[1].errno
+                if err not in (errno.ENOENT, errno.ECONNREFUSED):
+                    raise BrokerError('cannot reach %s: %s' %
+                                      (self.name, os.strerror(err)))
+                if not spawned:
+                    spawn(self.path, self.script)
+                    spawned = True
+                if time.time() > deadline:
+                    raise BrokerError('%s did not start' % self.name)
+                time.sleep(0.1)
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+
+    def request(self, **kwargs):
+        try:
+            self.sock.sendall((json.dumps(kwargs) + '\n').encode('utf8'))
+            line = self.rfile.readline()
+        except socket.error:
+            raise BrokerError('lost connection to %s' % self.name)
+        if not line:
+            raise BrokerError('%s closed the connection' % self.name)
+        return self._reply(line)
+
+    def request_stream(self, **kwargs):
+        """Send a stream request and yield the lines of each reply."""
+        try:
+            self.sock.sendall((json.dumps(kwargs) + '\n').encode('utf8'))
+        except socket.error:
+            raise BrokerError('lost connection to %s' % self.name)
+        while True:
+            try:
+                line = self.rfile.readline()
+            except socket.error:
+                raise BrokerError('lost connection to %s' % self.name)
+            if not line:
+                raise BrokerError('%s closed the connection' % self.name)
+            reply = self._reply(line)
+            for line in reply['lines']:
+                yield line
+            if reply.get('done'):
+                self.timings = reply.get('timings') or list()
+                return
+
+    def _reply(self, line):
+        reply = json.loads(line.decode('utf8'))
+        if reply.get('command_error'):
+            raise CommandError(reply.get('error'))
+        if not reply.get('ok'):
+            raise ShellError(reply.get('error'))
+        return reply
+
+    def close(self):
+        if self.sock is not None:
+            self.rfile.close()
+            self.sock.close()
+            self.sock = None
+
+
+class BrokerCli(object):
+    """Drop-in replacement for iosxr.Cli backed by a pooled session.
+    There is no local paramiko channel, so modules that drive
+    connection.shell.shell directly must not use it.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.shell = None
+        self.client = BrokerClient()
+        # the lease stands in for connect, auth and terminal setup
+        self.phases = dict()
+        self.timings = list()
+
+    def connect(self, **kwargs):
+        params = self.module.params
+        host = params['host']
+        port = params['port'] or 22
+        start = time.time()
+        try:
+            self.client.connect()
+            self.client.request(op='open', host=host, port=port,
+                                username=params['username'],
+                                password=params['password'],
+                                ssh_keyfile=params['ssh_keyfile'])
+        except ShellError:
+            e = sys.exc_info()[1]
+            self.client.close()
+            msg = 'failed to connect to %s:%s - %s' % (host, port, str(e))
+            raise ConnectError(msg)
+        self.phases['lease'] = round(time.time() - start, 4)
+
+    def send(self, commands, pipeline=False):
+        reply = self.client.request(op='send', commands=commands,
+                                    prompts=_export(CLI_PROMPTS_RE),
+                                    errors=_export(CLI_ERRORS_RE),
+                                    pipeline=pipeline)
+        self.timings.extend(reply.get('timings') or list())
+        return [to_native(r) for r in reply['responses']]
+
+    def send_stream(self, command):
+        lines = self.client.request_stream(op='stream', command=command,
+                                           prompts=_export(CLI_PROMPTS_RE),
+                                           errors=_export(CLI_ERRORS_RE))
+        for line in lines:
+            yield to_native(line)
+        self.timings.extend(self.client.timings)
+
+    def close(self):
+        self.client.close()
+
+
+if __name__ == '__main__':
+    serve(*sys.argv[1:2])
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Buffered reader for the NETCONF and XML agent modules, which talk to the
+# device over a raw paramiko channel instead of the CLI shell.
+#
+
+import socket
+
+from ansible.module_utils._text import to_bytes, to_native
+
+RECV_MIN = 4096
+RECV_MAX = 1 << 20
+
+
+class ChannelError(Exception):
+    pass
+
+
+class ChannelReader(object):
+    """Read delimiter-terminated messages from a paramiko channel.
+
+    Received data is appended to one growable bytearray and only the newly
+    arrived tail is searched for the delimiter, so a large reply costs
+    neither repeated copies of the whole buffer nor repeated scans of it.
+    The receive size doubles while the channel keeps filling it, up to
+    max_size.  Bytes past the delimiter stay buffered for the next read.
+    """
+
+    def __init__(self, channel, min_size=RECV_MIN, max_size=RECV_MAX):
+        self.channel = channel
+        self.buffer = bytearray()
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = min_size
+
+    def read_until(self, delimiter):
+        """Return everything up to and including delimiter."""
+        delimiter = to_bytes(delimiter)
+        start = 0
+        while True:
+            end = self.buffer.find(delimiter, start)
+            if end >= 0:
+                end += len(delimiter)
+                message = memoryview(self.buffer)[:end].tobytes()
+                del self.buffer[:end]
+                return to_native(message)
+            # the delimiter may straddle the old tail and the next chunk
+            start = max(0, len(self.buffer) - len(delimiter) + 1)
+            self._fill()
+
+    def _fill(self):
+        try:
+            data = self.channel.recv(self.size)
+        except socket.timeout:
+            raise ChannelError('timeout waiting for response')
+        if not data:
+            raise ChannelError('connection closed by remote device')
+        self.buffer.extend(data)
+        if len(data) >= self.size:
+            self.size = min(self.size * 2, self.max_size)
+        elif len(data) < self.size // 4:
+            self.size = max(self.size // 2, self.min_size)
@@ -17,19 +17,233 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 #------------------------------------------------------------------------------
-
+import os
+import random
+import re
 import time
 
-def execute_command(module, command):
-    retries = 5
-    while retries > 0:
+from ansible.module_utils.basic import get_exception
+from ansible.module_utils.shell import ShellError
+
+from iosxr import CommandError, ConnectError, is_interactive
+from iosxr_state import locked_json, state_path
+
+BREAKER_THRESHOLD = int(os.environ.get('IOSXR_BREAKER_THRESHOLD', 3))
+BREAKER_COOLDOWN = int(os.environ.get('IOSXR_BREAKER_COOLDOWN', 60))
+FINGERPRINT_TTL = int(os.environ.get('IOSXR_FINGERPRINT_TTL', 3600))
+
+# seconds the boot times worked out from two 'show version' uptimes may
+# differ by without a reload in between; the uptime is shown to the minute
+BOOT_TOLERANCE = 120
+
+# command errors that come back the same however often the command is sent
+FATAL_ERRORS_RE = re.compile(
+    r"invalid input|(?:incomplete|ambiguous) command|% ?Bad secret", re.I)
+
+
+class RetryPolicy(object):
+    """How often and how long to wait before trying a command again.
+
+    Connect errors (the device cannot be reached at all) and command
+    errors (the device answered with an error, e.g. because another
+    install operation is still running) get separate retry budgets, and
+    errors about the command itself, such as invalid input, none.  The
+    wait doubles on every attempt, capped at max_delay, and is drawn at
+    random from [delay * (1 - jitter), delay] so parallel tasks spread out.
+    """
+
+    def __init__(self, connect_retries=2, command_retries=4, base_delay=1.0,
+                 max_delay=16.0, jitter=0.5):
+        self.connect_retries = connect_retries
+        self.command_retries = command_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def retries(self, error):
+        if isinstance(error, CommandError):
+            if FATAL_ERRORS_RE.search(str(error)):
+                return 0
+            return self.command_retries
+        return self.connect_retries
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * (1 - self.jitter * random.random())
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class CircuitBreaker(object):
+    """Per-device count of consecutive connect failures, kept on the
+    controller so it is shared by every task.  Once threshold failures
+    have been seen the breaker opens and calls fail at once, until
+    cooldown seconds have passed and one call is let through to probe
+    the device again.
+    """
+
+    def __init__(self, host, port, threshold=BREAKER_THRESHOLD,
+                 cooldown=BREAKER_COOLDOWN):
+        self.name = '%s:%s' % (host, port)
+        self.path = state_path('breaker', '%s_%s.json' % (host, port))
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def check(self):
+        """Return the number of seconds the breaker stays open, 0 if
+        calls may go through.
+        """
+        if self.threshold < 1 or not os.path.exists(self.path):
+            return 0
+        with locked_json(self.path) as state:
+            if state.get('failures', 0) < self.threshold:
+                return 0
+            remaining = state.get('opened', 0) + self.cooldown - time.time()
+            if remaining <= 0:
+                # half open: let this call probe, keep the others out
+                state['opened'] = time.time()
+                return 0
+            return int(remaining) + 1
+
+    def failure(self):
+        with locked_json(self.path) as state:
+            state['failures'] = state.get('failures', 0) + 1
+            state['opened'] = time.time()
+
+    def success(self):
+        if os.path.exists(self.path):
+            with locked_json(self.path) as state:
+                state.clear()
+
+
+def execute_command(module, command, policy=None, **kwargs):
+    """Run command(s) through module.execute(), retrying failures as
+    directed by policy (DEFAULT_RETRY_POLICY if not given).
+
+    A session broken mid-command is reopened before the next attempt.
+    Either that or a failed connect drops the cached fingerprint, as the
+    device may be reloading.
+    Commands that prompt or change device state are not sent again after
+    any error, as that could repeat e.g. a reload or an install add.
+    """
+    policy = policy or DEFAULT_RETRY_POLICY
+    breaker = CircuitBreaker(module.params['host'], module.params['port'] or 22)
+    attempts = dict()
+    while True:
+        remaining = breaker.check()
+        if remaining:
+            module.fail_json(msg='%s is not answering, not trying again for '
+                                 '%d seconds' % (breaker.name, remaining))
         try:
-            response = module.execute(command)
+            response = module.run_commands(command, **kwargs)
+            breaker.success()
             return response
-        except:
-            pass
-        retries -= 1
-        time.sleep(2)
-    else:
-        module.fail_json(msg="too many timeouts trying to send command")
+        except ShellError:
+            e = get_exception()
+
+        if not isinstance(e, CommandError):
+            invalidate_fingerprint(module)
+        if isinstance(e, ConnectError):
+            breaker.failure()
+        else:
+            if not isinstance(e, CommandError):
+                module.disconnect()
+            if is_interactive(command):
+                module.fail_json(msg=str(e), commands=command)
+
+        kind = type(e)
+        attempt = attempts.get(kind, 0)
+        if attempt >= policy.retries(e):
+            module.fail_json(msg=str(e), commands=command)
+        attempts[kind] = attempt + 1
+        time.sleep(policy.delay(attempt))
+
+
+VERSION_RE = re.compile(r"Cisco IOS XR Software, Version ([^\s\[]+)")
+UPTIME_RE = re.compile(r"uptime is ([^\r\n]+)")
+PLATFORM_RE = re.compile(r"^cisco (.+?) (?:\([^\)]*\) )?processor", re.M)
+UPTIME_UNITS = dict(year=31536000, week=604800, day=86400, hour=3600,
+                    minute=60, second=1)
+
+def parse_uptime(text):
+    """Return the seconds in an uptime like '1 week, 2 days, 3 hours'."""
+    seconds = 0
+    for count, unit in re.findall(r"(\d+)\s+(year|week|day|hour|minute|second)",
+                                  text):
+        seconds += int(count) * UPTIME_UNITS[unit]
+    return seconds
+
+def parse_version(response):
+    """Return the device fingerprint found in 'show version' output."""
+    legacy = "Build Information:" not in response
+    fingerprint = dict(legacy=legacy,
+                       flavor='classic' if legacy else 'exr',
+                       version=None, platform=None, uptime=None)
+    match = VERSION_RE.search(response)
+    if match:
+        fingerprint['version'] = match.group(1)
+    match = PLATFORM_RE.search(response)
+    if match:
+        fingerprint['platform'] = match.group(1)
+    match = UPTIME_RE.search(response)
+    if match:
+        fingerprint['uptime'] = parse_uptime(match.group(1))
+    return fingerprint
+
+def _fingerprint_path(module):
+    return state_path('fingerprint', '%s_%s.json' % (module.params['host'],
+                                                     module.params['port'] or 22))
+
+def update_fingerprint(module, response):
+    """Store the fingerprint parsed from a 'show version' response.  The
+    result has rebooted set if the uptime was reset since the cached one
+    was stored, i.e. the device was reloaded in between.
+    """
+    fingerprint = parse_version(response)
+    now = time.time()
+    fingerprint['checked'] = now
+    if fingerprint['uptime'] is not None:
+        fingerprint['boot'] = now - fingerprint['uptime']
+    with locked_json(_fingerprint_path(module)) as cache:
+        boot = cache.get('boot')
+        cache.clear()
+        cache.update(fingerprint)
+    fingerprint['rebooted'] = (boot is not None and
+                               fingerprint.get('boot') is not None and
+                               fingerprint['boot'] - boot > BOOT_TOLERANCE)
+    return fingerprint
+
+def get_fingerprint(module, refresh=False):
+    """Return platform, flavor, version and uptime of the device.
+
+    The answer is cached per device on the controller for FINGERPRINT_TTL
+    seconds, so tasks after the first do not run 'show version'.  Modules
+    that reload the device or change its software call
+    invalidate_fingerprint(), and modules that run 'show version' anyway
+    pass the output to update_fingerprint().  A reload by someone else is
+    seen through the session it breaks, which drops the cached entry in
+    execute_command(), or else by the uptime reset in the next 'show
+    version' (rebooted is set); until then the entry is trusted.
+    """
+    path = _fingerprint_path(module)
+    if not refresh and os.path.exists(path):
+        with locked_json(path) as cache:
+            fingerprint = dict(cache)
+        if time.time() - fingerprint.get('checked', 0) < FINGERPRINT_TTL:
+            # uptime as of now, from the cached boot time
+            if fingerprint.get('boot') is not None:
+                fingerprint['uptime'] = int(time.time() - fingerprint['boot'])
+            fingerprint['rebooted'] = False
+            return fingerprint
+
+    response = execute_command(module, 'show version')
+    return update_fingerprint(module, response[0])
+
+def invalidate_fingerprint(module):
+    path = _fingerprint_path(module)
+    if os.path.exists(path):
+        os.unlink(path)
 
+def is_legacy_iosxr(module):
+    """Return True for 32-bit (classic) IOS-XR."""
+    return get_fingerprint(module)['legacy']
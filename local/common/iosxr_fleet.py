@@ -0,0 +1,211 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# asyncio engine that runs CLI commands against many IOS-XR devices from a
+# single process.  The event loop schedules the sessions and enforces the
+# global and per-host limits; each session's paramiko I/O runs on a worker
+# thread sized to the global limit, so hundreds of devices can be driven at
+# once without one Ansible fork per device.
+#
+# Requires Python 3.5 or later.
+#
+
+import asyncio
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from iosxr import CLI_PROMPTS_RE, CLI_ERRORS_RE, RECV_SIZE, StreamMatcher
+
+
+class FleetError(Exception):
+    pass
+
+
+class CommandError(FleetError):
+    pass
+
+
+class FleetSession(object):
+    """Blocking CLI session used from the executor threads."""
+
+    def __init__(self, host, port=22, username=None, password=None,
+                 key_filename=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.key_filename = key_filename
+        self.timeout = timeout
+        self.ssh = None
+        self.shell = None
+
+    def open(self):
+        self.ssh = paramiko.SSHClient()
+        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            self.ssh.connect(self.host, port=self.port,
+                             username=self.username, password=self.password,
+                             key_filename=self.key_filename,
+                             look_for_keys=self.password is None,
+                             allow_agent=False, timeout=self.timeout)
+            self.shell = self.ssh.invoke_shell()
+            self.shell.settimeout(self.timeout)
+            self._receive()
+            self.run('terminal length 0')
+        except FleetError:
+            raise
+        except paramiko.AuthenticationException:
+            raise FleetError('unable to authenticate to remote device')
+        except (socket.error, paramiko.SSHException) as e:
+            raise FleetError('failed to connect to %s:%s - %s' %
+                             (self.host, self.port, str(e)))
+
+    def _receive(self):
+        # errors are checked by run() once the prompt is in
+        matcher = StreamMatcher(CLI_PROMPTS_RE, [])
+        chunks = list()
+        while True:
+            try:
+                chunk = self.shell.recv(RECV_SIZE)
+            except socket.timeout:
+                raise FleetError('timeout waiting for prompt')
+            if not chunk:
+                raise FleetError('connection closed by remote device')
+            chunks.append(chunk.decode('utf8', 'replace'))
+            if matcher.feed(chunks[-1]):
+                return ''.join(chunks)
+
+    def run(self, command):
+        """Run one command and return its output.  The whole response is
+        read up to the prompt before errors are checked, so a failed
+        command never leaves output behind for the next one.
+        """
+        self.shell.sendall(('%s\r' % command).encode('utf8'))
+        response = self._receive()
+        if StreamMatcher([], CLI_ERRORS_RE).search(response):
+            raise CommandError('matched error in response: %s' % response)
+        lines = response.splitlines()
+        if lines and lines[0].strip().endswith(command):
+            lines.pop(0)
+        if lines:
+            lines.pop()
+        return '\n'.join(lines)
+
+    def close(self):
+        if self.ssh is not None:
+            self.ssh.close()
+
+
+class FleetExecutor(object):
+    """Run a list of commands on a list of hosts.
+
+    concurrency caps the number of sessions open at once across the fleet;
+    per_host caps the sessions opened to any single device: the command
+    list of a host is split into at most per_host slices, one session
+    each, so a host never has more sessions than that.
+    """
+
+    def __init__(self, concurrency=50, per_host=1, port=22, username=None,
+                 password=None, ssh_keyfile=None, timeout=30):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.ssh_keyfile = ssh_keyfile
+        self.timeout = timeout
+
+    def run(self, hosts, commands):
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            loop.set_default_executor(executor)
+            return loop.run_until_complete(self._run(hosts, commands))
+        finally:
+            loop.close()
+            executor.shutdown(wait=True)
+
+    async def _run(self, hosts, commands):
+        hosts = list(OrderedDict.fromkeys(hosts))
+        fleet_limit = asyncio.Semaphore(self.concurrency)
+        tasks = [self._run_host(host, commands, fleet_limit)
+                 for host in hosts]
+        results = await asyncio.gather(*tasks)
+        return dict(zip(hosts, results))
+
+    async def _run_host(self, host, commands, fleet_limit):
+        start = time.time()
+        # one session per slice, so this is the per-host limit
+        sessions = max(1, min(self.per_host, len(commands)))
+        slices = [list(range(n, len(commands), sessions))
+                  for n in range(sessions)]
+        tasks = [self._run_session(host, [commands[i] for i in indexes],
+                                   fleet_limit)
+                 for indexes in slices]
+        outputs = [None] * len(commands)
+        errors = list()
+        for indexes, (responses, error) in zip(slices, await asyncio.gather(*tasks)):
+            for i, response in zip(indexes, responses):
+                outputs[i] = response
+            if error:
+                errors.append(error)
+
+        result = dict(failed=bool(errors),
+                      elapsed=round(time.time() - start, 3),
+                      stdout=outputs,
+                      stdout_lines=[str(out or '').splitlines()
+                                    for out in outputs])
+        if errors:
+            result['msg'] = '; '.join(errors)
+        return result
+
+    async def _run_session(self, host, commands, fleet_limit):
+        loop = asyncio.get_event_loop()
+        async with fleet_limit:
+            return await loop.run_in_executor(None, self._session, host,
+                                              commands)
+
+    # blocking part, runs on an executor thread
+    def _session(self, host, commands):
+        responses = list()
+        errors = list()
+        session = FleetSession(host, port=self.port, username=self.username,
+                               password=self.password,
+                               key_filename=self.ssh_keyfile,
+                               timeout=self.timeout)
+        try:
+            session.open()
+            for command in commands:
+                try:
+                    responses.append(session.run(command))
+                except CommandError as e:
+                    # the session is still in sync, keep going
+                    responses.append(None)
+                    errors.append('%s: %s' % (command, str(e)))
+        except FleetError as e:
+            errors.append(str(e))
+        finally:
+            session.close()
+        responses.extend([None] * (len(commands) - len(responses)))
+        return responses, '; '.join(errors)
@@ -0,0 +1,350 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Install operations on a device over the CLI: reading its install state
+# (InstallState, in iosxr_install_parser), planning the operations to a
+# desired state, and waiting for install operations while following their
+# logs and the reloads they cause.
+#
+
+import os
+import socket
+import time
+
+from ansible.module_utils.shell import ShellError
+
+from iosxr_common import execute_command, invalidate_fingerprint
+from iosxr_install_parser import *
+
+# seconds between reads of the install logs while an operation runs; the
+# whole log comes back every time, so it is read less often than polled
+INSTALL_LOG_INTERVAL = float(os.environ.get('IOSXR_INSTALL_LOG_INTERVAL', 10))
+
+# probing of a device reloaded by an install operation
+RELOAD_PROBE_INTERVAL = float(os.environ.get('IOSXR_RELOAD_PROBE_INTERVAL', 2))
+RELOAD_PROBE_MAX = float(os.environ.get('IOSXR_RELOAD_PROBE_MAX', 30))
+RELOAD_TIMEOUT = int(os.environ.get('IOSXR_RELOAD_TIMEOUT', 3600))
+
+
+def fetch_install_state(module):
+    """Read the install state in a single pipelined round trip."""
+    return InstallState.fetch(
+        lambda commands: execute_command(module, commands, pipeline=True))
+
+
+def verify_install(module, check, message, response):
+    """Read the install state again once an operation has completed and
+    fail the module with message unless check(state) holds.
+    """
+    installed = fetch_install_state(module)
+    if not check(installed):
+        module.fail_json(msg=message, stdout=response)
+    return installed
+
+
+def plan_install(installed, active, committed=None):
+    """Return the install operations that take a device from installed
+    to the desired packages, as a list of dict(operation, packages) in
+    the order they must run: add, activate, deactivate, commit, remove.
+
+    active lists the packages that must be active and committed those
+    that must be committed, by default the same.  Other versions of
+    these packages are deactivated and removed; packages by other names
+    are left alone.  All packages of one operation go into a single
+    install operation.  Raise ValueError if the desired packages cannot
+    be reached, as 'install commit' commits everything active.
+    """
+    if committed is None:
+        committed = active
+    wanted = list(active) + [pkg for pkg in committed if pkg not in active]
+    names = set(split_package(pkg)[0] for pkg in wanted)
+
+    def managed(ids):
+        return set(pkg for pkg in ids if split_package(pkg)[0] in names)
+
+    def matches(packages, section):
+        found = set()
+        for pkg in packages:
+            found |= installed.find(pkg, section)
+        return found
+
+    add = [pkg for pkg in wanted if not installed.is_present(pkg)]
+    activate = [pkg for pkg in active if not installed.is_active(pkg)]
+    deactivate = sorted(managed(installed.packages('active')) -
+                        matches(active, 'active'))
+    commit = (any(not installed.is_committed(pkg) for pkg in committed) or
+              bool(managed(installed.packages('committed')) -
+                   matches(committed, 'committed')))
+    if commit and (set(package_id(pkg) for pkg in committed) !=
+                   set(package_id(pkg) for pkg in active)):
+        raise ValueError('cannot commit %s without the other active '
+                         'packages' % ' '.join(committed))
+    kept = matches(wanted, 'active') | matches(wanted, 'inactive')
+    remove = sorted(managed(installed.packages('inactive') | set(deactivate))
+                    - kept)
+
+    plan = list()
+    for operation, packages in (('add', add), ('activate', activate),
+                                ('deactivate', deactivate)):
+        if packages:
+            plan.append(dict(operation=operation, packages=packages))
+    if commit:
+        plan.append(dict(operation='commit', packages=list()))
+    if remove:
+        plan.append(dict(operation='remove', packages=remove))
+    return plan
+
+
+class InstallLogTail(object):
+    """Follow 'show install log <id>' of install operations.
+
+    The number of lines already read is kept per operation, so each read
+    hands on and parses only the lines logged since the last one, while
+    the operation runs and once it has completed.  detail asks for the
+    detailed log, as classic IOS-XR only reports errors there.  While
+    the operation runs, the logs are due for a read every interval
+    seconds.
+    """
+
+    def __init__(self, oper_ids, detail=False, interval=INSTALL_LOG_INTERVAL):
+        self.oper_ids = list(oper_ids)
+        self.detail = detail
+        self.interval = interval
+        self.last_read = None
+        self.offsets = dict((oper_id, 0) for oper_id in self.oper_ids)
+        self.parsers = dict((oper_id, InstallLogParser())
+                            for oper_id in self.oper_ids)
+
+    def commands(self):
+        suffix = ' detail' if self.detail else ''
+        return ['show install log %s%s' % (oper_id, suffix)
+                for oper_id in self.oper_ids]
+
+    def due(self):
+        """Return True if the logs should be read along with the next
+        poll.
+        """
+        return (self.last_read is None or
+                time.time() - self.last_read >= self.interval)
+
+    def feed(self, responses):
+        """Take the responses to commands() and return {id: new lines}."""
+        self.last_read = time.time()
+        new = dict()
+        for oper_id, response in zip(self.oper_ids, responses):
+            lines = response.splitlines()
+            offset = self.offsets[oper_id]
+            if len(lines) < offset:
+                # the device no longer has what was read, start over
+                offset = 0
+                self.parsers[oper_id] = InstallLogParser()
+            new[oper_id] = lines[offset:]
+            self.offsets[oper_id] = len(lines)
+            self.parsers[oper_id].feed(new[oper_id])
+        return new
+
+    def read(self, module):
+        return self.feed(execute_command(module, self.commands(),
+                                         pipeline=True))
+
+    def operations(self):
+        """Return the parse_install_log() records read so far."""
+        operations = list()
+        for oper_id in self.oper_ids:
+            operations.extend(self.parsers[oper_id].operations)
+        return operations
+
+
+def wait_install(module, tail=None):
+    """Wait for the running install operation and return the waiter
+    timings, failing the module if it does not complete.  When the logs
+    of tail are due, they are read along with the poll, pipelined in the
+    same round trip, and their new lines are sent to the module log.
+    """
+    def poll():
+        if tail is None or not tail.due():
+            return execute_command(module, 'show install request')[0]
+        response = execute_command(module,
+                                   ['show install request'] + tail.commands(),
+                                   pipeline=True)
+        for oper_id, lines in sorted(tail.feed(response[1:]).items()):
+            for line in lines:
+                module.log('install operation %s: %s' % (oper_id, line))
+        return response[0]
+
+    return wait_for_install(module, poll)
+
+
+def probe_ssh(host, port=22, timeout=5):
+    """Return True if host accepts a TCP connection on port and sends an
+    SSH banner, without logging in.
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except (socket.error, socket.timeout):
+        return False
+    try:
+        sock.settimeout(timeout)
+        return sock.recv(64).startswith(b'SSH-')
+    except (socket.error, socket.timeout):
+        return False
+    finally:
+        sock.close()
+
+
+class ReloadMonitor(object):
+    """Follow an install operation that may reload the device.
+
+    'show install request' is polled the way InstallWaiter does.  When
+    the session fails and the device no longer sends an SSH banner, it is
+    taken to be reloading: it is probed every interval seconds, backing
+    off up to max_interval, until the banner is back, then the CLI is
+    tried on the same schedule until it accepts a login, and the install
+    operation is followed again until it completes.  A session that fails
+    while the device still answers is just opened again.
+    """
+
+    def __init__(self, module, interval=RELOAD_PROBE_INTERVAL,
+                 max_interval=RELOAD_PROBE_MAX, timeout=RELOAD_TIMEOUT):
+        self.module = module
+        self.host = module.params['host']
+        self.port = module.params['port'] or 22
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.down = False
+
+    def run(self):
+        """Wait for the operation and return dict(completed, reloaded,
+        phases, reason), phases listing the name, elapsed seconds and
+        probes or polls of install (until completion or reload), reload
+        (until the SSH banner is back), login (until the CLI answers) and
+        complete (the operation after the reload).
+        """
+        result = dict(completed=False, reloaded=False, phases=list())
+        timings = InstallWaiter().wait(self._poll)
+        result['phases'].append(dict(phase='install',
+                                     elapsed=timings['elapsed'],
+                                     polls=timings['polls']))
+        if timings['completed'] or not self.down:
+            result['completed'] = timings['completed']
+            result['reason'] = timings.get('reason')
+            return result
+
+        result['reloaded'] = True
+        deadline = time.time() + self.timeout
+        for phase, ready in (('reload', self._answers), ('login', self._login)):
+            elapsed, probes = self._until(ready, deadline)
+            result['phases'].append(dict(phase=phase, elapsed=elapsed,
+                                         probes=probes))
+            if elapsed is None:
+                result['reason'] = ('no %s within %d seconds' %
+                                    (phase, self.timeout))
+                return result
+
+        self.down = False
+        timings = InstallWaiter().wait(self._poll)
+        result['phases'].append(dict(phase='complete',
+                                     elapsed=timings['elapsed'],
+                                     polls=timings['polls']))
+        result['completed'] = timings['completed']
+        result['reason'] = timings.get('reason')
+        return result
+
+    def _poll(self):
+        try:
+            return self.module.run_commands('show install request')[0]
+        except ShellError:
+            pass
+        self._disconnect()
+        if not probe_ssh(self.host, self.port):
+            self.down = True
+            return None
+        # nothing known about the operation, counts as no progress
+        return ''
+
+    def _answers(self):
+        return probe_ssh(self.host, self.port)
+
+    def _login(self):
+        try:
+            self.module.run_commands('show install request')
+            return True
+        except ShellError:
+            self._disconnect()
+            return False
+
+    def _disconnect(self):
+        # the session may be half open after a failed login
+        try:
+            self.module.disconnect()
+        except (AttributeError, EnvironmentError, socket.error):
+            pass
+
+    def _until(self, ready, deadline):
+        """Call ready() with backoff until it returns True or deadline
+        passes.  Return (elapsed seconds or None, number of calls).
+        """
+        start = time.time()
+        interval = self.interval
+        probes = 0
+        while True:
+            probes += 1
+            if ready():
+                return round(time.time() - start, 3), probes
+            if time.time() + interval > deadline:
+                return None, probes
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_interval)
+
+
+def activate_install(module, packages):
+    """Run 'install activate' for packages, answering its prompt, and
+    follow the operation through a reload of the device with a
+    ReloadMonitor.  Return (response, progress): response is None if the
+    session broke before the device answered, as it does when the device
+    goes down for the reload first, and progress is the result of
+    ReloadMonitor.run() with an 'activate' phase in front.
+    """
+    invalidate_fingerprint(module)
+    monitor = ReloadMonitor(module)
+    # drives the raw channel, so it needs a private session
+    if not module.connected:
+        module.connect(persistent=False)
+    # the device may take long to accept the command, but a device that
+    # went down without answering must not hold the session forever
+    shell = module.connection.shell.shell
+    timeout = shell.gettimeout()
+    shell.settimeout(RELOAD_TIMEOUT)
+    start = time.time()
+    try:
+        response = module.run_commands(['install activate ' +
+                                        ' '.join(packages), 'yes\n'])
+    except ShellError:
+        # taken for the device going down, the monitor finds out
+        response = None
+        monitor._disconnect()
+    else:
+        shell.settimeout(timeout)
+    activate = dict(phase='activate', elapsed=round(time.time() - start, 3))
+
+    progress = monitor.run()
+    progress['phases'].insert(0, activate)
+    return response, progress
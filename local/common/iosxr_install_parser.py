@@ -0,0 +1 @@
+../../remote/module_utils/iosxr_install_parser.py
\ No newline at end of file
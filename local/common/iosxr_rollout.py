@@ -0,0 +1,188 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Staged rollout of a per-device task across a fleet: a canary batch
+# first, then fixed-size batches, each run on a pool of threads, stopping
+# once too many devices have failed.  The per-device work is done by the
+# local modules themselves, run the way Ansible runs them, so a rollout
+# behaves exactly like the single-device tasks it replaces.
+#
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from ansible.module_utils.basic import get_exception
+
+
+class RolloutPolicy(object):
+    """How a rollout is split up and when it stops.
+
+    The first canary hosts form a batch of their own; the rest follow in
+    batches of batch_size.  Up to parallelism hosts of a batch run at the
+    same time.  The rollout stops before the next batch if any canary
+    failed or more than max_failures hosts have failed in all.
+    """
+
+    def __init__(self, canary=1, batch_size=10, parallelism=10,
+                 max_failures=0):
+        self.canary = canary
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+        self.max_failures = max_failures
+
+    def batches(self, hosts):
+        hosts = sorted(set(hosts), key=hosts.index)
+        batches = list()
+        if self.canary:
+            batches.append(hosts[:self.canary])
+            hosts = hosts[self.canary:]
+        for start in range(0, len(hosts), self.batch_size):
+            batches.append(hosts[start:start + self.batch_size])
+        return [batch for batch in batches if batch]
+
+
+class ModuleRunner(object):
+    """Run local modules as new Python processes fed a JSON argument
+    file, the way Ansible runs them on the controller.
+    """
+
+    def __init__(self, library, python=sys.executable):
+        self.library = library
+        self.python = python
+        self.workdir = None
+
+    def path(self, name):
+        return os.path.join(self.library, name + '.py')
+
+    def run(self, name, args):
+        """Return the result of module name run with args."""
+        fd, argsfile = tempfile.mkstemp(prefix=name + '-', suffix='.json',
+                                        dir=self.workdir)
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(dict(ANSIBLE_MODULE_ARGS=args), fh)
+            proc = subprocess.Popen([self.python, self.path(name), argsfile],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            out, err = proc.communicate()
+        finally:
+            os.unlink(argsfile)
+        try:
+            return json.loads(out.decode('utf8').strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            return dict(failed=True,
+                        msg=err.decode('utf8', 'replace').strip()[-500:] or
+                            'module %s returned no result' % name)
+
+    def __enter__(self):
+        # argument files hold passwords, keep them in a private directory
+        self.workdir = tempfile.mkdtemp(prefix='iosxr-rollout-')
+        return self
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        self.workdir = None
+
+
+class Rollout(object):
+    """Run task(host) over hosts in the batches of policy.
+
+    task returns a result dict, with failed set when the host failed.
+    run() returns the per-host results, the hosts that failed or were
+    skipped after the rollout stopped, and per batch its hosts, elapsed
+    seconds and throughput in hosts per minute.
+    """
+
+    def __init__(self, policy, task):
+        self.policy = policy
+        self.task = task
+
+    def run(self, hosts):
+        start = time.time()
+        results = dict()
+        batches = list()
+        failed = list()
+        skipped = list()
+        msg = None
+        for number, batch in enumerate(self.policy.batches(hosts)):
+            if msg:
+                skipped.extend(batch)
+                continue
+            batch_start = time.time()
+            batch_results = self._run_batch(batch)
+            elapsed = time.time() - batch_start
+            results.update(batch_results)
+            batch_failed = [host for host in batch
+                            if batch_results[host].get('failed')]
+            failed.extend(batch_failed)
+            batches.append(dict(
+                batch=number,
+                canary=bool(self.policy.canary) and number == 0,
+                hosts=batch, failed=batch_failed,
+                elapsed=round(elapsed, 3),
+                hosts_per_minute=round(60.0 * len(batch) / elapsed, 2)
+                                 if elapsed else None))
+            if batches[-1]['canary'] and batch_failed:
+                msg = 'canary failed on %s' % ', '.join(batch_failed)
+            elif len(failed) > self.policy.max_failures:
+                msg = ('%d hosts failed, more than the %d allowed' %
+                       (len(failed), self.policy.max_failures))
+
+        elapsed = time.time() - start
+        done = len(results)
+        return dict(results=results, batches=batches,
+                    failed_hosts=failed, skipped_hosts=skipped,
+                    aborted=bool(msg), msg=msg,
+                    elapsed=round(elapsed, 3),
+                    hosts_per_minute=round(60.0 * done / elapsed, 2)
+                                     if elapsed else None)
+
+    def _run_batch(self, batch):
+        results = dict()
+        queue = list(batch)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    host = queue.pop(0)
+                try:
+                    result = self.task(host)
+                except Exception:
+                    e = get_exception()
+                    result = dict(failed=True, msg=str(e))
+                with lock:
+                    results[host] = result
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(min(self.policy.parallelism, len(batch)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
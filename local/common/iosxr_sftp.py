@@ -0,0 +1,152 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# SFTP file transfer to and from IOS-XR /disk0:, and staging of package
+# files ahead of an install with checksum verification.
+#
+
+import hashlib
+import os
+import re
+import socket
+import time
+
+import paramiko
+
+from ansible.module_utils.basic import get_exception
+
+XR_DISK = '/disk0:/'
+MD5_RE = re.compile(r"\b([0-9a-fA-F]{32})\b")
+CHUNK_SIZE = 1 << 20
+
+
+class SftpError(Exception):
+    pass
+
+
+def sftp_open(host, port=22, username=None, password=None, timeout=30):
+    """Return (transport, sftp) logged in to host, with the SFTP session
+    in /disk0:.
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout)
+        transport = paramiko.Transport(sock)
+        transport.connect(username=username, password=password)
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp.chdir(XR_DISK)
+    except (socket.error, paramiko.SSHException, IOError):
+        e = get_exception()
+        raise SftpError('failed to open SFTP session to %s:%s - %s' %
+                        (host, port, str(e)))
+    return transport, sftp
+
+def local_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def remote_md5(transport, sftp, name, timeout=600):
+    """Return the MD5 of /disk0:/name.
+
+    The router computes it itself with 'show md5 file', so the file does
+    not cross the network again; if the command cannot run over an exec
+    channel, the file is read back over SFTP instead.
+    """
+    try:
+        channel = transport.open_session()
+        channel.settimeout(timeout)
+        channel.exec_command('show md5 file %s%s' % (XR_DISK, name))
+        output = b''
+        for chunk in iter(lambda: channel.recv(4096), b''):
+            output += chunk
+        channel.close()
+        match = MD5_RE.search(output.decode('utf8', 'replace'))
+        if match:
+            return match.group(1).lower()
+    except (socket.error, paramiko.SSHException):
+        pass
+
+    md5 = hashlib.md5()
+    with sftp.open(name, 'rb') as fh:
+        fh.prefetch()
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def stage_file(transport, sftp, path, md5):
+    """Copy local file path to /disk0: unless a file of the same size
+    and MD5 is there already, and verify the copy.  Return a result dict.
+    """
+    name = os.path.basename(path)
+    size = os.path.getsize(path)
+    result = dict(file=name, changed=False, md5=md5, bytes=0)
+    start = time.time()
+    try:
+        present = sftp.stat(name).st_size == size
+    except IOError:
+        # not there yet
+        present = False
+    if present and remote_md5(transport, sftp, name) == md5:
+        result['elapsed'] = round(time.time() - start, 3)
+        return result
+
+    try:
+        sftp.put(path, name)
+        copied = remote_md5(transport, sftp, name)
+    except (IOError, socket.error, paramiko.SSHException):
+        e = get_exception()
+        raise SftpError('copy of %s failed - %s' % (name, str(e)))
+    if copied != md5:
+        try:
+            sftp.remove(name)
+        except IOError:
+            pass
+        raise SftpError('checksum mismatch for %s: expected %s, got %s' %
+                        (name, md5, copied))
+    elapsed = time.time() - start
+    result.update(changed=True, bytes=size, elapsed=round(elapsed, 3),
+                  mbytes_per_sec=round(size / elapsed / 1e6, 2)
+                                 if elapsed else None)
+    return result
+
+def stage_host(host, files, port=22, username=None, password=None,
+               timeout=30):
+    """Stage files, a dict of local path to MD5, on host.  Return a dict
+    with changed, failed, msg and the result per file.
+    """
+    start = time.time()
+    result = dict(changed=False, failed=False, files=list())
+    transport = None
+    try:
+        transport, sftp = sftp_open(host, port, username, password, timeout)
+        for path in sorted(files):
+            staged = stage_file(transport, sftp, path, files[path])
+            result['files'].append(staged)
+            result['changed'] |= staged['changed']
+    except (SftpError, IOError, socket.error, paramiko.SSHException):
+        e = get_exception()
+        result.update(failed=True, msg=str(e))
+    finally:
+        if transport is not None:
+            transport.close()
+    result['elapsed'] = round(time.time() - start, 3)
+    return result
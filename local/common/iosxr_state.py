@@ -0,0 +1,67 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+# controller-side directory shared by all local modules for state that has
+# to outlive a single task (session broker socket, caches, journals)
+IOSXR_STATE_DIR = os.environ.get('IOSXR_STATE_DIR',
+                                 os.path.expanduser('~/.ansible/iosxr'))
+
+def state_path(*parts):
+    """Return a path under IOSXR_STATE_DIR, creating the directories
+    with owner-only permissions on first use.
+    """
+    path = os.path.join(IOSXR_STATE_DIR, *parts)
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        try:
+            os.makedirs(parent, 0o700)
+        except OSError:
+            # another task created it first
+            if not os.path.isdir(parent):
+                raise
+    return path
+
+@contextmanager
+def locked_json(path):
+    """Load the JSON object stored at path under an exclusive lock and
+    yield it; whatever the caller leaves in it is written back when the
+    block ends.  Tasks running in parallel forks see each other's updates.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    fh = os.fdopen(fd, 'r+')
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            data = json.loads(fh.read() or '{}')
+        except ValueError:
+            # a task killed halfway through a write
+            data = dict()
+        yield data
+        fh.seek(0)
+        fh.truncate()
+        fh.write(json.dumps(data))
+        fh.flush()
+    finally:
+        fh.close()
@@ -0,0 +1,307 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# SoftwareInstall reads for the iosxr_show_install_* modules.
+#
+# Importing the YDK services and the install model and opening a NETCONF
+# provider takes far longer than the read itself, so by default the reads
+# are served by a worker daemon that keeps the model loaded and one
+# provider per (host, port, username, credentials) connected.  It listens
+# on a Unix socket under IOSXR_STATE_DIR, is started on demand the same way
+# as the session broker, and exits after IOSXR_YDK_IDLE_TIMEOUT seconds
+# without use.  If the worker cannot be used, or IOSXR_YDK_WORKER=no, the
+# read runs in the module process as before.
+#
+# Wire protocol: one JSON object per line in each direction.
+#   {"op": "show_install", "view": "active", "host": ..., "port": ...,
+#    "username": ..., "password": ...}
+# Replies are {"ok": true, "stdout": "..."} or {"ok": false, "error": "..."}.
+#
+
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from ansible.module_utils.basic import BOOLEANS_FALSE
+from ansible.module_utils.shell import ShellError
+
+from iosxr_broker import BrokerClient, BrokerError, session_key
+from iosxr_state import state_path
+
+YDK_SOCKET = state_path('ydk.sock')
+YDK_IDLE_TIMEOUT = int(os.environ.get('IOSXR_YDK_IDLE_TIMEOUT', 600))
+YDK_WORKER = os.environ.get('IOSXR_YDK_WORKER', 'yes').lower() not in BOOLEANS_FALSE
+YDK_NETCONF_PORT = 830
+
+
+class YdkError(Exception):
+    pass
+
+
+def _active(info):
+    stdout = "no active package"
+    for package in info.active.active_package_info:
+        stdout = \
+          "active_packages: %sboot_partition_name: %s\nlocation: %s\n" \
+          "node_type: %s\nnumber_of_active_packages: %d" % \
+          (package.active_packages,
+           package.boot_partition_name,
+           package.location,
+           package.node_type,
+           package.number_of_active_packages)
+    return stdout
+
+def _committed(info):
+    return info.committed.committed_package_info[0].committed_packages
+
+def _last_log(info):
+    stdout = "no log available"
+    for logger in info.last_n_operation_logs.last_n_operation_log:
+        stdout = logger.summary.log
+    return stdout
+
+# the part of SoftwareInstall each show_install view returns
+VIEWS = dict(
+    active=_active,
+    committed=_committed,
+    inactive=lambda info: info.inactive.log,
+    last_log=_last_log,
+    log=lambda info: info.all_operations_log.summary.log,
+    request=lambda info: info.request.log,
+    version=lambda info: info.version.log,
+)
+
+
+class Reader(object):
+    """Reads SoftwareInstall over one NETCONF provider.  YDK is imported
+    on first use only, so importing this module stays cheap.
+    """
+
+    def __init__(self, host, port=YDK_NETCONF_PORT, username=None,
+                 password=None):
+        from ydk.providers import NetconfServiceProvider
+        from ydk.services import CRUDService
+        self.provider = NetconfServiceProvider(address=host,
+                                               port=port,
+                                               username=username,
+                                               password=password,
+                                               protocol='ssh')
+        self.crud = CRUDService()
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+
+    def read(self, view):
+        from ydk.models.cisco_ios_xr.Cisco_IOS_XR_spirit_install_instmgr_oper import SoftwareInstall
+        with self.lock:
+            self.last_used = time.time()
+            info = self.crud.read(self.provider, SoftwareInstall())
+            return VIEWS[view](info)
+
+    def close(self):
+        try:
+            self.provider.close()
+        except Exception:
+            pass
+
+
+class ReaderPool(object):
+    """One connected Reader per device and credentials."""
+
+    def __init__(self, idle_timeout=YDK_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._readers = dict()
+        self._lock = threading.Lock()
+
+    def read(self, request):
+        key = session_key(request['host'], request.get('port') or YDK_NETCONF_PORT,
+                          request.get('username'), request.get('password'), None)
+        for attempt in (0, 1):
+            reader = self._get(key, request)
+            try:
+                return reader.read(request['view'])
+            except Exception:
+                # the provider may have gone stale, retry once on a new one
+                self._drop(key, reader)
+                if attempt:
+                    raise
+
+    def _get(self, key, request):
+        with self._lock:
+            reader = self._readers.get(key)
+        if reader is not None:
+            return reader
+
+        # connect outside the lock so one slow device does not stall others
+        reader = Reader(request['host'],
+                        port=request.get('port') or YDK_NETCONF_PORT,
+                        username=request.get('username'),
+                        password=request.get('password'))
+        with self._lock:
+            current = self._readers.setdefault(key, reader)
+        if current is not reader:
+            reader.close()
+        return current
+
+    def _drop(self, key, reader):
+        with self._lock:
+            if self._readers.get(key) is reader:
+                del self._readers[key]
+        reader.close()
+
+    def evict(self):
+        now = time.time()
+        with self._lock:
+            expired = [(key, reader) for key, reader in self._readers.items()
+                       if now - reader.last_used > self.idle_timeout]
+            for key, reader in expired:
+                del self._readers[key]
+        for key, reader in expired:
+            reader.close()
+
+    def size(self):
+        with self._lock:
+            return len(self._readers)
+
+    def close(self):
+        with self._lock:
+            readers = list(self._readers.values())
+            self._readers = dict()
+        for reader in readers:
+            reader.close()
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.touch()
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line.decode('utf8'))
+                if request.get('op') == 'show_install' and request.get('view') in VIEWS:
+                    reply = dict(ok=True, stdout=self.server.pool.read(request))
+                else:
+                    reply = dict(ok=False, error='unexpected request')
+            except Exception:
+                reply = dict(ok=False, error=str(sys.exc_info()[1]))
+            self.wfile.write((json.dumps(reply) + '\n').encode('utf8'))
+            self.wfile.flush()
+            self.server.touch()
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        self.last_active = time.time()
+        socketserver.UnixStreamServer.__init__(self, path, WorkerHandler)
+        os.chmod(path, 0o600)
+
+    def touch(self):
+        self.last_active = time.time()
+
+    # close idle providers and stop once nothing has used the worker
+    def reaper(self, interval=10):
+        while True:
+            time.sleep(interval)
+            self.pool.evict()
+            if (self.pool.size() == 0 and
+                    time.time() - self.last_active > self.pool.idle_timeout):
+                self.shutdown()
+                return
+
+
+def serve(path=YDK_SOCKET):
+    """Run the worker in the foreground; a second instance exits quietly."""
+    lock = open(path + '.lock', 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        return
+
+    if os.path.exists(path):
+        os.unlink(path)
+
+    pool = ReaderPool()
+    server = WorkerServer(path, pool)
+    reaper = threading.Thread(target=server.reaper)
+    reaper.daemon = True
+    reaper.start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        pool.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        lock.close()
+
+
+def show_install(module, view):
+    """Return the stdout of an iosxr_show_install_<view> module."""
+    params = module.params
+    if YDK_WORKER:
+        client = BrokerClient(path=YDK_SOCKET, timeout=30,
+                              script=__file__, name='YDK worker')
+        try:
+            client.connect()
+            reply = client.request(op='show_install', view=view,
+                                   host=params['host'],
+                                   port=YDK_NETCONF_PORT,
+                                   username=params['username'],
+                                   password=params['password'])
+            return reply['stdout']
+        except BrokerError:
+            # worker missing or gone, read in this process instead
+            pass
+        except ShellError:
+            e = sys.exc_info()[1]
+            module.fail_json(msg='failed to read install state from %s - %s' %
+                                 (params['host'], str(e)))
+        finally:
+            client.close()
+
+    try:
+        reader = Reader(params['host'], username=params['username'],
+                        password=params['password'])
+        try:
+            return reader.read(view)
+        finally:
+            reader.close()
+    except Exception:
+        e = sys.exc_info()[1]
+        module.fail_json(msg='failed to read install state from %s - %s' %
+                             (params['host'], str(e)))
+
+
+if __name__ == '__main__':
+    serve(*sys.argv[1:2])
@@ -18,8 +18,8 @@
 #
 #------------------------------------------------------------------------------
 
-import paramiko
 from ansible.module_utils.basic import *
+from iosxr_sftp import *
 
 DOCUMENTATION = """
 ---
@@ -108,13 +108,12 @@ def main ():
     path = args["path"]
     filename = args["filename"]
     port = 22
-    xrpath = "/disk0:/"
 
-    transport = paramiko.Transport ((host, port))
-    transport.connect (username=username, password=password)
-
-    sftp = paramiko.SFTPClient.from_transport (transport)
-    sftp.chdir(xrpath)
+    try:
+        transport, sftp = sftp_open(host, port, username, password)
+    except SftpError:
+        e = get_exception()
+        module.fail_json(msg=str(e))
 
     result = dict (changed = False)
     try:
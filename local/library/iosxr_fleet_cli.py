@@ -0,0 +1,136 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+from ansible.module_utils.basic import *
+
+try:
+    from iosxr_fleet import FleetExecutor
+    HAS_ASYNCIO = True
+except (ImportError, SyntaxError):
+    HAS_ASYNCIO = False
+
+DOCUMENTATION = """
+---
+module: iosxr_fleet_cli
+author: Adisorn Ermongkonchai
+short_description: Run CLI commands on many IOS-XR devices at once
+description:
+  - Run a list of IOS-XR CLI commands on a list of devices concurrently
+    from a single process and return the responses per host.
+    Requires Python 3.5 or later on the Ansible control host.
+options:
+  hosts:
+    description:
+      - list of IP addresses or hostnames (resolvable by Ansible control
+        host) of the target IOS-XR nodes.
+    required: true
+  username:
+    description:
+      - username used to login to IOS-XR
+    required: false
+    default: none
+  password:
+    description:
+      - password used to login to IOS-XR
+    required: false
+    default: none
+  commands:
+    description:
+      - list of IOS-XR CLI command strings
+    required: true
+  concurrency:
+    description:
+      - maximum number of sessions open at the same time
+    required: false
+    default: 50
+  per_host_concurrency:
+    description:
+      - maximum number of sessions open to any single device; the
+        command list is spread over that many sessions
+    required: false
+    default: 1
+  timeout:
+    description:
+      - seconds to wait for a device to connect or answer a command
+    required: false
+    default: 30
+"""
+
+EXAMPLES = """
+- iosxr_fleet_cli:
+    hosts: "{{ groups['ss-xr'] }}"
+    username: cisco
+    password: cisco
+    commands:
+      - show version
+      - show install active
+    concurrency: 100
+  run_once: true
+"""
+
+RETURN = """
+results:
+  description: per host dict of stdout, stdout_lines, failed, msg and
+               elapsed seconds
+  returned: always
+failed_hosts:
+  description: list of hosts where at least one command failed
+  returned: always
+"""
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            hosts = dict(required=True, type='list'),
+            port = dict(required=False, type='int', default=22),
+            username = dict(required=False, default=None),
+            password = dict(required=False, default=None, no_log=True),
+            ssh_keyfile = dict(required=False, default=None, type='path'),
+            commands = dict(required=True, type='list'),
+            concurrency = dict(required=False, type='int', default=50),
+            per_host_concurrency = dict(required=False, type='int', default=1),
+            timeout = dict(required=False, type='int', default=30)
+        ),
+        supports_check_mode = False
+    )
+    if not HAS_ASYNCIO:
+        module.fail_json(msg='iosxr_fleet_cli requires Python 3.5 or later')
+
+    args = module.params
+    if args['concurrency'] < 1 or args['per_host_concurrency'] < 1:
+        module.fail_json(msg='concurrency limits must be at least 1')
+
+    executor = FleetExecutor(concurrency=args['concurrency'],
+                             per_host=args['per_host_concurrency'],
+                             port=args['port'],
+                             username=args['username'],
+                             password=args['password'],
+                             ssh_keyfile=args['ssh_keyfile'],
+                             timeout=args['timeout'])
+    results = executor.run(args['hosts'], args['commands'])
+
+    result = dict(changed=False)
+    result['results'] = results
+    result['failed_hosts'] = sorted(host for host, res in results.items()
+                                    if res['failed'])
+    return module.exit_json(**result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+from ansible.module_utils.basic import *
+from iosxr_rollout import *
+
+DOCUMENTATION = """
+---
+module: iosxr_fleet_install
+author: Adisorn Ermongkonchai
+short_description: Roll SMU packages out to many IOS-XR devices in stages
+description:
+  - Add, activate and commit SMU packages on a list of devices, a canary
+    batch first and then the rest in batches, several devices at a time.
+    Each device goes through the install states in order, every state
+    being an iosxr_install_package (or xr32_install_package) run against
+    that device.  The rollout stops when the canary fails or too many
+    devices have failed.
+options:
+  hosts:
+    description:
+      - list of IP addresses or hostnames (resolvable by Ansible control
+        host) of the target IOS-XR nodes, e.g. an inventory group
+    required: true
+  username:
+    description:
+      - username used to login to IOS-XR
+    required: false
+    default: none
+  password:
+    description:
+      - password used to login to IOS-XR
+    required: false
+    default: none
+  pkgpath:
+    description:
+      - path to where the package files are stored, needed for 'present'
+    required: false
+    default: none
+  pkgname:
+    description:
+      - IOS-XR software package without file extension, or a list of them
+    required: true
+  states:
+    description:
+      - install states each device is taken through, in order
+    required: false
+    default: ['present', 'activated', 'committed']
+  install_module:
+    description:
+      - module that runs the install states on each device
+    required: false
+    default: iosxr_install_package
+    choices: ['iosxr_install_package', 'xr32_install_package']
+  canary:
+    description:
+      - number of devices installed first, on their own; the rollout stops
+        if any of them fails
+    required: false
+    default: 1
+  batch_size:
+    description:
+      - number of devices per batch after the canary
+    required: false
+    default: 10
+  parallelism:
+    description:
+      - maximum number of devices of a batch installed at the same time
+    required: false
+    default: 10
+  max_failures:
+    description:
+      - number of failed devices tolerated; once more have failed, no
+        further batch is started
+    required: false
+    default: 0
+  library:
+    description:
+      - directory holding the install module, found through
+        ANSIBLE_LIBRARY by default
+    required: false
+    default: none
+"""
+
+EXAMPLES = """
+- iosxr_fleet_install:
+    hosts: "{{ groups['ss-xr'] }}"
+    username: cisco
+    password: cisco
+    pkgpath: "tftp://192.168.1.1"
+    pkgname:
+      - "xrv9k-ospf-1.0.0.0-r61102I"
+      - "xrv9k-mpls-1.0.0.0-r61102I"
+    canary: 1
+    batch_size: 20
+    parallelism: 10
+    max_failures: 2
+  run_once: true
+"""
+
+RETURN = """
+results:
+  description: per host dict of failed, msg, elapsed seconds and the
+               result of every install state run
+  returned: always
+batches:
+  description: per batch its hosts, failed hosts, elapsed seconds and
+               hosts installed per minute
+  returned: always
+failed_hosts:
+  description: list of hosts where an install state failed
+  returned: always
+skipped_hosts:
+  description: list of hosts not installed because the rollout stopped
+  returned: always
+hosts_per_minute:
+  description: hosts installed per minute over the whole rollout
+  returned: always
+"""
+
+INSTALL_STATES = ['present', 'activated', 'deactivated', 'absent',
+                  'updated', 'committed']
+
+# directory in ANSIBLE_LIBRARY holding the install module
+def find_library(name):
+    for path in os.environ.get('ANSIBLE_LIBRARY', '').split(os.pathsep):
+        if path and os.path.exists(os.path.join(path, name + '.py')):
+            return path
+    return None
+
+# take one host through the install states, stop at the first failure
+def install_host(runner, name, args, states, host):
+    start = time.time()
+    result = dict(changed=False, failed=False, states=list())
+    for state in states:
+        state_args = dict(args, host=host, state=state)
+        state_result = runner.run(name, state_args)
+        state_result['state'] = state
+        result['states'].append(state_result)
+        result['changed'] |= bool(state_result.get('changed'))
+        if state_result.get('failed'):
+            result['failed'] = True
+            result['msg'] = '%s: %s' % (state, state_result.get('msg'))
+            break
+    result['elapsed'] = round(time.time() - start, 3)
+    return result
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            hosts = dict(required=True, type='list'),
+            port = dict(required=False, type='int', default=22),
+            username = dict(required=False, default=None),
+            password = dict(required=False, default=None, no_log=True),
+            ssh_keyfile = dict(required=False, default=None, type='path'),
+            pkgpath = dict(required=False, default=None),
+            pkgname = dict(required=True, type='list'),
+            states = dict(required=False, type='list',
+                          default=['present', 'activated', 'committed']),
+            install_module = dict(required=False,
+                                  default='iosxr_install_package',
+                                  choices=['iosxr_install_package',
+                                           'xr32_install_package']),
+            canary = dict(required=False, type='int', default=1),
+            batch_size = dict(required=False, type='int', default=10),
+            parallelism = dict(required=False, type='int', default=10),
+            max_failures = dict(required=False, type='int', default=0),
+            library = dict(required=False, default=None, type='path')
+        ),
+        supports_check_mode = False
+    )
+    args = module.params
+    name = args['install_module']
+
+    unknown = [state for state in args['states']
+               if state not in INSTALL_STATES]
+    if unknown:
+        module.fail_json(msg='unknown install states: %s' % ', '.join(unknown))
+    if args['canary'] < 0 or args['max_failures'] < 0:
+        module.fail_json(msg='canary and max_failures cannot be negative')
+    if args['batch_size'] < 1 or args['parallelism'] < 1:
+        module.fail_json(msg='batch_size and parallelism must be at least 1')
+
+    library = args['library'] or find_library(name)
+    if not library or not os.path.exists(os.path.join(library, name + '.py')):
+        module.fail_json(msg='cannot find %s.py, set library to the '
+                             'directory holding it' % name)
+
+    install_args = dict(port=args['port'],
+                        username=args['username'],
+                        password=args['password'],
+                        ssh_keyfile=args['ssh_keyfile'],
+                        pkgpath=args['pkgpath'],
+                        pkgname=args['pkgname'])
+    policy = RolloutPolicy(canary=args['canary'],
+                           batch_size=args['batch_size'],
+                           parallelism=args['parallelism'],
+                           max_failures=args['max_failures'])
+    with ModuleRunner(library) as runner:
+        rollout = Rollout(policy,
+                          lambda host: install_host(runner, name, install_args,
+                                                    args['states'], host))
+        result = rollout.run(args['hosts'])
+
+    result['changed'] = any(res.get('changed')
+                            for res in result['results'].values())
+    if result['aborted'] or result['failed_hosts']:
+        if not result['msg']:
+            result['msg'] = 'failed on %s' % ', '.join(result['failed_hosts'])
+        module.fail_json(**result)
+    del result['msg']
+    module.exit_json(**result)
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,13 @@ options:
       - password used to login to IOS-XR
     required: false
     default: none
+  dest:
+    description:
+      - file on the Ansible control host to write the configuration to;
+        the configuration is streamed to the file as it arrives and is
+        not returned in stdout
+    required: false
+    default: none
 """
 
 EXAMPLES = """
@@ -52,6 +59,12 @@ EXAMPLES = """
     host: '{{ ansible_ssh_host }}'
     username: cisco
     password: cisco
+
+- iosxr_get_config:
+    host: '{{ ansible_ssh_host }}'
+    username: cisco
+    password: cisco
+    dest: 'backup/{{ inventory_hostname }}.cfg'
 """
 
 RETURN = """
@@ -61,6 +74,15 @@ stdout:
 stdout_lines:
   description: list of response lines
   returned: always
+dest:
+  description: file the configuration was written to
+  returned: when dest is set
+lines:
+  description: number of lines written to dest
+  returned: when dest is set
+size:
+  description: size of dest in bytes
+  returned: when dest is set
 """
 
 def main():
@@ -68,11 +90,21 @@ def main():
         argument_spec = dict(
             username = dict(required=False, default=None),
             password = dict(required=False, default=None),
+            dest = dict(required=False, default=None, type='path'),
         ),
         supports_check_mode = False
     )
+    dest = module.params['dest']
     result = dict(changed=False)
-    result['stdout'] = module.get_config()
+    if dest:
+        lines = 0
+        for line in module.execute_stream('show running-config', dest=dest):
+            lines += 1
+        result['dest'] = dest
+        result['lines'] = lines
+        result['size'] = os.path.getsize(dest)
+    else:
+        result['stdout'] = module.get_config()
     return module.exit_json(**result)
 
 if __name__ == "__main__":
@@ -46,6 +46,13 @@ options:
       - password used to login to IOS-XR
     required: false
     default: none
+  dest:
+    description:
+      - directory on the Ansible control host to write the responses to,
+        one file per command; the responses are streamed to the files as
+        they arrive and each fact holds its file name instead
+    required: false
+    default: none
 """
 
 EXAMPLES = """
@@ -53,6 +60,12 @@ EXAMPLES = """
     host: '{{ ansible_ssh_host }}'
     username: cisco
     password: cisco
+
+- iosxr_get_facts:
+    host: '{{ ansible_ssh_host }}'
+    username: cisco
+    password: cisco
+    dest: 'facts/{{ inventory_hostname }}'
 """
 
 RETURN = """
@@ -69,6 +82,7 @@ def main():
         argument_spec = dict(
             username = dict(required=False, default=None),
             password = dict(required=False, default=None),
+            dest = dict(required=False, default=None, type='path'),
         ),
         supports_check_mode = False
     )
@@ -87,8 +101,23 @@ def main():
              'show ipv6 int brief' ]
 
     result = dict(changed=False)
-    for cmd in cmds:
-        result[cmd] = str(execute_command(module, cmd)).split(r'\n')
+    dest = module.params['dest']
+    if dest:
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+        for cmd in cmds:
+            path = os.path.join(dest, cmd.replace(' ', '_') + '.txt')
+            for line in module.execute_stream(cmd, dest=path):
+                pass
+            result[cmd] = path
+        return module.exit_json(**result)
+
+    # none of these prompt, so send them pipelined in one round trip
+    responses = execute_command(module, cmds, pipeline=True)
+
+    for cmd, response in zip(cmds, responses):
+        result[cmd] = str([response]).split(r'\n')
+    update_fingerprint(module, responses[cmds.index('show version')])
     return module.exit_json(**result)
 
 if __name__ == "__main__":
@@ -22,6 +22,7 @@ from ansible.module_utils.basic import *
 from ansible.module_utils.shell import *
 from ansible.module_utils.netcfg import *
 from iosxr_common import *
+from iosxr_install import *
 from iosxr import *
 
 DOCUMENTATION = """
@@ -52,17 +53,35 @@ options:
       - path to where the package file is stored
         e.g. tftp://192.168.1.1
              ftp://192.168.1.1
-             /disk0:
+             /disk0: (files copied ahead with iosxr_stage_package)
     required: Only when state is 'present'
   pkgname:
     description:
-      - IOS-XR software package without file extension
+      - IOS-XR software package without file extension, or a list of
+        them to add, update, activate, deactivate or remove together in
+        a single install operation
         e.g. The package name for 'xrv9k-ospf-1.0.0.0-r61102I.x86_64.rpm'
              is 'xrv9k-ospf-1.0.0.0-r61102I'
-    required: true
+    required: Unless state is 'desired'
+  active:
+    description:
+      - packages that must be active when state is 'desired'; any other
+        version of them is deactivated and removed, packages by other
+        names are left alone
+    required: Only when state is 'desired'
+  committed:
+    description:
+      - packages that must be committed when state is 'desired'; as
+        'install commit' commits all active packages, this can only
+        differ from active if it is committed already
+    required: false
+    default: the packages in active
   state:
     description:
-      - represent state of the package being installed
+      - represent state of the package being installed; 'desired' adds,
+        activates, deactivates, commits and removes packages as needed to
+        reach active and committed, with one install operation of each
+        kind at most, and in check mode only returns the plan
     required: false
     default: 'present'
     choices: ['present',
@@ -70,7 +89,8 @@ options:
               'updated',
               'activated',
               'deactivated',
-              'committed']
+              'committed',
+              'desired']
 """
 
 EXAMPLES = """
@@ -88,176 +108,281 @@ EXAMPLES = """
     pkgpath: "https://my_secure_server"
     pkgname: "xrv9k-mpls-1.0.0.0-r60204I.CSCxr33333"
     state: updated
+
+- iosxr_install_package:
+    host: '{{ ansible_ssh_host }}'
+    username: cisco
+    password: cisco
+    pkgname:
+      - "xrv9k-ospf-1.0.0.0-r61102I"
+      - "xrv9k-mpls-1.0.0.0-r61102I"
+    state: activated
+
+- iosxr_install_package:
+    host: '{{ ansible_ssh_host }}'
+    username: cisco
+    password: cisco
+    pkgpath: "tftp://192.168.1.1"
+    active:
+      - "xrv9k-ospf-1.0.0.1-r61102I"
+      - "xrv9k-mpls-1.0.0.0-r61102I"
+    state: desired
 """
 
 RETURN = """
+plan:
+  description: install operations needed to reach the desired state, in
+               order, each with its packages; once run, also with its
+               install_log and install_timings
+  returned: when state is 'desired'
 stdout:
-  description: raw response
+  description: a summary line per install operation and a line per
+               package that needed no operation
   returned: always
 stdout_lines:
   description: list of response lines
   returned: always
+install_log:
+  description: per install operation its id, user, command, status
+               (success, failed, aborted or running), actions, errors,
+               and number of log lines
+  returned: when an install operation ran
+install_timings:
+  description: seconds the install operation took in all and per stage
+               reported by 'show install request', and the number of polls
+  returned: when an install operation ran
 """
 
-# check if another install command in progress
-def is_legacy_iosxr(module):
-    command = "show version"
-    response = execute_command(module, command)
-    return "Build Information:" not in response[0]
-
 # check if another install command in progress
 def is_install_in_progress(module):
     command = "show install request"
     response = execute_command(module, command)
-    return "No install operation in progress" not in response[0]
+    return parse_install_request(response[0]) is not None
 
-# check if the package is already added
-def is_package_already_added(module, pkg_name):
-    command = "show install inactive"
-    response = execute_command(module, command)
-    return pkg_name in response[0]
-
-# check if the package is already active
-def is_package_already_active(module, pkg_name):
-    command = "show install active"
-    response = execute_command(module, command)
-    return pkg_name in response[0]
-
-# wait for install command to complete
-def wait_install_response(module, oper_id):
-    retries = 100
-    while retries > 0:
-        if is_install_in_progress(module):
-            retries -= 1
-            time.sleep(3)
-        else:
-            response = list()
-            for inst_id in oper_id:
-                command = "show install log " + inst_id
-                rmsg = module.execute(command)
-                if 'aborted' in rmsg[0]:
-                    module.fail_json(msg=rmsg[0])
-                response.append(rmsg[0])
-            return response
-    else:
-        module.fail_json(msg="timeout waiting for install to complete")
+# wait for install operations to complete following their logs, then
+# return a summary line per operation
+def wait_install_response(module, oper_id, result):
+    tail = InstallLogTail(oper_id)
+    result['install_timings'] = wait_install(module, tail)
+    tail.read(module)
+    operations = tail.operations()
+    result['install_log'] = operations
+    failed = install_log_failed(operations)
+    if failed:
+        module.fail_json(msg="\n".join(install_log_summary(op)
+                                       for op in failed),
+                         install_log=operations)
+    return [install_log_summary(op) + "\n" for op in operations]
 
 # get install operation id from log
 def get_operation_id(response):
     pattern = re.compile(r"operation (\d+) started")
     return pattern.findall(response[0])
 
-# add package only when it is not already added or activated
-def install_add(module, pkg_path, pkg_name):
+# start one install operation and wait for every operation it reports
+def install_operation(module, command, result):
+    response = execute_command(module, command)
+    oper_id = get_operation_id(response)
+    return wait_install_response(module, oper_id, result)
+
+# add packages that are not already added or activated
+def install_add(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        response = [pkg_name + " package is already active\n"]
-    elif is_package_already_added(module, pkg_name):
-        response = [pkg_name + " package is already added\n"]
-    elif pkg_path == None:
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            response.append(pkg_name + " package is already active\n")
+        elif installed.is_inactive(pkg_name):
+            response.append(pkg_name + " package is already added\n")
+        else:
+            pending.append(pkg_name)
+
+    if pending and pkg_path == None:
         module.fail_json(msg="package path required")
-    else:
-        command = ("install add source " +
-                   pkg_path + " " +
-                   pkg_name + ".x86_64.rpm")
-        response = execute_command(module, command)
-        oper_id = get_operation_id(response)
-        response = wait_install_response(module, oper_id)
+    elif pending:
+        command = ("install add source " + pkg_path + " " +
+                   " ".join(pkg + ".x86_64.rpm" for pkg in pending))
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: all(s.is_present(pkg) for pkg in pending),
+                       " ".join(pending) + " not added", response)
         result['changed'] = True
 
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
     return result
 
-# remove package only when it is in inactive state
-def install_remove(module, pkg_path, pkg_name):
+# remove packages only when they are in inactive state
+def install_remove(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        error = pkg_name + " is active, please deactivate first"
+    active = [pkg for pkg in pkg_names if installed.is_active(pkg)]
+    if active:
+        error = " ".join(active) + " is active, please deactivate first"
         module.fail_json(msg=error)
-    elif is_package_already_added(module, pkg_name):
-        command = "install remove " + pkg_name
-        response = execute_command(module, command)
-        oper_id = get_operation_id(response)
-        response = wait_install_response(module, oper_id)
+
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_inactive(pkg_name):
+            pending.append(pkg_name)
+        else:
+            response.append(pkg_name + " package has already been removed\n")
+
+    if pending:
+        command = "install remove " + " ".join(pending)
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: not any(s.is_present(pkg) for pkg in pending),
+                       " ".join(pending) + " not removed", response)
         result['changed'] = True
-    else:
-        response = [pkg_name + " package has already been removed\n"]
 
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
     return result
 
-# update package
-def install_update(module, pkg_path, pkg_name):
+# update packages that are not already active
+def install_update(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        response = [pkg_name + " package is already active\n"]
-    else:
-        command = ("install update source " +
-                   pkg_path + " " +
-                   pkg_name + ".x86_64.rpm")
-        response = execute_command(module, command)
-        if 'Error:' in response or 'Exception:' in response:
-            module.fail_json(msg=response)
-        oper_id = get_operation_id(response)
-        response = wait_install_response(module, oper_id)
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            response.append(pkg_name + " package is already active\n")
+        else:
+            pending.append(pkg_name)
+
+    if pending:
+        command = ("install update source " + pkg_path + " " +
+                   " ".join(pkg + ".x86_64.rpm" for pkg in pending))
+        rmsg = execute_command(module, command)
+        if 'Error:' in rmsg or 'Exception:' in rmsg:
+            module.fail_json(msg=rmsg)
+        oper_id = get_operation_id(rmsg)
+        response += wait_install_response(module, oper_id, result)
+        verify_install(module,
+                       lambda s: all(s.is_active(pkg) for pkg in pending),
+                       " ".join(pending) + " not active after update",
+                       response)
         result['changed'] = True
 
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
     return result
 
-# activate package only when it has been added
-def install_activate(module, pkg_path, pkg_name):
+# activate packages only when they have been added
+def install_activate(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        response = [pkg_name + " package is already active\n"]
-    elif is_package_already_added(module, pkg_name):
-        command = "install activate " + pkg_name
-        response = execute_command(module, command)
-        oper_id = get_operation_id(response)
-        response = wait_install_response(module, oper_id)
-        result['changed'] = True
-    else:
-        error = pkg_name + " must be present before activate"
+    missing = [pkg for pkg in pkg_names if not installed.is_present(pkg)]
+    if missing:
+        error = " ".join(missing) + " must be present before activate"
         module.fail_json(msg=error)
 
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            response.append(pkg_name + " package is already active\n")
+        else:
+            pending.append(pkg_name)
+
+    if pending:
+        command = "install activate " + " ".join(pending)
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: all(s.is_active(pkg) for pkg in pending),
+                       " ".join(pending) + " not activated", response)
+        result['changed'] = True
+
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
     return result
 
-# deactivate package only when it is in active state
-def install_deactivate(module, pkg_path, pkg_name):
+# deactivate packages only when they are in active state
+def install_deactivate(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        command = "install deactivate " + pkg_name
-        response = execute_command(module, command)
-        oper_id = get_operation_id(response)
-        response = wait_install_response(module, oper_id)
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            pending.append(pkg_name)
+        elif installed.is_inactive(pkg_name):
+            response.append(pkg_name + " package is already deactivated\n")
+        else:
+            response.append(pkg_name + " package has already been removed\n")
+
+    if pending:
+        command = "install deactivate " + " ".join(pending)
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: not any(s.is_active(pkg) for pkg in pending),
+                       " ".join(pending) + " not deactivated", response)
         result['changed'] = True
-    elif is_package_already_added(module, pkg_name):
-        response = [pkg_name + " package is already deactivated\n"]
-    else:
-        response = [pkg_name + " package has already been removed\n"]
 
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
     return result
   
 # commit active packages
-def install_commit(module, pkg_path, pkg_name):
-    command = "install commit"
-    response = execute_command(module, command)
-    oper_id = get_operation_id(response)
-    response = wait_install_response(module, oper_id)
-
+def install_commit(module, installed, pkg_path, pkg_names):
     result = dict(changed=True)
+    response = install_operation(module, "install commit", result)
+    verify_install(module, lambda s: s.is_committed_state(),
+                   "active packages were not committed", response)
+
+    result['stdout'] = response
+    result['stdout_lines'] = str(result['stdout']).split(r'\n')
+    return result
+
+# install command that carries out one operation of plan_install()
+def plan_command(step, pkg_path):
+    if step['operation'] == 'add':
+        return ("install add source " + pkg_path + " " +
+                " ".join(pkg + ".x86_64.rpm" for pkg in step['packages']))
+    return " ".join(["install", step['operation']] + step['packages'])
+
+# take the device to the desired active and committed packages, planning
+# again from the install state read after every operation
+def install_desired(module, installed, pkg_path, active, committed):
+    result = dict(changed=False)
+    try:
+        plan = plan_install(installed, active, committed)
+    except ValueError:
+        e = get_exception()
+        module.fail_json(msg=str(e))
+    if plan and plan[0]['operation'] == 'add' and pkg_path == None:
+        module.fail_json(msg="package path required", plan=plan)
+    result['plan'] = plan
+
+    response = list()
+    done = list()
+    if not module.check_mode:
+        while plan:
+            step = plan[0]
+            if any((step['operation'], step['packages']) ==
+                   (prev['operation'], prev['packages']) for prev in done):
+                module.fail_json(msg="install %s did not take effect" %
+                                     step['operation'],
+                                 plan=done, stdout=response)
+            if step['operation'] in ('activate', 'deactivate'):
+                invalidate_fingerprint(module)
+            response += install_operation(module, plan_command(step, pkg_path),
+                                          step)
+            done.append(step)
+            installed = fetch_install_state(module)
+            try:
+                plan = plan_install(installed, active, committed)
+            except ValueError:
+                e = get_exception()
+                module.fail_json(msg=str(e), plan=done, stdout=response)
+        result['plan'] = done
+
+    result['changed'] = bool(result['plan'])
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
     return result
@@ -268,20 +393,33 @@ def main():
             username = dict(required=False, default=None),
             password = dict(required=False, default=None),
             pkgpath = dict(required=False, default=None),
-            pkgname = dict(required=True, default=None),
+            pkgname = dict(required=False, default=None, type='list'),
+            active = dict(required=False, default=None, type='list'),
+            committed = dict(required=False, default=None, type='list'),
             state = dict(required=False, default='present',
                          choices = ['present',
                                     'absent',
                                     'updated',
                                     'activated',
                                     'deactivated',
-                                    'committed'])
+                                    'committed',
+                                    'desired'])
         ),
-        supports_check_mode = False
+        supports_check_mode = True
     )
     args = module.params
     state = args['state']
 
+    if state == 'desired' and args['active'] is None:
+        module.fail_json(msg="active is required when state is 'desired'")
+    if state != 'desired' and not args['pkgname']:
+        module.fail_json(msg="pkgname is required")
+    # only a desired state can be planned without installing
+    if module.check_mode and state != 'desired':
+        module.exit_json(skipped=True,
+                         msg="check mode is only supported for state "
+                             "'desired'")
+
     # cannot run on classic XR
     if is_legacy_iosxr(module):
         module.fail_json(msg=
@@ -299,7 +437,21 @@ def main():
         'deactivated': install_deactivate,
         'committed':   install_commit
     }
-    result = install[state](module, args['pkgpath'], args['pkgname'])
+    # one snapshot answers every state check; commit needs none
+    installed = None
+    if state != 'committed':
+        installed = fetch_install_state(module)
+
+    if state == 'desired':
+        result = install_desired(module, installed, args['pkgpath'],
+                                 args['active'], args['committed'])
+        module.exit_json(**result)
+
+    # software changes make the cached version stale
+    if state in ('updated', 'activated', 'deactivated'):
+        invalidate_fingerprint(module)
+    result = install[state](module, installed, args['pkgpath'],
+                            args['pkgname'])
   
     module.exit_json(**result)
 
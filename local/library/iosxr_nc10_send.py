@@ -23,6 +23,7 @@ from ansible.module_utils.shell import *
 from ansible.module_utils.netcfg import *
 from iosxr_common import *
 from iosxr import *
+from iosxr_channel import ChannelReader, ChannelError
 
 DOCUMENTATION = """
 ---
@@ -93,6 +94,10 @@ def main():
         supports_check_mode = False
     )
     args = module.params
+
+    # this module drives the raw channel, so it needs a private session
+    module.connect(persistent=False)
+
     xml_file = module.params['xmlfile']
 
     result = dict(changed=False)
@@ -104,10 +109,11 @@ def main():
     module.connection.shell.shell.send(xml_text)
     module.connection.shell.shell.send(']]>]]>\n')
 
-    # collect all responses 1024 bytes at a time
-    response = module.connection.shell.shell.recv(1024)
-    while ']]>]]>' not in response:
-        response += module.connection.shell.shell.recv(1024)
+    try:
+        response = ChannelReader(module.connection.shell.shell).read_until(']]>]]>')
+    except ChannelError:
+        e = get_exception()
+        return module.fail_json(msg=str(e))
 
     result['stdout'] = response
     if 'rpc-error' in response:
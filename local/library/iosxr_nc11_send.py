@@ -21,6 +21,8 @@
 from ansible.module_utils.basic import *
 import paramiko
 
+from iosxr_channel import ChannelReader, ChannelError
+
 DOCUMENTATION = """
 ---
 module: iosxr_nc11_send
@@ -124,10 +126,14 @@ def main():
     channel = transport.open_channel('session')
     channel.invoke_subsystem('netconf')
 
+    reader = ChannelReader(channel)
+
     # read hello msg
-    response = channel.recv(1024)
-    while ']]>]]>' not in response:
-        response += channel.recv(1024)
+    try:
+        reader.read_until(']]>]]>')
+    except ChannelError:
+        e = get_exception()
+        return module.fail_json(msg=str(e))
 
     result = dict(changed=False)
     xml_text = open(xml_file).read()
@@ -139,10 +145,11 @@ def main():
     channel.send(HELLO)
     channel.send(xml_msg)
 
-    # collect all responses 1024 bytes at a time
-    response = channel.recv(1024)
-    while '##' not in response:
-        response += channel.recv(1024)
+    try:
+        response = reader.read_until('##')
+    except ChannelError:
+        e = get_exception()
+        return module.fail_json(msg=str(e))
 
     # commit changes
     if result['changed']:
@@ -113,6 +113,7 @@ def main():
     commands = [reload_command]
     commands.append('\r')
     commands.append('\r')
+    invalidate_fingerprint(module)
     response = execute_command(module, commands)
   
     result['stdout'] = response
@@ -19,9 +19,7 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
-from ydk.providers import NetconfServiceProvider
-from ydk.services import CRUDService
-from ydk.models.cisco_ios_xr.Cisco_IOS_XR_spirit_install_instmgr_oper import SoftwareInstall
+from iosxr_ydk import show_install
 
 def main():
     module = AnsibleModule(
@@ -33,24 +31,8 @@ def main():
         supports_check_mode = False
     )
 
-    args = module.params
-
-    # establish ssh connection
-    provider = NetconfServiceProvider(address=args['host'],
-                                      port=830,
-                                      username=args['username'],
-                                      password=args['password'],
-                                      protocol='ssh')
-    # establish CRUD service
-    crud = CRUDService()
-
-    # retrieve software install version
-    install = SoftwareInstall()
-    info = crud.read(provider, install)
-    committed = info.committed.committed_package_info[0]
-
     result = dict(changed=False)
-    result['stdout'] = committed.committed_packages
+    result['stdout'] = show_install(module, 'committed')
     return module.exit_json(**result)
 
 if __name__ == "__main__":
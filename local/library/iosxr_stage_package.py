@@ -0,0 +1,169 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+from ansible.module_utils.basic import *
+from iosxr_install_parser import *
+from iosxr_rollout import *
+from iosxr_sftp import *
+
+DOCUMENTATION = """
+---
+module: iosxr_stage_package
+author: Adisorn Ermongkonchai
+short_description: Copy package files to /disk0: on many IOS-XR devices
+description:
+  - Copy package files (RPM, PIE, or ISO) from the Ansible control host to
+    /disk0: on a list of devices over SFTP, several devices at a time,
+    ahead of the maintenance window.  A device that already holds a file
+    of the same size and MD5 is not copied to again, and every copy is
+    checked against the MD5 of the local file.  iosxr_install_package,
+    xr32_install_package, and iosxr_upgrade_package can then install from
+    pkgpath '/disk0:'.
+options:
+  hosts:
+    description:
+      - list of IP addresses or hostnames (resolvable by Ansible control
+        host) of the target IOS-XR nodes, e.g. an inventory group
+    required: true
+  username:
+    description:
+      - username used to login to IOS-XR
+    required: false
+    default: none
+  password:
+    description:
+      - password used to login to IOS-XR
+    required: false
+    default: none
+  files:
+    description:
+      - list of local paths of the package files
+    required: true
+  md5:
+    description:
+      - expected MD5 of the files, keyed by file name; a local file that
+        does not match fails the task before anything is copied
+    required: false
+    default: none
+  concurrency:
+    description:
+      - maximum number of devices copied to at the same time
+    required: false
+    default: 10
+  timeout:
+    description:
+      - seconds to wait for a device to connect
+    required: false
+    default: 30
+"""
+
+EXAMPLES = """
+- iosxr_stage_package:
+    hosts: "{{ groups['ss-xr'] }}"
+    username: cisco
+    password: cisco
+    files:
+      - /tftpboot/xrv9k-ospf-1.0.0.0-r61102I.x86_64.rpm
+      - /tftpboot/xrv9k-mpls-1.0.0.0-r61102I.x86_64.rpm
+    concurrency: 20
+  run_once: true
+  register: staged
+
+- iosxr_install_package:
+    host: '{{ ansible_ssh_host }}'
+    username: cisco
+    password: cisco
+    pkgpath: "{{ staged.pkgpath }}"
+    pkgname: "{{ staged.pkgname }}"
+    state: present
+"""
+
+RETURN = """
+results:
+  description: per host dict of failed, msg, elapsed seconds and per file
+               whether it was copied, its MD5, bytes copied and MB/s
+  returned: always
+failed_hosts:
+  description: list of hosts where a file could not be staged
+  returned: always
+pkgpath:
+  description: install source of the staged files, '/disk0:'
+  returned: always
+pkgname:
+  description: package names of the staged files, for iosxr_install_package
+  returned: always
+"""
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            hosts = dict(required=True, type='list'),
+            port = dict(required=False, type='int', default=22),
+            username = dict(required=False, default=None),
+            password = dict(required=False, default=None, no_log=True),
+            files = dict(required=True, type='list'),
+            md5 = dict(required=False, default=None, type='dict'),
+            concurrency = dict(required=False, type='int', default=10),
+            timeout = dict(required=False, type='int', default=30)
+        ),
+        supports_check_mode = False
+    )
+    args = module.params
+    if args['concurrency'] < 1:
+        module.fail_json(msg='concurrency must be at least 1')
+
+    # checksum every file once, not once per device
+    files = dict()
+    for path in args['files']:
+        path = os.path.expanduser(path)
+        if not os.path.isfile(path):
+            module.fail_json(msg='%s does not exist' % path)
+        files[path] = local_md5(path)
+        expected = (args['md5'] or dict()).get(os.path.basename(path))
+        if expected and expected.lower() != files[path]:
+            module.fail_json(msg='%s does not match its MD5 %s' %
+                                 (path, expected))
+
+    hosts = args['hosts']
+    policy = RolloutPolicy(canary=0, batch_size=max(len(hosts), 1),
+                           parallelism=args['concurrency'],
+                           max_failures=len(hosts))
+    rollout = Rollout(policy,
+                      lambda host: stage_host(host, files,
+                                              port=args['port'],
+                                              username=args['username'],
+                                              password=args['password'],
+                                              timeout=args['timeout']))
+    result = rollout.run(hosts)
+    del result['batches'], result['skipped_hosts'], result['aborted']
+
+    result['changed'] = any(res.get('changed')
+                            for res in result['results'].values())
+    result['pkgpath'] = XR_DISK.rstrip('/')
+    result['pkgname'] = [package_id(os.path.basename(path))
+                         for path in args['files']]
+    if result['failed_hosts']:
+        result['msg'] = 'failed on %s' % ', '.join(result['failed_hosts'])
+        module.fail_json(**result)
+    del result['msg']
+    module.exit_json(**result)
+
+if __name__ == "__main__":
+    main()
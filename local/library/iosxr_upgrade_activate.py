@@ -22,6 +22,7 @@ from ansible.module_utils.basic import *
 from ansible.module_utils.shell import *
 from ansible.module_utils.netcfg import *
 from iosxr_common import *
+from iosxr_install import *
 from iosxr import *
 
 DOCUMENTATION = """
@@ -68,19 +69,24 @@ stdout:
 stdout_lines:
   description: list of response lines
   returned: always
+reloaded:
+  description: whether the device reloaded to activate the packages
+  returned: always
+phases:
+  description: name and elapsed seconds of every phase the activation
+               went through (activate, install, reload, login, complete,
+               verify), with the number of polls or probes
+  returned: always
+active:
+  description: packages active once the activation completed
+  returned: always
 """
 
-# check if another install command in progress
-def is_legacy_iosxr(module):
-    command = "show version"
-    response = execute_command(module, command)
-    return "Build Information:" not in response[0]
-
 # check if another install command in progress
 def is_install_in_progress(module):
     command = "show install request"
     response = execute_command(module, command)
-    return "No install operation in progress" not in response[0]
+    return parse_install_request(response[0]) is not None
 
 CLI_PROMPTS_RE.append(re.compile(r'[\r\n]?\[yes\/no]:\[\w+]\s'))
 
@@ -94,6 +100,10 @@ def main():
         supports_check_mode = False
     )
     args = module.params
+
+    # this module drives the raw channel, so it needs a private session
+    module.connect(persistent=False)
+
     pkg_name = args['pkgname']
 
     # cannot run on classic XR
@@ -104,24 +114,36 @@ def main():
     if is_install_in_progress(module):
         module.fail_json(msg='other install operation in progress')
 
-    # ignore timeout
-    module.connection.shell.shell.settimeout(None)
-
-    # run install activate command
-    commands = [ 'install activate ' + pkg_name ]
-    commands.append('yes\n')
-
-    response = execute_command(module, commands)
-    while True:
-        try:
-            if not is_install_in_progress(module):
-                break
-        except:
-            break
+    # activate and wait till done, through a reload of the device if it
+    # takes one
+    response, progress = activate_install(module, [pkg_name])
+    # no answer if the device went down for the reload first
+    response = response or list()
+    phases = progress['phases']
+    if not progress['completed']:
+        module.fail_json(msg='install activate did not complete: %s' %
+                             progress['reason'],
+                         phases=phases, reloaded=progress['reloaded'],
+                         stdout=response)
+
+    # confirm the packages are active now
+    start = time.time()
+    installed = fetch_install_state(module)
+    phases.append(dict(phase='verify', elapsed=round(time.time() - start, 3)))
+    inactive = [pkg for pkg in pkg_name.split()
+                if not installed.is_active(pkg)]
+    if inactive:
+        module.fail_json(msg=' '.join(inactive) + ' not active after '
+                             'install activate',
+                         phases=phases, reloaded=progress['reloaded'],
+                         stdout=response)
 
     result = dict(changed=True)
     result['stdout'] = response
     result['stdout_lines'] = str(result['stdout']).split(r'\n')
+    result['reloaded'] = progress['reloaded']
+    result['phases'] = phases
+    result['active'] = sorted(installed.packages('active'))
 
     module.exit_json(**result)
 
@@ -22,6 +22,9 @@ from ansible.module_utils.basic import *
 from ansible.module_utils.shell import *
 from ansible.module_utils.netcfg import *
 from iosxr_common import *
+from iosxr_install import *
+from iosxr_sftp import *
+from iosxr_state import locked_json, state_path
 from iosxr import *
 
 DOCUMENTATION = """
@@ -30,7 +33,13 @@ module: iosxr_upgrade_package
 author: Adisorn Ermongkonchai
 short_description: Upgrade packages on IOS-XR device.
 description:
-  - Upgrade IOS-XR packages on the IOS-XR device.
+  - Upgrade IOS-XR packages on the IOS-XR device, in phases: transfer
+    (only when pkgpath is a directory on the Ansible control host), add,
+    prepare, activate (the device reloads) and commit.  The phases
+    completed are kept in a journal per device under IOSXR_STATE_DIR on
+    the control host, so a run that was cut short can be run again and
+    resumes after the last completed phase; the install state of the
+    device is checked first and takes precedence over the journal.
 options:
   host:
     description:
@@ -66,13 +75,16 @@ options:
           tftp://server/directory/
           http://server/directory/
           https://server/directory/
+          /disk0: (files copied ahead with iosxr_stage_package)
+          /local/directory/ (on the control host, copied to /disk0:)
     required: true
   pkgname:
     description:
-      - IOS-XR software packages
-        e.g. xrv9k-ospf-1.0.0.0-r61102I.x86_64.rpm
+      - IOS-XR software packages, separated by spaces
+        e.g. xrv9k-mini-x-6.1.2.iso xrv9k-ospf-1.0.0.0-r612.x86_64.rpm
     required: false
-    default: none
+    default: the mini ISO of version for the platform of the device,
+             e.g. xrv9k-mini-x-6.1.2.iso
 """
 
 EXAMPLES = """
@@ -82,28 +94,112 @@ EXAMPLES = """
     version: 6.1.1
     confirm: yes
     pkgpath: "https://secure_server_name"
+
+- iosxr_upgrade_package:
+    host: '{{ ansible_ssh_host }}'
+    username: cisco
+    version: 6.1.2
+    confirm: yes
+    pkgpath: "/disk0:"
 """
 
 RETURN = """
 stdout:
-  description: raw response
+  description: a summary line per install operation run
   returned: always
 stdout_lines:
   description: list of response lines
   returned: always
+phases:
+  description: per upgrade phase (transfer, add, prepare, activate,
+               commit) whether it ran, was skipped, or was found done by
+               an earlier run, and the seconds it took
+  returned: always
+resumed:
+  description: phases an earlier run had completed already
+  returned: always
+packages:
+  description: packages the upgrade added and activated
+  returned: always
 """
 
-# check if another install command in progress
-def is_legacy_iosxr(module):
-    command = "show version"
-    response = execute_command(module, command)
-    return "Build Information:" not in response[0]
+UPGRADE_PHASES = ['transfer', 'add', 'prepare', 'activate', 'commit']
+
+CLI_PROMPTS_RE.append(re.compile(r'[\r\n]?\[yes\/no]:\[\w+]\s'))
 
 # check if another install command in progress
 def is_install_in_progress(module):
     command = "show install request"
     response = execute_command(module, command)
-    return "No install operation in progress" not in response[0]
+    return parse_install_request(response[0]) is not None
+
+# controller-side journal of the phases completed on this device
+def journal_path(module):
+    return state_path('upgrade', '%s_%s.json' % (module.params['host'],
+                                                 module.params['port'] or 22))
+
+def load_journal(path, upgrade):
+    """Return the journal of an earlier run of the same upgrade, starting
+    a new one if the last run was for another upgrade.
+    """
+    with locked_json(path) as journal:
+        if journal.get('upgrade') != upgrade:
+            journal.clear()
+            journal.update(upgrade=upgrade, phases=dict())
+        return dict(journal)
+
+def record_phase(path, phase, **kwargs):
+    with locked_json(path) as journal:
+        journal['phases'][phase] = dict(time=time.time())
+        journal.update(kwargs)
+
+# packages of version on the device, e.g. 'xrv9k-xr-6.1.2', and those
+# of the upgrade files
+def upgrade_packages(installed, version, files):
+    wanted = set(package_id(name) for name in files)
+    return sorted(pkg for pkg in (installed.packages('active') |
+                                  installed.packages('inactive'))
+                  if split_package(pkg)[1] == version or pkg in wanted)
+
+# mini ISO of version for the platform of the running base package
+def default_image(installed, version):
+    for pkg in installed.packages('active'):
+        name = split_package(pkg)[0]
+        if name.endswith('-xr'):
+            return '%s-mini-x-%s.iso' % (name[:-len('-xr')], version)
+    return None
+
+def completed_phases(installed, version, files, journal):
+    """Return the phases done already.  The device's install state tells
+    whether the upgrade packages were added, activated and committed; the
+    journal vouches for transfer and prepare, which the device does not
+    report, and names the packages the add phase brought in.
+    """
+    journaled = set(journal['phases'])
+    packages = (journal.get('packages') or
+                upgrade_packages(installed, version, files))
+    if not packages or not all(installed.is_present(pkg) for pkg in packages):
+        return journaled & set(['transfer'])
+    if not all(installed.is_active(pkg) for pkg in packages):
+        return set(['transfer', 'add']) | (journaled & set(['prepare']))
+    done = set(['transfer', 'add', 'prepare', 'activate'])
+    if all(installed.is_committed(pkg) for pkg in packages):
+        done.add('commit')
+    return done
+
+# run an install operation and wait for it, failing on errors in its log
+def upgrade_operation(module, command):
+    response = execute_command(module, command)
+    tail = InstallLogTail(re.findall(r"operation (\d+) started", response[0]))
+    wait_install(module, tail)
+    tail.read(module)
+    operations = tail.operations()
+    failed = install_log_failed(operations)
+    if failed or not operations:
+        module.fail_json(msg="\n".join(install_log_summary(op)
+                                       for op in failed) or response[0],
+                         install_log=operations)
+    return [install_log_summary(op) for op in operations]
 
 def main():
     module = get_module(
@@ -118,6 +214,10 @@ def main():
         supports_check_mode = False
     )
     args = module.params
+
+    # this module drives the raw channel, so it needs a private session
+    module.connect(persistent=False)
+
     version = args['version']
     pkg_path = args['pkgpath']
     pkg_name = args['pkgname']
@@ -134,51 +234,101 @@ def main():
     if is_install_in_progress(module):
         module.fail_json(msg='other install operation in progress')
 
-    # ignore timeout
-    module.connection.shell.shell.settimeout(None)
-
-    # run install upgrade command
-    command = ('install upgrade source ' +
-               pkg_path + ' version ' + version + ' ' + pkg_name + '\n')
-    module.connection.shell.shell.send(command)
-
-    response = ''
-    prompt = re.compile(r'[\r\n]?[\w+\-\.:\/\[\]]+(?:>|#)')
-    ask = re.compile(r'[\r\n]?\[yes\/no]:\[\w+]\s')
-
-    # wait for either command prompt or activate prompt
-    while True:
-        try:
-            response += module.connection.shell.shell.recv(1024)
-
-            # if activate prompt then send yes
-            if ask.search(response):
-                module.connection.shell.shell.send('yes\n')
-                break
-
-            # if command prompt then it probably is error response
-            elif prompt.search(response):
-                if 'aborted' in response:
-                    module.fail_json(msg=response)
-                break
-        except:
-            break
-
-    # now wait till reload
-    while True:
-        try:
-            #  install operation done
-            if not is_install_in_progress(module):
-                break
-            sleep(5)
-        # or socket exception when reload
-        except:
-            break
-
-    # show result
-    result = dict(changed=True)
-    result['stdout'] = response
-    result['stdout_lines'] = str(result['stdout']).splitlines()
+    # pick up where an earlier run of the same upgrade stopped
+    path = journal_path(module)
+    journal = load_journal(path, dict(version=version, pkgpath=pkg_path,
+                                      pkgname=pkg_name))
+    installed = fetch_install_state(module)
+    files = pkg_name.split() or [default_image(installed, version)]
+    if None in files:
+        module.fail_json(msg='pkgname is required, the platform of the '
+                             'device is not known')
+    done = completed_phases(installed, version, files, journal)
+    source = journal.get('source', pkg_path)
+    packages = (journal.get('packages') or
+                upgrade_packages(installed, version, files))
+
+    result = dict(changed=False, stdout=list(), phases=list(),
+                  resumed=[phase for phase in UPGRADE_PHASES
+                           if phase in done and phase in journal['phases']])
+    for phase in UPGRADE_PHASES:
+        if phase in done:
+            result['phases'].append(dict(phase=phase, status='done'))
+            continue
+        start = time.time()
+        status = 'ran'
+
+        if phase == 'transfer':
+            # a directory on the controller is copied to /disk0: first
+            if not os.path.isdir(os.path.expanduser(pkg_path)):
+                status = 'skipped'
+            else:
+                local = dict()
+                for name in files:
+                    file_path = os.path.join(os.path.expanduser(pkg_path), name)
+                    if not os.path.isfile(file_path):
+                        module.fail_json(msg='%s does not exist' % file_path)
+                    local[file_path] = local_md5(file_path)
+                staged = stage_host(args['host'], local,
+                                    port=args['port'] or 22,
+                                    username=args['username'],
+                                    password=args['password'])
+                if staged['failed']:
+                    module.fail_json(msg=staged['msg'], phases=result['phases'])
+                source = XR_DISK.rstrip('/')
+            record_phase(path, phase, source=source)
+
+        elif phase == 'add':
+            invalidate_fingerprint(module)
+            before = installed.packages('inactive')
+            result['stdout'] += upgrade_operation(module, 'install add source ' +
+                                                  source + ' ' +
+                                                  ' '.join(files))
+            installed = fetch_install_state(module)
+            packages = (sorted(installed.packages('inactive') - before) or
+                        upgrade_packages(installed, version, files))
+            if not packages:
+                module.fail_json(msg='no %s packages after install add' %
+                                     version, stdout=result['stdout'])
+            record_phase(path, phase, packages=packages)
+
+        elif phase == 'prepare':
+            result['stdout'] += upgrade_operation(module, 'install prepare ' +
+                                                  ' '.join(packages))
+            record_phase(path, phase)
+
+        elif phase == 'activate':
+            progress = activate_install(module, packages)[1]
+            if not progress['completed']:
+                module.fail_json(msg='install activate did not complete: %s' %
+                                     progress['reason'],
+                                 phases=result['phases'])
+            verify_install(module,
+                           lambda s: all(s.is_active(pkg) for pkg in packages),
+                           ' '.join(packages) + ' not active after upgrade',
+                           result['stdout'])
+            result['stdout'].append('install activate %s completed' %
+                                    ' '.join(packages))
+            result['reloaded'] = progress['reloaded']
+            record_phase(path, phase)
+
+        elif phase == 'commit':
+            result['stdout'] += upgrade_operation(module, 'install commit')
+            verify_install(module, lambda s: s.is_committed_state(),
+                           'active packages were not committed',
+                           result['stdout'])
+            record_phase(path, phase)
+
+        result['changed'] |= status == 'ran'
+        result['phases'].append(dict(phase=phase, status=status,
+                                     elapsed=round(time.time() - start, 3)))
+
+    # the upgrade is complete, a later run starts afresh
+    with locked_json(path) as journal:
+        journal.clear()
+
+    result['packages'] = packages
+    result['stdout_lines'] = str(result['stdout']).split(r'\n')
 
     module.exit_json(**result)
 
@@ -0,0 +1,269 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'common'))
+
+from iosxr import *
+
+PROMPT = 'RP/0/RP0/CPU0:r1#'
+
+
+class FakeChannel(object):
+    """paramiko channel that hands out the given chunks, then times out."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.sent = list()
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+    def recv(self, size):
+        if not self.chunks:
+            raise socket.timeout()
+        return self.chunks.pop(0).encode('utf8')
+
+
+def fake_shell(chunks):
+    shell = IosxrShell(kickstart=False, prompts_re=CLI_PROMPTS_RE,
+                       errors_re=CLI_ERRORS_RE)
+    shell.shell = FakeChannel(chunks)
+    shell._matched_prompt = PROMPT
+    return shell
+
+
+class StreamMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = StreamMatcher(CLI_PROMPTS_RE, CLI_ERRORS_RE)
+
+    def feed(self, chunks):
+        for chunk in chunks:
+            match = self.matcher.feed(chunk)
+            if match is not None:
+                return match
+
+    def test_prompt_split_across_chunks(self):
+        match = self.feed(['Cisco IOS XR\r\n', 'RP/0/RP0/', 'CPU0:r1#'])
+        self.assertEqual(match.kind, 'prompt')
+        self.assertEqual(match.text.strip(), PROMPT)
+        # offsets count from the start of the response
+        self.assertEqual(match.end, len('Cisco IOS XR\r\n' + PROMPT))
+
+    def test_error_split_across_chunks(self):
+        match = self.feed(['line 1\r\n% Inva', 'lid input detected\r\n'])
+        self.assertEqual(match.kind, 'error')
+        self.assertEqual(match.start, len('line 1\r\n') + 2)
+
+    def test_error_wins_over_prompt(self):
+        match = self.feed(['% Invalid input detected\r\n' + PROMPT])
+        self.assertEqual(match.kind, 'error')
+
+    def test_prompt_only_at_the_end(self):
+        # a prompt echoed in the body is not the end of the response
+        self.assertEqual(self.feed([PROMPT + 'show run\r\n',
+                                    'hostname r1\r\n']), None)
+        self.assertEqual(self.feed([PROMPT]).kind, 'prompt')
+
+    def test_only_the_unfinished_line_is_scanned_again(self):
+        matcher = StreamMatcher(CLI_PROMPTS_RE, CLI_ERRORS_RE, overlap=8)
+        matcher.feed('x' * 100 + '\r\n' + 'y' * 20)
+        self.assertEqual(matcher._carry, 'y' * 8)
+        self.assertEqual(matcher.offset, 122)
+
+
+class CanPipelineTest(unittest.TestCase):
+
+    def test_show_commands(self):
+        self.assertTrue(can_pipeline(['show version', 'show platform']))
+        self.assertFalse(can_pipeline(['show version']))
+
+    def test_mode_changes_are_not_pipelined(self):
+        for command in ['configure terminal', 'conf t', 'config',
+                        'admin', 'end', 'exit']:
+            self.assertTrue(is_interactive(command), command)
+            self.assertFalse(can_pipeline([command, 'show version']),
+                             command)
+
+    def test_confirmations_are_not_pipelined(self):
+        self.assertFalse(can_pipeline(['show version', 'reload']))
+        self.assertFalse(can_pipeline(['install add source tftp://a b.rpm',
+                                       'show install request']))
+
+
+class ReceiveTest(unittest.TestCase):
+
+    def test_error_reads_up_to_the_prompt(self):
+        shell = fake_shell(['show foo\r\n% Invalid input detected at '
+                            "'^' marker.\r\n",
+                            PROMPT,
+                            'show foo\r\nfoo output\r\n' + PROMPT])
+        self.assertRaises(CommandError, shell.send, 'show foo')
+        # the session is in sync for the next command
+        self.assertEqual(shell.send('show foo'), ['foo output'])
+
+    def test_error_message_stops_at_the_prompt(self):
+        shell = fake_shell(['show foo\r\n% Invalid input detected at '
+                            "'^' marker.\r\n" + PROMPT])
+        try:
+            shell.send('show foo')
+        except CommandError:
+            e = sys.exc_info()[1]
+        self.assertEqual(str(e), "matched error in response: % Invalid "
+                                 "input detected at '^' marker.")
+
+    def test_stream_error_reads_up_to_the_prompt(self):
+        shell = fake_shell(['show foo\r\nline 1\r\n% Error: busy\r\n',
+                            PROMPT,
+                            'show bar\r\nbar output\r\n' + PROMPT])
+        self.assertRaises(CommandError, list, shell.send_stream('show foo'))
+        self.assertEqual(list(shell.send_stream('show bar')), ['bar output'])
+
+
+class ReceiveBatchTest(unittest.TestCase):
+
+    def test_output_line_equal_to_a_command_is_kept(self):
+        commands = ['show running-config', 'end']
+        shell = fake_shell(['show running-config\r\n'
+                            'end\r\n'
+                            'Building configuration...\r\n'
+                            'hostname r1\r\n'
+                            'end\r\n',
+                            PROMPT + 'end\r\n',
+                            PROMPT])
+        responses = shell.receive_batch(commands)
+        self.assertEqual(responses[0][0],
+                         'Building configuration...\nhostname r1\nend')
+        self.assertEqual(responses[1][0], '')
+
+
+class ChunksTest(unittest.TestCase):
+
+    def test_prompt_after_complete_erase_sequence(self):
+        # FakeChannel times out if the prompt is held back
+        shell = fake_shell(['show version\r\nCisco IOS XR\r\n',
+                            '\x08 \x08r1#'])
+        self.assertEqual(shell.receive('show version').strip(),
+                         'Cisco IOS XR')
+
+    def test_escape_cut_by_chunk_boundary(self):
+        shell = fake_shell(['Cisco IOS XR\r\n\x1b[?1',
+                            'h\x1b=' + PROMPT])
+        self.assertEqual(shell.receive(), 'Cisco IOS XR\r\n')
+
+
+class FakeModeShell(object):
+    """Shell that follows admin and configuration mode through the
+    prompt, and records the commands sent on it.
+    """
+
+    BASE = 'RP/0/RSP0/CPU0:r1#'
+
+    def __init__(self):
+        self.sent = list()
+        self.up = True
+        self.stack = [self.BASE]
+        self._matched_prompt = self.BASE
+        self.shell = self
+        self.ssh = self
+
+    def send(self, commands):
+        responses = list()
+        for command in to_list(commands):
+            self.sent.append(command)
+            if command == 'admin':
+                self.stack.append(self.BASE[:-1] + '(admin)#')
+            elif command.startswith('configure'):
+                mode = 'admin-config' if len(self.stack) > 1 else 'config'
+                self.stack.append(self.BASE[:-1] + '(%s)#' % mode)
+            elif command in ('end', 'exit') and len(self.stack) > 1:
+                self.stack.pop()
+            self._matched_prompt = self.stack[-1]
+            responses.append('')
+        return responses
+
+    def alive(self):
+        return self.up
+
+    def gettimeout(self):
+        return 10
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+class ModeCli(Cli):
+
+    def __init__(self):
+        Cli.__init__(self, type('Module', (object,), {})())
+        self.module.params = dict(host='192.0.2.10')
+        self.shells = list()
+
+    def connect(self, **kwargs):
+        self.shell = FakeModeShell()
+        self.shells.append(self.shell)
+        self.base_prompt = self.shell._matched_prompt
+
+
+class ReconnectModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cli = ModeCli()
+        self.cli.connect()
+        self.cli.send('terminal length 0')
+
+    def drop(self):
+        self.cli.shell.up = False
+
+    def test_admin_mode_entered_again(self):
+        self.cli.send('admin')
+        self.drop()
+        self.cli.send('show install active')
+        self.assertEqual(len(self.cli.shells), 2)
+        self.assertEqual(self.cli.shell.sent,
+                         ['terminal length 0', 'admin', 'show install active'])
+
+    def test_refused_in_configuration_mode(self):
+        self.cli.send('configure terminal')
+        self.drop()
+        self.assertRaises(ConnectError, self.cli.send, 'hostname r2')
+        self.assertEqual(len(self.cli.shells), 1)
+
+    def test_end_leaves_configuration_mode(self):
+        self.cli.send(['admin', 'configure', 'hostname r2', 'end'])
+        self.assertEqual(self.cli.modes, ['admin'])
+        self.cli.send('exit')
+        self.assertEqual(self.cli.modes, [])
+        self.drop()
+        self.cli.send('show version')
+        self.assertEqual(self.cli.shell.sent,
+                         ['terminal length 0', 'show version'])
+
+
+if __name__ == '__main__':
+    unittest.main()
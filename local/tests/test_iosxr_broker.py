@@ -0,0 +1,229 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'common'))
+os.environ.setdefault('IOSXR_STATE_DIR', tempfile.mkdtemp())
+
+from ansible.module_utils.shell import ShellError
+from iosxr import CommandError, to_list
+from iosxr_broker import *
+
+BASE = 'RP/0/RP0/CPU0:r1#'
+
+
+class FakeShell(object):
+    """Pooled shell that answers every command, goes to configuration
+    mode on 'configure' and back on 'abort' or 'end', and raises the
+    error given for a command.
+    """
+
+    def __init__(self):
+        self._matched_prompt = BASE
+        self.sent = list()
+        self.failures = dict()
+        self.up = True
+        self.closed = False
+        self.ssh = self
+
+    def send(self, commands):
+        responses = list()
+        for command in to_list(commands):
+            self.sent.append(command)
+            if command in self.failures:
+                raise self.failures[command]
+            if command.startswith('configure'):
+                self._matched_prompt = BASE[:-1] + '(config)#'
+            elif command in ('abort', 'end', 'exit'):
+                self._matched_prompt = BASE
+            responses.append('%s output' % command)
+        return responses
+
+    def send_stream(self, command):
+        for response in self.send(command):
+            yield response
+
+    def alive(self):
+        return self.up
+
+    def close(self):
+        self.closed = True
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shell = FakeShell()
+        self.session = Session('key', self.shell)
+
+    def test_command_error_keeps_session(self):
+        self.shell.failures['show foo'] = CommandError('% Invalid input')
+        self.assertRaises(CommandError, self.session.send, ['show foo'])
+        self.assertFalse(self.session.dirty)
+        self.assertRaises(CommandError, list,
+                          self.session.send_stream('show foo'))
+        self.assertFalse(self.session.dirty)
+        self.assertTrue(self.session.reset())
+
+    def test_timeout_drops_session(self):
+        self.shell.failures['show tech'] = ShellError('timeout trying to send '
+                                                    'command: show tech')
+        self.assertRaises(ShellError, self.session.send, ['show tech'])
+        self.assertTrue(self.session.dirty)
+        self.assertFalse(self.session.reset())
+
+
+class FakePool(SessionPool):
+    """SessionPool that hands out FakeShells instead of opening SSH
+    sessions.
+    """
+
+    def __init__(self, **kwargs):
+        SessionPool.__init__(self, **kwargs)
+        self.shells = list()
+
+    def _open_shell(self, params):
+        shell = FakeShell()
+        self.shells.append(shell)
+        return shell
+
+
+KEY = session_key('192.0.2.10', 22, 'cisco', 'cisco', None)
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakePool(max_sessions=2, idle_timeout=60)
+
+    def test_released_session_is_reused(self):
+        session = self.pool.acquire(KEY, dict())
+        self.pool.release(session)
+        self.assertTrue(self.pool.acquire(KEY, dict()) is session)
+        self.assertEqual(len(self.pool.shells), 1)
+        self.assertEqual(self.pool.size(), 1)
+
+    def test_sessions_capped_per_device(self):
+        self.pool.acquire(KEY, dict())
+        self.pool.acquire(KEY, dict())
+        self.assertRaises(BrokerError, self.pool.acquire, KEY, dict(),
+                          timeout=0)
+        # other devices have sessions of their own
+        other = session_key('192.0.2.11', 22, 'cisco', 'cisco', None)
+        self.pool.acquire(other, dict())
+        self.assertEqual(self.pool.size(), 3)
+
+    def test_key_depends_on_credentials(self):
+        self.assertNotEqual(KEY, session_key('192.0.2.10', 22, 'cisco',
+                                             'other', None))
+        self.assertFalse('cisco' in KEY[3])
+
+    def test_reset_leaves_configuration_mode(self):
+        session = self.pool.acquire(KEY, dict())
+        session.send(['configure terminal'])
+        self.pool.release(session)
+        self.assertEqual(session.shell.sent[-1], 'abort')
+        self.assertTrue(self.pool.acquire(KEY, dict()) is session)
+
+    def test_dirty_session_is_closed(self):
+        session = self.pool.acquire(KEY, dict())
+        session.dirty = True
+        self.pool.release(session)
+        self.assertTrue(session.shell.closed)
+        self.assertEqual(self.pool.size(), 0)
+        self.assertFalse(self.pool.acquire(KEY, dict()) is session)
+
+    def test_session_dropped_while_idle_is_replaced(self):
+        session = self.pool.acquire(KEY, dict())
+        self.pool.release(session)
+        session.shell.up = False
+        self.assertFalse(self.pool.acquire(KEY, dict()) is session)
+        self.assertTrue(session.shell.closed)
+        self.assertEqual(self.pool.size(), 1)
+
+    def test_evict_closes_idle_sessions(self):
+        session = self.pool.acquire(KEY, dict())
+        self.pool.release(session)
+        session.last_used -= 120
+        self.pool.evict()
+        self.assertTrue(session.shell.closed)
+        self.assertEqual(self.pool.size(), 0)
+
+
+class BrokerServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'broker.sock')
+        self.pool = FakePool(max_sessions=1)
+        self.server = BrokerServer(self.path, self.pool)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def client(self):
+        client = BrokerClient(self.path, timeout=1)
+        client.connect()
+        client.request(op='open', host='192.0.2.10', port=22,
+                       username='cisco', password='cisco', ssh_keyfile=None)
+        return client
+
+    def test_lease_is_passed_on(self):
+        client = self.client()
+        self.assertEqual(client.request(op='send', commands=['show version'])
+                         ['responses'], ['show version output'])
+        client.close()
+        # released when the first client hangs up
+        deadline = time.time() + 5
+        while self.pool._idle.get(KEY) is None and time.time() < deadline:
+            time.sleep(0.01)
+        client = self.client()
+        client.request(op='send', commands=['show platform'])
+        client.close()
+        self.assertEqual(len(self.pool.shells), 1)
+        self.assertEqual(self.pool.shells[0].sent,
+                         ['show version', 'show platform'])
+
+    def test_command_error_reaches_the_client(self):
+        client = self.client()
+        self.pool.shells[0].failures['show foo'] = CommandError(
+            '% Invalid input')
+        self.assertRaises(CommandError, client.request, op='send',
+                          commands=['show foo'])
+        self.assertEqual(list(client.request_stream(op='stream',
+                                                    command='show version')),
+                         ['show version output'])
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'common'))
+
+from iosxr_channel import *
+
+DELIMITER = ']]>]]>'
+
+
+class FakeChannel(object):
+    """paramiko channel that hands out the given chunks, then times out,
+    and records the receive sizes asked for.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = [chunk.encode('utf8') for chunk in chunks]
+        self.sizes = list()
+
+    def recv(self, size):
+        self.sizes.append(size)
+        if not self.chunks:
+            raise socket.timeout()
+        chunk = self.chunks.pop(0)
+        if len(chunk) > size:
+            self.chunks.insert(0, chunk[size:])
+            chunk = chunk[:size]
+        return chunk
+
+
+class ChannelReaderTest(unittest.TestCase):
+
+    def test_delimiter_split_across_chunks(self):
+        reader = ChannelReader(FakeChannel(['<ok/>]]>', ']]>']))
+        self.assertEqual(reader.read_until(DELIMITER), '<ok/>' + DELIMITER)
+
+    def test_rest_kept_for_the_next_read(self):
+        reader = ChannelReader(FakeChannel(['<a/>]]>]]><b/>]]>', ']]>']))
+        self.assertEqual(reader.read_until(DELIMITER), '<a/>' + DELIMITER)
+        self.assertEqual(reader.read_until(DELIMITER), '<b/>' + DELIMITER)
+        self.assertEqual(len(reader.buffer), 0)
+
+    def test_timeout_and_close(self):
+        reader = ChannelReader(FakeChannel(['<a/>']))
+        self.assertRaises(ChannelError, reader.read_until, DELIMITER)
+        reader = ChannelReader(FakeChannel(['']))
+        self.assertRaises(ChannelError, reader.read_until, DELIMITER)
+
+    def test_receive_size_follows_the_channel(self):
+        channel = FakeChannel(['x' * 100, 'x', DELIMITER])
+        reader = ChannelReader(channel, min_size=16, max_size=64)
+        self.assertEqual(len(reader.read_until(DELIMITER)),
+                         101 + len(DELIMITER))
+        # doubles while the channel fills it, capped, then shrinks back
+        self.assertEqual(channel.sizes[:4], [16, 32, 64, 64])
+        self.assertEqual(reader.size, 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'common'))
+
+import iosxr_common
+import iosxr_state
+from ansible.module_utils.shell import ShellError
+from iosxr import CommandError, ConnectError
+from iosxr_common import *
+
+
+class Failed(Exception):
+    pass
+
+
+class FakeModule(object):
+    """NetworkModule whose run_commands() raises the given errors in turn
+    and then answers 'ok'.
+    """
+
+    def __init__(self, errors=(), response='ok'):
+        self.params = dict(host='192.0.2.10', port=22)
+        self.errors = list(errors)
+        self.response = response
+        self.sent = list()
+        self.disconnects = 0
+
+    def run_commands(self, commands, **kwargs):
+        self.sent.append(commands)
+        if self.errors:
+            raise self.errors.pop(0)
+        return [self.response]
+
+    def disconnect(self):
+        self.disconnects += 1
+
+    def fail_json(self, **kwargs):
+        raise Failed(kwargs['msg'])
+
+
+class StateTestCase(unittest.TestCase):
+    """Keeps the controller state of a test in a directory of its own."""
+
+    def setUp(self):
+        self.state_dir = iosxr_state.IOSXR_STATE_DIR
+        iosxr_state.IOSXR_STATE_DIR = tempfile.mkdtemp()
+        self.sleep = iosxr_common.time.sleep
+        iosxr_common.time.sleep = lambda seconds: None
+
+    def tearDown(self):
+        shutil.rmtree(iosxr_state.IOSXR_STATE_DIR)
+        iosxr_state.IOSXR_STATE_DIR = self.state_dir
+        iosxr_common.time.sleep = self.sleep
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_budgets_per_kind_of_error(self):
+        policy = RetryPolicy(connect_retries=2, command_retries=4)
+        self.assertEqual(policy.retries(ConnectError('refused')), 2)
+        self.assertEqual(policy.retries(ShellError('timeout')), 2)
+        self.assertEqual(policy.retries(CommandError(
+            'matched error in response: % Error: install in progress')), 4)
+
+    def test_errors_about_the_command_are_not_retried(self):
+        policy = RetryPolicy()
+        for error in ["% Invalid input detected at '^' marker.",
+                      '% Incomplete command.', '% Ambiguous command: "sh"']:
+            self.assertEqual(policy.retries(CommandError(
+                'matched error in response: %s' % error)), 0)
+
+    def test_delay_doubles_up_to_the_cap(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0, jitter=0)
+        self.assertEqual([policy.delay(attempt) for attempt in range(4)],
+                         [1.0, 2.0, 4.0, 4.0])
+
+    def test_delay_jitter_stays_in_range(self):
+        policy = RetryPolicy(base_delay=2.0, jitter=0.5)
+        for _ in range(50):
+            self.assertTrue(1.0 <= policy.delay(0) <= 2.0)
+
+
+class CircuitBreakerTest(StateTestCase):
+
+    def test_opens_after_threshold_failures(self):
+        breaker = CircuitBreaker('192.0.2.10', 22, threshold=2, cooldown=60)
+        breaker.failure()
+        self.assertEqual(breaker.check(), 0)
+        breaker.failure()
+        self.assertTrue(0 < breaker.check() <= 61)
+
+    def test_success_closes(self):
+        breaker = CircuitBreaker('192.0.2.10', 22, threshold=1, cooldown=60)
+        breaker.failure()
+        breaker.success()
+        self.assertEqual(breaker.check(), 0)
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = CircuitBreaker('192.0.2.10', 22, threshold=1, cooldown=0)
+        breaker.failure()
+        self.assertEqual(breaker.check(), 0)
+        # shared through the state file with the other tasks
+        other = CircuitBreaker('192.0.2.10', 22, threshold=1, cooldown=60)
+        self.assertTrue(other.check() > 0)
+
+
+class ExecuteCommandTest(StateTestCase):
+
+    def test_retries_busy_device(self):
+        module = FakeModule([CommandError('matched error in response: '
+                                          '% Error: install in progress')])
+        self.assertEqual(execute_command(module, 'show install request'),
+                         ['ok'])
+        self.assertEqual(len(module.sent), 2)
+
+    def test_invalid_input_sent_once(self):
+        module = FakeModule([CommandError('matched error in response: '
+                                          '% Invalid input detected')])
+        self.assertRaises(Failed, execute_command, module, 'show foo')
+        self.assertEqual(len(module.sent), 1)
+
+    def test_state_changing_command_not_sent_again(self):
+        for error in [CommandError('matched error in response: '
+                                   '% Error: install in progress'),
+                      ShellError('timeout trying to send command')]:
+            module = FakeModule([error])
+            self.assertRaises(Failed, execute_command, module,
+                              'install add source tftp://192.0.2.1 a.rpm')
+            self.assertEqual(len(module.sent), 1)
+
+    def test_broken_session_reopened_for_read_only(self):
+        module = FakeModule([ShellError('connection closed by remote device')])
+        self.assertEqual(execute_command(module, 'show version'), ['ok'])
+        self.assertEqual(module.disconnects, 1)
+
+    def test_connect_failures_open_the_breaker(self):
+        module = FakeModule([ConnectError('refused')] * 3)
+        policy = RetryPolicy(connect_retries=5)
+        self.assertRaises(Failed, execute_command, module, 'show version',
+                          policy=policy)
+        # the third failure opens the breaker, the next call is refused
+        self.assertEqual(len(module.sent), 3)
+
+
+def show_version(uptime, version='6.1.2'):
+    return ('Cisco IOS XR Software, Version %s\n'
+            'Copyright (c) 2013-2016 by Cisco Systems, Inc.\n\n'
+            'Build Information:\n'
+            ' Built By     : xrbuild\n\n'
+            'cisco IOS-XRv 9000 () processor\n'
+            'System uptime is %s\n' % (version, uptime))
+
+
+class FingerprintTest(StateTestCase):
+
+    def setUp(self):
+        StateTestCase.setUp(self)
+        self.time = iosxr_common.time.time
+        self.now = 1000000.0
+        iosxr_common.time.time = lambda: self.now
+
+    def tearDown(self):
+        iosxr_common.time.time = self.time
+        StateTestCase.tearDown(self)
+
+    def test_parse_uptime(self):
+        self.assertEqual(parse_uptime('1 week, 2 days, 3 hours, 4 minutes'),
+                         604800 + 2 * 86400 + 3 * 3600 + 4 * 60)
+        self.assertEqual(parse_uptime('2 weeks, 1 hour'), 2 * 604800 + 3600)
+
+    def test_parse_version(self):
+        fingerprint = parse_version(show_version('1 day, 2 minutes'))
+        self.assertEqual(fingerprint['flavor'], 'exr')
+        self.assertFalse(fingerprint['legacy'])
+        self.assertEqual(fingerprint['version'], '6.1.2')
+        self.assertEqual(fingerprint['platform'], 'IOS-XRv 9000')
+        self.assertEqual(fingerprint['uptime'], 86520)
+
+    def test_cached_for_ttl(self):
+        module = FakeModule(response=show_version('1 hour'))
+        get_fingerprint(module)
+        self.now += 600
+        fingerprint = get_fingerprint(module)
+        self.assertEqual(len(module.sent), 1)
+        # uptime as of now
+        self.assertEqual(fingerprint['uptime'], 3600 + 600)
+        self.now += FINGERPRINT_TTL
+        get_fingerprint(module)
+        self.assertEqual(len(module.sent), 2)
+
+    def test_refresh_and_invalidate(self):
+        module = FakeModule(response=show_version('1 hour'))
+        get_fingerprint(module)
+        get_fingerprint(module, refresh=True)
+        self.assertEqual(len(module.sent), 2)
+        invalidate_fingerprint(module)
+        get_fingerprint(module)
+        self.assertEqual(len(module.sent), 3)
+
+    def test_uptime_reset_seen(self):
+        module = FakeModule(response=show_version('2 days'))
+        self.assertFalse(get_fingerprint(module)['rebooted'])
+        # uptime only shown to the minute
+        self.now += 600
+        module.response = show_version('2 days, 9 minutes')
+        self.assertFalse(get_fingerprint(module, refresh=True)['rebooted'])
+        module.response = show_version('3 minutes', version='6.2.1')
+        fingerprint = get_fingerprint(module, refresh=True)
+        self.assertTrue(fingerprint['rebooted'])
+        self.assertEqual(fingerprint['version'], '6.2.1')
+
+    def test_broken_session_drops_cached_entry(self):
+        module = FakeModule(response=show_version('1 hour'))
+        get_fingerprint(module)
+        module.errors = [ShellError('connection closed by remote device')]
+        execute_command(module, 'show install active')
+        get_fingerprint(module)
+        self.assertEqual(len(module.sent), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
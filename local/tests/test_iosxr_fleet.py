@@ -0,0 +1,74 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'common'))
+
+from iosxr_fleet import FleetExecutor
+
+
+class CountingExecutor(FleetExecutor):
+    """FleetExecutor whose sessions only record how many are open per
+    host at once.
+    """
+
+    def __init__(self, **kwargs):
+        FleetExecutor.__init__(self, **kwargs)
+        self.lock = threading.Lock()
+        self.open = dict()
+        self.peak = dict()
+        self.total_peak = 0
+
+    def _session(self, host, commands):
+        with self.lock:
+            self.open[host] = self.open.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.open[host])
+            self.total_peak = max(self.total_peak, sum(self.open.values()))
+        time.sleep(0.05)
+        with self.lock:
+            self.open[host] -= 1
+        return ['%s: %s' % (host, command) for command in commands], ''
+
+
+class FleetExecutorTest(unittest.TestCase):
+
+    def test_per_host_limit(self):
+        executor = CountingExecutor(concurrency=50, per_host=2)
+        commands = ['show cmd %d' % n for n in range(7)]
+        results = executor.run(['r1', 'r2', 'r1'], commands)
+        self.assertEqual(sorted(results), ['r1', 'r2'])
+        self.assertEqual(executor.peak, dict(r1=2, r2=2))
+        # outputs stay in command order across the sessions
+        self.assertEqual(results['r1']['stdout'],
+                         ['r1: ' + command for command in commands])
+
+    def test_fleet_limit(self):
+        executor = CountingExecutor(concurrency=3, per_host=2)
+        executor.run(['r%d' % n for n in range(5)], ['a', 'b'])
+        self.assertEqual(executor.total_peak, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+
+import ansible.module_utils
+from ansible.module_utils import basic
+
+REMOTE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'remote')
+# what ANSIBLE_MODULE_UTILS does for the remote modules
+ansible.module_utils.__path__.append(os.path.join(REMOTE_DIR, 'module_utils'))
+sys.path.insert(0, os.path.join(REMOTE_DIR, 'library'))
+
+import iosxr_get_config
+from ansible.module_utils import iosxr_xrcli
+
+CONFIG = ('!! IOS XR Configuration version = 6.1.2\n'
+          'hostname xrv9k\n'
+          'interface MgmtEth0/RP0/CPU0/0\n'
+          ' ipv4 address dhcp\n'
+          '!\n'
+          'end\n')
+
+
+class Exited(Exception):
+    pass
+
+
+class FakeModule(object):
+
+    def fail_json(self, **kwargs):
+        raise Exited(kwargs['msg'])
+
+
+class WriteConfigTest(unittest.TestCase):
+    """Runs the module against a plain shell whose xr_cli prints
+    self.config.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.dir, 'running.cfg.gz')
+        self.config = os.path.join(self.dir, 'config')
+        iosxr_xrcli._xr_cli = iosxr_xrcli.XrCli('exec /bin/sh')
+        iosxr_xrcli._xr_cli.run('xr_cli() { cat %s; }' %
+                                iosxr_xrcli.shell_quote(self.config))
+
+    def tearDown(self):
+        iosxr_xrcli._xr_cli.close()
+        iosxr_xrcli._xr_cli = None
+        basic._ANSIBLE_ARGS = None
+        shutil.rmtree(self.dir)
+
+    def show_run(self, timestamp, config=CONFIG):
+        with open(self.config, 'w') as fh:
+            fh.write(timestamp + '\n' + config)
+
+    def written(self):
+        with open(self.dest, 'rb') as fh:
+            return fh.read()
+
+    def run_module(self, **params):
+        basic._ANSIBLE_ARGS = json.dumps(
+            dict(ANSIBLE_MODULE_ARGS=params)).encode('utf-8')
+        stdout = sys.stdout
+        # exit_json() prints native strings
+        sys.stdout = out = BytesIO() if sys.version_info[0] < 3 else StringIO()
+        try:
+            iosxr_get_config.main()
+        except SystemExit:
+            pass
+        finally:
+            sys.stdout = stdout
+        return json.loads(out.getvalue())
+
+    def test_timestamp_dropped(self):
+        self.show_run('Tue Oct 18 09:12:01.123 UTC')
+        iosxr_get_config.write_config(FakeModule(), self.dest)
+        with gzip.open(self.dest, 'rb') as fh:
+            self.assertEqual(fh.read().decode('utf-8'), CONFIG)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['config', 'running.cfg.gz'])
+
+    def test_same_config_same_file(self):
+        self.show_run('Tue Oct 18 09:12:01.123 UTC')
+        iosxr_get_config.write_config(FakeModule(), self.dest)
+        first = self.written()
+        self.show_run('Wed Oct 19 17:40:55.901 UTC')
+        iosxr_get_config.write_config(FakeModule(), self.dest)
+        self.assertEqual(self.written(), first)
+        self.show_run('Wed Oct 19 17:40:55.901 UTC',
+                      CONFIG.replace('xrv9k', 'xrv9k-2'))
+        iosxr_get_config.write_config(FakeModule(), self.dest)
+        self.assertNotEqual(self.written(), first)
+
+    def test_show_run_failure(self):
+        # no config to print, cat fails
+        self.assertRaises(Exited, iosxr_get_config.write_config, FakeModule(),
+                          self.dest)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_checksum_tells_change(self):
+        self.show_run('Tue Oct 18 09:12:01.123 UTC')
+        result = self.run_module(dest=self.dest)
+        self.assertTrue(result['changed'])
+        self.assertEqual(result['path'], self.dest)
+        self.assertEqual(result['size'], len(self.written()))
+        self.assertNotIn('stdout', result)
+        self.show_run('Wed Oct 19 17:40:55.901 UTC')
+        again = self.run_module(dest=self.dest, checksum=result['checksum'])
+        self.assertFalse(again['changed'])
+        self.assertEqual(again['checksum'], result['checksum'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'common'))
+os.environ.setdefault('IOSXR_STATE_DIR', tempfile.mkdtemp())
+
+import iosxr_install
+import iosxr_install_parser
+from ansible.module_utils.shell import ShellError
+from iosxr_install import *
+
+RUNNING = 'The install operation 5 is 40% complete\n'
+IDLE = 'No install operation in progress\n'
+LOG = ('Install operation 5 started by cisco:\n'
+       '  install add source tftp://192.0.2.1 xrv9k-ospf-1.0.0.0-r612.x86_64.rpm\n')
+
+
+class FakeModule(object):
+    """NetworkModule that answers 'show install request' with an
+    operation in progress for the first polls, and records every
+    run_commands() call with its pipeline flag.
+    """
+
+    def __init__(self, polls):
+        self.params = dict(host='192.0.2.10', port=22)
+        self.polls = polls
+        self.calls = list()
+        self.logged = list()
+
+    def run_commands(self, commands, pipeline=False):
+        commands = commands if isinstance(commands, list) else [commands]
+        self.calls.append((commands, pipeline))
+        responses = list()
+        for command in commands:
+            if command == 'show install request':
+                self.polls -= 1
+                responses.append(RUNNING if self.polls > 0 else IDLE)
+            else:
+                responses.append(LOG)
+        return responses
+
+    def log(self, msg):
+        self.logged.append(msg)
+
+    def fail_json(self, **kwargs):
+        raise AssertionError(kwargs['msg'])
+
+
+class WaitInstallTest(unittest.TestCase):
+
+    def setUp(self):
+        # poll without waiting
+        self.sleep = iosxr_install_parser.time.sleep
+        iosxr_install_parser.time.sleep = lambda seconds: None
+
+    def tearDown(self):
+        iosxr_install_parser.time.sleep = self.sleep
+
+    def test_logs_read_at_their_own_interval(self):
+        module = FakeModule(polls=6)
+        tail = InstallLogTail(['5'], interval=3600)
+        timings = wait_install(module, tail)
+        self.assertTrue(timings['completed'])
+        self.assertEqual(timings['polls'], 6)
+        self.assertEqual(len(module.calls), 6)
+        # the logs go with the first poll only, pipelined with it
+        self.assertEqual(module.calls[0],
+                         (['show install request', 'show install log 5'],
+                          True))
+        for commands, pipeline in module.calls[1:]:
+            self.assertEqual(commands, ['show install request'])
+        self.assertEqual(len(module.logged), 2)
+
+    def test_logs_pipelined_with_every_poll_when_due(self):
+        module = FakeModule(polls=3)
+        tail = InstallLogTail(['5'], interval=0)
+        wait_install(module, tail)
+        self.assertEqual(len(module.calls), 3)
+        for commands, pipeline in module.calls:
+            self.assertEqual(len(commands), 2)
+            self.assertTrue(pipeline)
+        # lines already read are not logged again
+        self.assertEqual(len(module.logged), 2)
+
+    def test_final_read_is_pipelined(self):
+        module = FakeModule(polls=1)
+        tail = InstallLogTail(['5', '6'])
+        tail.read(module)
+        self.assertEqual(module.calls, [(['show install log 5',
+                                          'show install log 6'], True)])
+        self.assertEqual(len(tail.operations()), 2)
+
+
+class FakeChannel(object):
+
+    def __init__(self):
+        self.timeouts = [10]
+
+    def gettimeout(self):
+        return self.timeouts[-1]
+
+    def settimeout(self, timeout):
+        self.timeouts.append(timeout)
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.shell = type('Shell', (object,), {})()
+        self.shell.shell = FakeChannel()
+
+
+class ActivateModule(FakeModule):
+    """Module whose device goes down before answering install activate."""
+
+    def __init__(self):
+        FakeModule.__init__(self, polls=1)
+        self.connected = True
+        self.connection = FakeConnection()
+
+    def run_commands(self, commands, pipeline=False):
+        self.calls.append((commands, pipeline))
+        raise ShellError('timeout trying to send command: install activate')
+
+    def disconnect(self):
+        self.connected = False
+
+
+class FakeMonitor(object):
+
+    def __init__(self, module):
+        self.module = module
+
+    def run(self):
+        return dict(completed=True, reloaded=True,
+                    phases=[dict(phase='install', elapsed=1.0)])
+
+    def _disconnect(self):
+        self.module.disconnect()
+
+
+class ActivateInstallTest(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = iosxr_install.ReloadMonitor
+        iosxr_install.ReloadMonitor = FakeMonitor
+
+    def tearDown(self):
+        iosxr_install.ReloadMonitor = self.monitor
+
+    def test_device_down_before_answer_goes_to_monitor(self):
+        module = ActivateModule()
+        response, progress = activate_install(module, ['xrv9k-ospf'])
+        self.assertIsNone(response)
+        self.assertFalse(module.connected)
+        self.assertTrue(progress['completed'])
+        self.assertEqual([phase['phase'] for phase in progress['phases']],
+                         ['activate', 'install'])
+        # never an unbounded wait
+        self.assertEqual(module.connection.shell.shell.timeouts,
+                         [10, RELOAD_TIMEOUT])
+
+
+OSPF_1 = 'xrv9k-ospf-1.0.0.0-r612'
+OSPF_2 = 'xrv9k-ospf-2.0.0.0-r612'
+MPLS_1 = 'xrv9k-mpls-1.0.0.0-r612'
+
+
+def show_install(section, packages):
+    """Return a 'show install <section>' response listing packages."""
+    return ('Node 0/RP0/CPU0 [RP]\n'
+            '    %s Packages: %d\n' % (section.capitalize(), len(packages)) +
+            ''.join('        %s\n' % pkg for pkg in packages))
+
+
+def install_state(active=(), inactive=(), committed=()):
+    return InstallState(show_install('active', active),
+                        show_install('inactive', inactive),
+                        show_install('committed', committed))
+
+
+class PlanInstallTest(unittest.TestCase):
+
+    def operations(self, plan):
+        return [(step['operation'], step['packages']) for step in plan]
+
+    def test_new_package(self):
+        plan = plan_install(install_state(), [OSPF_1])
+        self.assertEqual(self.operations(plan),
+                         [('add', [OSPF_1]), ('activate', [OSPF_1]),
+                          ('commit', [])])
+
+    def test_desired_state_reached(self):
+        installed = install_state([OSPF_1, MPLS_1], [], [OSPF_1, MPLS_1])
+        self.assertEqual(plan_install(installed, [OSPF_1]), [])
+        # by name alone, whatever version is there
+        self.assertEqual(plan_install(installed, ['xrv9k-ospf']), [])
+
+    def test_upgrade_replaces_other_version(self):
+        installed = install_state([OSPF_1, MPLS_1], [OSPF_2],
+                                  [OSPF_1, MPLS_1])
+        plan = plan_install(installed, [OSPF_2])
+        # packages by other names are left alone
+        self.assertEqual(self.operations(plan),
+                         [('activate', [OSPF_2]), ('deactivate', [OSPF_1]),
+                          ('commit', []), ('remove', [OSPF_1])])
+
+    def test_only_commit_missing(self):
+        installed = install_state([OSPF_1], [], [])
+        self.assertEqual(self.operations(plan_install(installed, [OSPF_1])),
+                         [('commit', [])])
+
+    def test_active_but_not_committed(self):
+        installed = install_state([OSPF_1], [OSPF_2], [OSPF_1])
+        plan = plan_install(installed, [OSPF_2], committed=[OSPF_1])
+        self.assertEqual(self.operations(plan),
+                         [('activate', [OSPF_2]), ('deactivate', [OSPF_1])])
+
+    def test_commit_of_part_of_active_refused(self):
+        self.assertRaises(ValueError, plan_install, install_state(),
+                          [OSPF_1, MPLS_1], committed=[OSPF_1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'common'))
+
+from iosxr_install_parser import *
+
+FIXTURE_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'bench', 'fixtures')
+
+def fixture(name, i=0):
+    """Return a block of device output from the benchmark fixtures."""
+    with open(os.path.join(FIXTURE_DIR, name + '.txt')) as fh:
+        return fh.read().replace('{i}', str(i))
+
+
+class PackageIdTest(unittest.TestCase):
+
+    def test_device_and_suffix_dropped(self):
+        for package in ['xrv9k-ospf-1.0.0.0-r612.x86_64.rpm',
+                        'xrv9k-ospf-1.0.0.0-r612.rpm',
+                        'xrv9k-ospf-1.0.0.0-r612.x86_64',
+                        'xrv9k-ospf-1.0.0.0-r612']:
+            self.assertEqual(package_id(package), 'xrv9k-ospf-1.0.0.0-r612')
+        self.assertEqual(package_id('disk0:asr9k-px-5.3.3.CSCux12345.pie'),
+                         'asr9k-px-5.3.3.CSCux12345')
+        self.assertEqual(package_id('asr9k-mini-x64-6.1.2.iso'),
+                         'asr9k-mini-x64-6.1.2')
+
+    def test_split_package(self):
+        self.assertEqual(split_package('xrv9k-ospf-1.0.0.0-r612'),
+                         ('xrv9k-ospf', '1.0.0.0-r612'))
+        self.assertEqual(split_package('disk0:asr9k-mini-px-4.3.1'),
+                         ('asr9k-mini-px', '4.3.1'))
+        self.assertEqual(split_package('xrv9k-ospf'), ('xrv9k-ospf', None))
+
+
+class ParsePackagesTest(unittest.TestCase):
+
+    def test_exr_active(self):
+        self.assertEqual(parse_packages(fixture('exr_active')),
+                         {'0/RP0/CPU0': set(['xrv9k-xr-6.1.2',
+                                             'xrv9k-ospf-1.0.0.0-r612',
+                                             'xrv9k-mpls-0.0.0.0-r612',
+                                             'xrv9k-k9sec-1.0.0.0-r612.CSCvb0'])})
+
+    def test_classic_inactive(self):
+        self.assertEqual(parse_packages(fixture('classic_inactive')),
+                         {'0/RSP0/CPU0': set(['asr9k-mgbl-px-4.3.1',
+                                              'asr9k-px-4.3.1.CSCul0-1.0.0',
+                                              'asr9k-video-px-4.3.1'])})
+
+    def test_packages_without_node(self):
+        self.assertEqual(parse_packages('2 inactive package(s) found:\n'
+                                        '    xrv9k-k9sec-2.2.0.0-r612\n'
+                                        '    xrv9k-mgbl-2.0.0.0-r612\n'),
+                         {None: set(['xrv9k-k9sec-2.2.0.0-r612',
+                                     'xrv9k-mgbl-2.0.0.0-r612'])})
+
+    def test_package_records(self):
+        records = package_records(fixture('exr_inactive', 3))
+        self.assertEqual([(r['name'], r['version']) for r in records],
+                         [('xrv9k-mcast', '2.0.0.0-r612'),
+                          ('xrv9k-mgbl', '3.0.0.0-r612')])
+        self.assertEqual(set(r['node'] for r in records),
+                         set(['0/RP3/CPU0']))
+
+
+class ParseInstallRequestTest(unittest.TestCase):
+
+    def test_exr(self):
+        self.assertEqual(parse_install_request(fixture('exr_request', 7)),
+                         dict(operation='7', percent=45,
+                              stage='Package activation on node '
+                                    '0/RP7/CPU0'))
+
+    def test_classic(self):
+        self.assertEqual(parse_install_request(fixture('classic_request', 7)),
+                         dict(operation='7', percent=45,
+                              stage='Performing Sanity Checks on Node '
+                                    '0/RSP7/CPU0'))
+
+    def test_idle(self):
+        self.assertEqual(parse_install_request(
+            'No install operation in progress\n'), None)
+
+
+class ParseInstallLogTest(unittest.TestCase):
+
+    def test_exr(self):
+        operations = parse_install_log(fixture('exr_log', 4))
+        self.assertEqual(len(operations), 1)
+        operation = operations[0]
+        self.assertEqual(operation['operation'], '4')
+        self.assertEqual(operation['command'], 'install add source '
+                         'tftp://192.168.1.1 xrv9k-mpls-4.0.0.0-r612.x86_64.rpm')
+        self.assertEqual(operation['status'], 'success')
+        self.assertEqual(operation['actions'],
+                         [dict(number='1', name='install add',
+                               status='success')])
+        self.assertEqual(install_log_failed(operations), [])
+
+    def test_classic_failure(self):
+        operations = parse_install_log(fixture('classic_log', 4))
+        self.assertEqual([op['status'] for op in operations],
+                         ['success', 'failed'])
+        failed = install_log_failed(operations)
+        self.assertEqual([op['operation'] for op in failed], ['94'])
+        self.assertEqual(len(failed[0]['errors']), 2)
+        self.assertTrue(install_log_summary(failed[0]).startswith(
+            'Install operation 94 (install add tftp://192.168.1.1/'
+            'asr9k-px-4.3.1.CSCul4.pie) failed: Error:'))
+
+    def test_fed_line_by_line(self):
+        response = fixture('classic_log', 4)
+        parser = InstallLogParser()
+        for line in response.splitlines():
+            operations = parser.feed([line])
+        self.assertEqual(operations, parse_install_log(response))
+
+
+class InstallStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exr = InstallState(fixture('exr_active'), fixture('exr_inactive'),
+                                fixture('exr_committed'))
+        self.classic = InstallState(fixture('classic_active'),
+                                    fixture('classic_inactive'),
+                                    fixture('classic_committed'))
+
+    def test_find_by_id_and_name(self):
+        self.assertTrue(self.exr.is_active('xrv9k-ospf-1.0.0.0-r612'))
+        self.assertTrue(self.exr.is_active(
+            'xrv9k-ospf-1.0.0.0-r612.x86_64.rpm'))
+        self.assertTrue(self.exr.is_active('xrv9k-ospf'))
+        self.assertFalse(self.exr.is_active('xrv9k-ospf-2.0.0.0-r612'))
+        self.assertEqual(self.exr.find('xrv9k-mgbl', 'inactive'),
+                         set(['xrv9k-mgbl-0.0.0.0-r612']))
+        self.assertTrue(self.exr.is_present('xrv9k-mcast'))
+        self.assertFalse(self.exr.is_committed('xrv9k-k9sec'))
+
+    def test_classic_release_suffix(self):
+        # listed with a '-1.0.0' release the package file name lacks
+        self.assertTrue(self.classic.is_active(
+            'disk0:asr9k-px-4.3.1.CSCuj0.pie'))
+        self.assertEqual(self.classic.nodes_with('asr9k-px-4.3.1.CSCuj0',
+                                                 'committed'),
+                         set(['0/RSP0/CPU0']))
+
+    def test_committed_state(self):
+        self.assertFalse(self.exr.is_committed_state())
+        self.assertFalse(self.classic.is_committed_state())
+        state = InstallState(fixture('exr_committed'), '',
+                             fixture('exr_committed'))
+        self.assertTrue(state.is_committed_state())
+
+    def test_fetch_reads_the_three_sections(self):
+        sent = list()
+
+        def run(commands):
+            sent.extend(commands)
+            return [fixture('exr_active'), fixture('exr_inactive'),
+                    fixture('exr_committed')]
+        state = InstallState.fetch(run)
+        self.assertEqual(sent, ['show install active', 'show install inactive',
+                                'show install committed'])
+        self.assertEqual(state.packages('active'),
+                         self.exr.packages('active'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+LOCAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(LOCAL_DIR, 'common'))
+sys.path.insert(0, os.path.join(LOCAL_DIR, 'library'))
+
+import iosxr_state
+from iosxr_install_parser import InstallState
+from iosxr_upgrade_package import *
+
+BASE_1 = 'xrv9k-xr-6.1.2'
+BASE_2 = 'xrv9k-xr-6.2.1'
+MINI_2 = 'xrv9k-mini-x-6.2.1'
+FILES = [MINI_2 + '.iso']
+UPGRADE = dict(version='6.2.1', pkgpath='/disk0:', pkgname='')
+
+
+def install_state(active=(), inactive=(), committed=()):
+    def show(section, packages):
+        return ('Node 0/RP0/CPU0 [RP]\n'
+                '    %s Packages: %d\n' % (section, len(packages)) +
+                ''.join('        %s\n' % pkg for pkg in packages))
+    return InstallState(show('Active', active), show('Inactive', inactive),
+                        show('Committed', committed))
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = iosxr_state.IOSXR_STATE_DIR
+        iosxr_state.IOSXR_STATE_DIR = tempfile.mkdtemp()
+        self.path = state_path('upgrade', '192.0.2.10_22.json')
+
+    def tearDown(self):
+        shutil.rmtree(iosxr_state.IOSXR_STATE_DIR)
+        iosxr_state.IOSXR_STATE_DIR = self.state_dir
+
+    def test_new_journal(self):
+        journal = load_journal(self.path, UPGRADE)
+        self.assertEqual(journal, dict(upgrade=UPGRADE, phases=dict()))
+
+    def test_same_upgrade_resumes(self):
+        load_journal(self.path, UPGRADE)
+        record_phase(self.path, 'transfer', source='/disk0:')
+        record_phase(self.path, 'add', packages=[BASE_2, MINI_2])
+        journal = load_journal(self.path, dict(UPGRADE))
+        self.assertEqual(sorted(journal['phases']), ['add', 'transfer'])
+        self.assertEqual(journal['source'], '/disk0:')
+        self.assertEqual(journal['packages'], [BASE_2, MINI_2])
+
+    def test_other_upgrade_starts_afresh(self):
+        load_journal(self.path, UPGRADE)
+        record_phase(self.path, 'add', packages=[BASE_2])
+        journal = load_journal(self.path, dict(UPGRADE, version='6.3.1'))
+        self.assertEqual(journal['phases'], dict())
+        self.assertNotIn('packages', journal)
+
+    def test_resume_after_add(self):
+        load_journal(self.path, UPGRADE)
+        record_phase(self.path, 'transfer', source='/disk0:')
+        record_phase(self.path, 'add', packages=[BASE_2, MINI_2])
+        # the next run finds the packages added, prepare still to do
+        journal = load_journal(self.path, UPGRADE)
+        installed = install_state([BASE_1], [BASE_2, MINI_2], [BASE_1])
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES, journal),
+                         set(['transfer', 'add']))
+        record_phase(self.path, 'prepare')
+        journal = load_journal(self.path, UPGRADE)
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES, journal),
+                         set(['transfer', 'add', 'prepare']))
+
+
+class CompletedPhasesTest(unittest.TestCase):
+
+    def journal(self, *phases, **kwargs):
+        return dict(kwargs, upgrade=UPGRADE,
+                    phases=dict((phase, dict(time=0)) for phase in phases))
+
+    def test_nothing_added(self):
+        installed = install_state([BASE_1], [], [BASE_1])
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES,
+                                          self.journal()), set())
+        # a transfer the device knows nothing about
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES,
+                                          self.journal('transfer')),
+                         set(['transfer']))
+
+    def test_added_by_an_earlier_run_without_journal(self):
+        installed = install_state([BASE_1], [BASE_2, MINI_2], [BASE_1])
+        # the device alone cannot vouch for prepare
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES,
+                                          self.journal()),
+                         set(['transfer', 'add']))
+
+    def test_activated_not_committed(self):
+        installed = install_state([BASE_2, MINI_2], [BASE_1], [BASE_1])
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES,
+                                          self.journal()),
+                         set(['transfer', 'add', 'prepare', 'activate']))
+
+    def test_upgrade_complete(self):
+        installed = install_state([BASE_2, MINI_2], [], [BASE_2, MINI_2])
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES,
+                                          self.journal()),
+                         set(UPGRADE_PHASES))
+
+    def test_device_takes_precedence_over_journal(self):
+        # the journaled packages were removed from the device since
+        installed = install_state([BASE_1], [], [BASE_1])
+        journal = self.journal('transfer', 'add', 'prepare',
+                               packages=[BASE_2, MINI_2])
+        self.assertEqual(completed_phases(installed, '6.2.1', FILES, journal),
+                         set(['transfer']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), 'remote', 'module_utils'))
+
+from iosxr_xrcli import *
+
+# a plain shell stands in for the XR namespace
+SHELL = 'exec /bin/sh'
+
+
+class XrCliTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cli = XrCli(SHELL)
+
+    def tearDown(self):
+        self.cli.close()
+
+    def test_output_and_status_per_command(self):
+        self.assertEqual(self.cli.run('echo one ; echo two >&2'),
+                         (0, 'one\n', 'two\n'))
+        self.assertEqual(self.cli.run('(echo three ; exit 3)'),
+                         (3, 'three\n', ''))
+
+    def test_output_without_trailing_newline(self):
+        self.assertEqual(self.cli.run('printf abc'), (0, 'abc', ''))
+        self.assertEqual(self.cli.run('true'), (0, '', ''))
+
+    def test_large_output_on_both_pipes(self):
+        rc, out, err = self.cli.run(
+            'i=0 ; while [ $i -lt 5000 ] ; do echo "out $i" ; '
+            'echo "err $i" >&2 ; i=$((i+1)) ; done')
+        self.assertEqual(rc, 0)
+        self.assertEqual(len(out.splitlines()), 5000)
+        self.assertEqual(len(err.splitlines()), 5000)
+
+    def test_commands_do_not_read_the_shell_stdin(self):
+        self.assertEqual(self.cli.run('cat'), (0, '', ''))
+        self.assertEqual(self.cli.run('echo still here'),
+                         (0, 'still here\n', ''))
+
+    def test_non_ascii_output_is_a_native_string(self):
+        rc, out, err = self.cli.run("printf 'caf\\303\\251\\n'")
+        self.assertTrue(isinstance(out, str))
+        # as the modules use it
+        self.assertEqual(len(str(out).splitlines()), 1)
+
+    def test_exited_shell_raises(self):
+        self.assertRaises(XrCliError, self.cli.run, 'exit 1')
+
+
+class XrCliPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bindir = tempfile.mkdtemp()
+        path = os.path.join(self.bindir, 'xr_cli')
+        with open(path, 'w') as fh:
+            fh.write('#!/bin/sh\necho "ran $1"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        self.shell = 'PATH=%s:${PATH} ; export PATH ; exec /bin/sh' % self.bindir
+
+    def tearDown(self):
+        shutil.rmtree(self.bindir)
+
+    def test_results_in_command_order(self):
+        commands = ['show cmd %d' % i for i in range(10)]
+        results = XrCliPool(3, self.shell).run(commands)
+        self.assertEqual([result['command'] for result in results], commands)
+        self.assertEqual([result['stdout'] for result in results],
+                         ['ran %s\n' % command for command in commands])
+        self.assertTrue(all(result['rc'] == 0 for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,7 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -27,6 +28,7 @@ author: Adisorn Ermongkonchai
 short_description: Clear log
 description:
   - Clear system log
+"""
 
 EXAMPLES = """
 - iosxr_clear_log:
@@ -50,10 +52,7 @@ def main():
         supports_check_mode = False
     )
   
-    command = '/bin/echo yes > yes'
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
-    command = 'source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- clr_logging < yes'
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
+    (rc, out, err) = xr_command(module, '/bin/echo yes | clr_logging')
   
     result = dict(changed=True)
     result['stdout'] = out if out != "" else err
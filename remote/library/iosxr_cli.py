@@ -19,6 +19,7 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -57,9 +58,7 @@ def main():
         ),
         supports_check_mode = False
     )
-    command = 'source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- xr_cli "%s"' % \
-              module.params['command']
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
+    (rc, out, err) = xr_cli(module, module.params['command'])
   
     result = dict(changed=False)
     result['stdout'] = out if out != "" else err
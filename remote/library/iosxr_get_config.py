@@ -18,7 +18,10 @@
 #
 #------------------------------------------------------------------------------
 
+import gzip
+
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 from ansible.module_utils.shell import *
 
 DOCUMENTATION = """
@@ -28,32 +31,114 @@ author: Adisorn Ermongkonchai
 short_description: Show running configuration on IOS-XR device
 description:
   - Get running configuration from IOS-XR device
+  - With dest, the configuration is written gzip compressed to a file on
+    the device, to be fetched from there, and only its path, size and
+    checksum are returned
+options:
+  dest:
+    description:
+      - path of the gzip file on the device to write the configuration to
+        instead of returning it in stdout
+    required: false
+    default: null
+  checksum:
+    description:
+      - SHA1 checksum of the controller's last copy of the file; changed
+        is false if the new file has the same checksum, so the fetch can
+        be skipped
+    required: false
+    default: null
 """
 
 EXAMPLES = """
 - iosxr_get_config:
+
+- iosxr_get_config:
+    dest: /misc/scratch/running-config.gz
+    checksum: "{{ last_copy.stat.checksum | default(omit) }}"
+  register: config
+- fetch:
+    src: "{{ config.path }}"
+    dest: "configs/{{ inventory_hostname }}.gz"
+    flat: yes
+  when: config.changed
 """
 
 RETURN = """
 stdout:                               
   description: raw response
-  returned: always
+  returned: without dest
 stdout_lines:   
   description: list of response lines
-  returned: always
+  returned: without dest
+path:
+  description: path of the gzip file on the device
+  returned: with dest
+size:
+  description: size of the gzip file in bytes
+  returned: with dest
+checksum:
+  description: SHA1 checksum of the gzip file
+  returned: with dest
 """
 
+# first line of 'show run', the time it ran: 'Tue Dec 13 20:53:06.123 UTC'
+TIMESTAMP_RE = re.compile(r"^\w{3} \w{3} +\d+ [\d:.]+ \S+$")
+
+def write_config(module, dest):
+    """Write 'show run' to dest gzip compressed, without the timestamp
+    line and with no time or name in the gzip header, so the file only
+    changes when the configuration does.
+    """
+    tmp = dest + '.tmp'
+    try:
+        (rc, out, err) = xr_command(module, 'xr_cli %s > %s' %
+                                    (shell_quote('show run'), shell_quote(tmp)))
+        if rc != 0:
+            module.fail_json(msg='show run failed: %s' % err, rc=rc)
+        with open(tmp, 'rb') as src:
+            with open(dest + '.gz.tmp', 'wb') as fh:
+                gz = gzip.GzipFile(filename='', mode='wb', fileobj=fh,
+                                   mtime=0)
+                first = True
+                for line in src:
+                    if first:
+                        first = False
+                        if TIMESTAMP_RE.match(line.decode('utf8', 'replace')
+                                                  .strip()):
+                            continue
+                    gz.write(line)
+                gz.close()
+        os.rename(dest + '.gz.tmp', dest)
+    except (IOError, OSError):
+        e = get_exception()
+        module.fail_json(msg='cannot write %s: %s' % (dest, e))
+    finally:
+        for path in (tmp, dest + '.gz.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
             username = dict(required=False, default=None),
             password = dict(required=False, default=None),
+            dest = dict(required=False, default=None),
+            checksum = dict(required=False, default=None),
         ),
         supports_check_mode = False
     )
     result = dict(changed=False)
-    command = 'source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- xr_cli "show run"'
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
+    dest = module.params['dest']
+    if dest is not None:
+        write_config(module, dest)
+        result['path'] = dest
+        result['size'] = os.path.getsize(dest)
+        result['checksum'] = module.sha1(dest)
+        result['changed'] = result['checksum'] != module.params['checksum']
+        return module.exit_json(**result)
+
+    (rc, out, err) = xr_cli(module, 'show run')
 
     result['stdout'] = out
     return module.exit_json(**result)
@@ -20,6 +20,7 @@
 
 from ansible.module_utils.shell import *
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -28,10 +29,19 @@ author: Adisorn Ermongkonchai
 short_description: Get status and information from IOS-XR device
 description:
   - Get status and information from IOS-XR device
+options:
+  parallelism:
+    description:
+      - number of show commands run at the same time, each in a shell
+        of its own; 1 runs them one after another
+    required: false
+    default: 4
 """
 
 EXAMPLES = """
 - iosxr_get_facts:
+- iosxr_get_facts:
+    parallelism: 2
 """
 
 RETURN = """
@@ -41,6 +51,9 @@ stdout:
 stdout_lines:   
   description: list of response lines
   returned: always
+timings:
+  description: seconds each show command took, and all of them in elapsed
+  returned: always
 """
 
 def main():
@@ -48,11 +61,18 @@ def main():
         argument_spec = dict(
             username = dict(required=False, default=None),
             password = dict(required=False, default=None),
+            parallelism = dict(required=False, type='int', default=4),
         ),
         supports_check_mode = False
     )
-    # make sure "terminal length 0" is set on XR console
-    cmds = [ 'show platform',
+    if module.params['parallelism'] < 1:
+        module.fail_json(msg='parallelism must be at least 1')
+
+    # make sure "terminal length 0" is set on XR console; the slowest
+    # commands go first so the others run alongside them
+    cmds = [ 'show running-config',
+             'show route',
+             'show platform',
              'show version',
              'show inventory all',
              'show memory summary',
@@ -60,17 +80,19 @@ def main():
              'show filesystem',
              'show media',
              'show license all',
-             'show route',
-             'show running-config',
              'show arp',
              'show ipv4 int brief',
              'show ipv6 int brief' ]
 
     result = dict(changed=False)
-    for cmd in cmds:
-        command = "source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- xr_cli '%s'" % cmd
-        (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
-        result[cmd] = str(out).splitlines()
+    timings = dict()
+    start = time.time()
+    for output in xr_cli_parallel(module, cmds,
+                                  module.params['parallelism']):
+        result[output['command']] = str(output['stdout']).splitlines()
+        timings[output['command']] = output['seconds']
+    timings['elapsed'] = round(time.time() - start, 3)
+    result['timings'] = timings
     return module.exit_json(**result)
 
 if __name__ == "__main__":
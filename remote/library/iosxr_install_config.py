@@ -19,6 +19,7 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -72,17 +73,14 @@ def main():
     load_command = 'config -f %s ' % cfg_name
     if label is not None:
         load_command = load_command + '-l "%s"' % label
-    command = "source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- %s" % load_command
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
+    (rc, out, err) = xr_command(module, load_command)
 
     # check for error
     if err != "":
         module.fail_json(msg=err)
   
     change_command = 'show config commit changes last 1'
-    command = 'source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- xr_cli "%s"' % \
-              change_command
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
+    (rc, out, err) = xr_cli(module, change_command)
 
     result = dict(changed=False)
     result['stdout'] = out
@@ -19,6 +19,8 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_install_parser import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -37,7 +39,9 @@ options:
     required: Only when state is 'present'
   pkgname:
     description:
-      - IOS-XR software package without file extension
+      - IOS-XR software package without file extension, or a list of
+        them to add, update, activate, deactivate or remove together in
+        a single install operation
         e.g. The package name for 'xrv9k-ospf-1.0.0.0-r61102I.x86_64.rpm'
              is 'xrv9k-ospf-1.0.0.0-r61102I'
     required: true
@@ -65,173 +69,231 @@ EXAMPLES = """
     username: cisco
     pkgname: 'xrv9k-ospf-1.0.0.0-r61102I'
     state: activated
+
+- iosxr_install_package:
+    username: cisco
+    pkgname:
+      - 'xrv9k-ospf-1.0.0.0-r61102I'
+      - 'xrv9k-mpls-1.0.0.0-r61102I'
+    state: activated
 """
 
 RETURN = """
 stdout:                               
-  description: raw response
+  description: a summary line per install operation and a line per
+               package that needed no operation
   returned: always
 stdout_lines:   
   description: list of response lines
   returned: always
+install_log:
+  description: per install operation its id, user, command, status
+               (success, failed, aborted or running), actions, errors,
+               and number of log lines
+  returned: when an install operation ran
+install_timings:
+  description: seconds the install operation took in all and per stage
+               reported by 'show install request', and the number of polls
+  returned: when an install operation ran
 """
 
 def execute_command(module, command):
-    cmd = "source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- xr_cli '%s'" % command
-    return module.run_command(cmd, use_unsafe_shell=True)
+    return xr_cli(module, command)
+
+# the three sections, one xr_cli each
+def fetch_install_state(module):
+    return InstallState.fetch(
+        lambda commands: [execute_command(module, command)[1]
+                          for command in commands])
+
+# read the install state again once an operation has completed
+def verify_install(module, check, message, response):
+    installed = fetch_install_state(module)
+    if not check(installed):
+        module.fail_json(msg=message, stdout=response)
+    return installed
 
 # check if another install command in progress
 def is_install_in_progress(module):
     command = "show install request"
     (rc, out, err) = execute_command(module, command)
-    return "No install operation in progress" not in out
-
-# check if the package is already added
-def is_package_already_added(module, pkg_name):
-    command = "show install inactive"
-    (rc, out, err) = execute_command(module, command)
-    return pkg_name in out
+    return parse_install_request(out) is not None
 
-# check if the package is already active
-def is_package_already_active(module, pkg_name):
-    command = "show install active"
-    (rc, out, err) = execute_command(module, command)
-    return pkg_name in out
-
-# wait for install command to complete
-def wait_install_response(module, oper_id):
-    retries = 100
-    while retries > 0:
-        if is_install_in_progress(module):
-            retries -= 1
-            time.sleep(3)
-        else:
-            response = list()
-            for inst_id in oper_id:
-                command = "show install log " + inst_id
-                (rc, out, err) = execute_command(module, command)
-                response.append(out)
-            for rmsg in response:
-                if 'aborted' in rmsg:
-                    module.fail_json(msg=rmsg)
-            return response
-    else:
-        module.fail_json(msg="timeout waiting for install to complete")
+# wait for install command to complete, then return a summary line
+# per operation from its log
+def wait_install_response(module, oper_id, result):
+    result['install_timings'] = wait_for_install(
+        module, lambda: execute_command(module, "show install request")[1])
+    operations = list()
+    for inst_id in oper_id:
+        command = "show install log " + inst_id
+        (rc, out, err) = execute_command(module, command)
+        operations.extend(parse_install_log(out))
+    result['install_log'] = operations
+    failed = install_log_failed(operations)
+    if failed:
+        module.fail_json(msg="\n".join(install_log_summary(op)
+                                       for op in failed),
+                         install_log=operations)
+    return [install_log_summary(op) for op in operations]
 
 # get install operation id from log
 def get_operation_id(out):
     pattern = re.compile(r"operation (\d+) started")
     return pattern.findall(out)
 
-# add package only when it is not already added or activated
-def install_add(module, pkg_path, pkg_name):
+# start one install operation and wait for every operation it reports
+def install_operation(module, command, result):
+    (rc, out, err) = execute_command(module, command)
+    oper_id = get_operation_id(out)
+    return wait_install_response(module, oper_id, result)
+
+# add packages that are not already added or activated
+def install_add(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        response = [pkg_name + " package is already active\n"]
-    elif is_package_already_added(module, pkg_name):
-        response = [pkg_name + " package is already added\n"]
-    elif pkg_path is None:
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            response.append(pkg_name + " package is already active\n")
+        elif installed.is_inactive(pkg_name):
+            response.append(pkg_name + " package is already added\n")
+        else:
+            pending.append(pkg_name)
+
+    if pending and pkg_path is None:
         module.fail_json(msg="package path required")
-    else:
-        command = ("install add source " +
-                   pkg_path + " " +
-                   pkg_name + ".x86_64.rpm")
-        (rc, out, err) = execute_command(module, command)
-        oper_id = get_operation_id(out)
-        response = wait_install_response(module, oper_id)
+    elif pending:
+        command = ("install add source " + pkg_path + " " +
+                   " ".join(pkg + ".x86_64.rpm" for pkg in pending))
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: all(s.is_present(pkg) for pkg in pending),
+                       " ".join(pending) + " not added", response)
         result['changed'] = True
 
     result['stdout'] = response
     result['stdout_lines'] = [str(rmsg).splitlines() for rmsg in response]
     return result
 
-# remove package only when it is in inactive state
-def install_remove(module, pkg_path, pkg_name):
+# remove packages only when they are in inactive state
+def install_remove(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        error = pkg_name + " is active, please deactivate first"
+    active = [pkg for pkg in pkg_names if installed.is_active(pkg)]
+    if active:
+        error = " ".join(active) + " is active, please deactivate first"
         module.fail_json(msg=error)
-    elif is_package_already_added(module, pkg_name):
-        command = "install remove " + pkg_name
-        (rc, out, err) = execute_command(module, command)
-        oper_id = get_operation_id(out)
-        response = wait_install_response(module, oper_id)
+
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_inactive(pkg_name):
+            pending.append(pkg_name)
+        else:
+            response.append(pkg_name + " package has already been removed\n")
+
+    if pending:
+        command = "install remove " + " ".join(pending)
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: not any(s.is_present(pkg) for pkg in pending),
+                       " ".join(pending) + " not removed", response)
         result['changed'] = True
-    else:
-        response = [pkg_name + " package has already been removed\n"]
 
     result['stdout'] = response
     result['stdout_lines'] = [str(rmsg).splitlines() for rmsg in response]
     return result
 
-# update package
-def install_update(module, pkg_path, pkg_name):
+# update packages that are not already active
+def install_update(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        response = [pkg_name + " package is already active\n"]
-    else:
-        command = ("install update source " +
-                   pkg_path + " " +
-                   pkg_name + ".x86_64.rpm")
-        (rc, out, err) = execute_command(module, command)
-        oper_id = get_operation_id(out)
-        response = wait_install_response(module, oper_id)
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            response.append(pkg_name + " package is already active\n")
+        else:
+            pending.append(pkg_name)
+
+    if pending:
+        command = ("install update source " + pkg_path + " " +
+                   " ".join(pkg + ".x86_64.rpm" for pkg in pending))
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: all(s.is_active(pkg) for pkg in pending),
+                       " ".join(pending) + " not active after update",
+                       response)
         result['changed'] = True
 
     result['stdout'] = response
     result['stdout_lines'] = [str(rmsg).splitlines() for rmsg in response]
     return result
 
-# activate package only when it has been added
-def install_activate(module, pkg_path, pkg_name):
+# activate packages only when they have been added
+def install_activate(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        response = [pkg_name + " package is already active\n"]
-    elif is_package_already_added(module, pkg_name):
-        command = "install activate " + pkg_name
-        (rc, out, err) = execute_command(module, command)
-        oper_id = get_operation_id(out)
-        response = wait_install_response(module, oper_id)
-        result['changed'] = True
-    else:
-        error = pkg_name + " must be present before activate"
+    missing = [pkg for pkg in pkg_names if not installed.is_present(pkg)]
+    if missing:
+        error = " ".join(missing) + " must be present before activate"
         module.fail_json(msg=error)
 
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            response.append(pkg_name + " package is already active\n")
+        else:
+            pending.append(pkg_name)
+
+    if pending:
+        command = "install activate " + " ".join(pending)
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: all(s.is_active(pkg) for pkg in pending),
+                       " ".join(pending) + " not activated", response)
+        result['changed'] = True
+
     result['stdout'] = response
     result['stdout_lines'] = [str(rmsg).splitlines() for rmsg in response]
     return result
 
-# deactivate package only when it is in active state
-def install_deactivate(module, pkg_path, pkg_name):
+# deactivate packages only when they are in active state
+def install_deactivate(module, installed, pkg_path, pkg_names):
     result = dict(changed=False)
 
-    if is_package_already_active(module, pkg_name):
-        command = "install deactivate " + pkg_name
-        (rc, out, err) = execute_command(module, command)
-        oper_id = get_operation_id(out)
-        response = wait_install_response(module, oper_id)
+    response = list()
+    pending = list()
+    for pkg_name in pkg_names:
+        if installed.is_active(pkg_name):
+            pending.append(pkg_name)
+        elif installed.is_inactive(pkg_name):
+            response.append(pkg_name + " package is already deactivated\n")
+        else:
+            response.append(pkg_name + " package has already been removed\n")
+
+    if pending:
+        command = "install deactivate " + " ".join(pending)
+        response += install_operation(module, command, result)
+        verify_install(module,
+                       lambda s: not any(s.is_active(pkg) for pkg in pending),
+                       " ".join(pending) + " not deactivated", response)
         result['changed'] = True
-    elif is_package_already_added(module, pkg_name):
-        response = [pkg_name + " package is already deactivated\n"]
-    else:
-        response = [pkg_name + " package has already been removed\n"]
 
     result['stdout'] = response
     result['stdout_lines'] = [str(rmsg).splitlines() for rmsg in response]
     return result
   
 # commit active packages
-def install_commit(module, pkg_path, pkg_name):
-    command = "install commit"
-    (rc, out, err) = execute_command(module, command)
-    oper_id = get_operation_id(out)
-    response = wait_install_response(module, oper_id)
-
+def install_commit(module, installed, pkg_path, pkg_names):
     result = dict(changed=True)
+    response = install_operation(module, "install commit", result)
+    verify_install(module, lambda s: s.is_committed_state(),
+                   "active packages were not committed", response)
+
     result['stdout'] = response
     result['stdout_lines'] = [str(rmsg).splitlines() for rmsg in response]
     return result
@@ -242,7 +304,7 @@ def main():
             username = dict(required=False, default=None),
             password = dict(required=False, default=None),
             pkgpath = dict(required=False, default=None),
-            pkgname = dict(required=True, default=None),
+            pkgname = dict(required=True, type='list'),
             state = dict(required=False, default='present',
                          choices = ['present',
                                     'absent',
@@ -269,7 +331,12 @@ def main():
         'deactivated': install_deactivate,
         'committed':   install_commit
     }
-    result = install[state](module, args['pkgpath'], args['pkgname'])
+    # one snapshot answers every state check; commit needs none
+    installed = None
+    if state != 'committed':
+        installed = fetch_install_state(module)
+    result = install[state](module, installed, args['pkgpath'],
+                            args['pkgname'])
   
     module.exit_json(**result)
 
@@ -19,6 +19,7 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -69,12 +70,10 @@ def main():
         result['stdout'] = "reload aborted"
         module.exit_json(**result)
  
-    command = '/bin/echo y > yes'
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
-    reload_command = 'source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- reload -t 0x0 '
+    reload_command = '/bin/echo y | reload -t 0x0 '
     reload_options = '-a' if args['force'] is True else '-d'
-    command = reload_command + reload_options + ' < yes'
-    (rc, out, err) = module.run_command(command, use_unsafe_shell=True)
+    command = reload_command + reload_options
+    (rc, out, err) = xr_command(module, command)
   
     result = dict(changed=False)
     result['stdout'] = out
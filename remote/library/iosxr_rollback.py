@@ -19,6 +19,7 @@
 #------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.iosxr_xrcli import *
 
 DOCUMENTATION = """
 ---
@@ -108,7 +109,7 @@ def main():
     label = args['label']
     force = args['force']
 
-    reload_command = 'source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} nsenter -t 1 -n -- config_rollback '
+    reload_command = 'config_rollback '
     if rollback_id is not None:
         reload_command += '-j %s ' % rollback_id
     if to_id is not None:
@@ -121,7 +122,7 @@ def main():
         reload_command += '-f '
     if label is not None:
         reload_command += '-l %s ' % label
-    (rc, out, err) = module.run_command(reload_command, use_unsafe_shell=True)
+    (rc, out, err) = xr_command(module, reload_command)
   
     result = dict(changed=False)
     result['stdout'] = err
@@ -0,0 +1,410 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Parsers for 'show install active/inactive/committed/request/log' output
+# of 64-bit and classic IOS-XR, and the install state and install wait
+# built on them.  Every parser makes a single pass over the response with
+# precompiled regexes, so the cost grows linearly with the size of the
+# output (see local/bench/bench_parsers.py).  No dependency on Ansible or
+# on how commands reach the device, so the code can be used and measured
+# on its own.  This is the only copy: the remote modules import it from
+# module_utils, the local ones through the link to it in local/common.
+#
+
+import os
+import re
+import time
+
+# 'show install active/inactive/committed'
+NODE_RE = re.compile(r"^\s*Node\s+(\S+)")
+# 'Active Packages: 2', 'Inactive Packages:', '5 inactive package(s) found:'
+PACKAGES_RE = re.compile(r"packages\s*:|package\(s\) found", re.I)
+DEVICE_RE = re.compile(r"^[\w\-]+:(?!\s)")
+SUFFIX_RE = re.compile(r"(\.x86_64)?\.(rpm|pie|iso)$|\.x86_64$")
+VERSION_SPLIT_RE = re.compile(r"-(?=\d)")
+
+# 'show install request'; 64-bit: 'No install operation in progress',
+# classic: 'There are no install requests in operation.'
+IDLE_RE = re.compile(r"No install operation in progress|no install requests",
+                     re.I)
+OPERATION_RE = re.compile(r"operation (\d+)", re.I)
+PERCENT_RE = re.compile(r"(\d+)% complete")
+# most specific first, 'State' only says whether it is still running
+STAGE_RES = [re.compile(r"^[ \t]*%s[ \t]*:[ \t]*(.*\S)" % label, re.I | re.M)
+             for label in ('Current activity', 'Stage', 'State')]
+
+# 'show install log'; lines may start with a 'Dec 13 20:53:06' timestamp
+LOG_START_RE = re.compile(r"Install operation (\d+) (?:\([^)]*\) )?started by "
+                          r"(?:user )?'?([^':\s]+)'?")
+LOG_END_RE = re.compile(r"Install operation (\d+) (finished successfully|"
+                        r"completed successfully|completed with warnings|"
+                        r"aborted|failed)")
+LOG_COMMAND_RE = re.compile(r"^(?:\w{3} +\d+ [\d:]+ +)?\s*(install\s+\S.*\S)")
+LOG_ACTION_RE = re.compile(r"Action (\d+): (.*?) action (started|completed "
+                           r"successfully|finished successfully|failed|"
+                           r"aborted)")
+LOG_ERROR_RE = re.compile(r"^(?:\w{3} +\d+ [\d:]+ +)?\s*(?:Error|ERROR)\s*[:!]")
+LOG_STATUS = {'finished successfully': 'success',
+              'completed successfully': 'success',
+              'completed with warnings': 'success',
+              'aborted': 'aborted',
+              'failed': 'failed',
+              'started': 'running'}
+
+def package_id(package):
+    """Return package without its device prefix ('disk0:') or file
+    suffix ('.x86_64.rpm', '.pie', '.iso'), the form 'show install' lists
+    it in.
+    """
+    return SUFFIX_RE.sub('', DEVICE_RE.sub('', package.strip()))
+
+def split_package(package):
+    """Split a package id into name and version at the first dash
+    followed by a digit: 'xrv9k-ospf-1.0.0.0-r612' gives
+    ('xrv9k-ospf', '1.0.0.0-r612').  version is None if there is none.
+    """
+    parts = VERSION_SPLIT_RE.split(package_id(package), 1)
+    return parts[0], parts[1] if len(parts) > 1 else None
+
+def parse_packages(response):
+    """Return {node: set(package ids)} listed in one 'show install'
+    response.  Packages not listed under a node are keyed by None.
+    """
+    nodes = dict()
+    node = None
+    listing = False
+    for line in response.splitlines():
+        match = NODE_RE.match(line)
+        if match:
+            node = match.group(1)
+            nodes.setdefault(node, set())
+            listing = False
+        elif PACKAGES_RE.search(line):
+            nodes.setdefault(node, set())
+            listing = True
+        elif not line.strip():
+            listing = False
+        elif listing:
+            # '    ncs5500-xr-6.1.2 version=6.1.2 [Boot image]'
+            nodes[node].add(package_id(line.split()[0]))
+    return nodes
+
+def package_records(response):
+    """Return one dict(node, package, name, version) per package listed
+    in a 'show install active/inactive/committed' response.
+    """
+    records = list()
+    for node, packages in parse_packages(response).items():
+        for package in sorted(packages):
+            name, version = split_package(package)
+            records.append(dict(node=node, package=package, name=name,
+                                version=version))
+    return records
+
+def parse_install_request(response):
+    """Return the operation, percent complete and stage of the install
+    operation in a 'show install request' response, or None if no
+    operation is in progress.  Fields the device did not report are None.
+    """
+    if IDLE_RE.search(response):
+        return None
+    progress = dict(operation=None, percent=None, stage=None)
+    match = OPERATION_RE.search(response)
+    if match:
+        progress['operation'] = match.group(1)
+    match = PERCENT_RE.search(response)
+    if match:
+        progress['percent'] = int(match.group(1))
+    for stage_re in STAGE_RES:
+        match = stage_re.search(response)
+        if match:
+            progress['stage'] = match.group(1)
+            break
+    return progress
+
+class InstallLogParser(object):
+    """Parse 'show install log' output a few lines at a time, as it is
+    read while the operations run.  feed() returns the records of all
+    operations seen so far, in the order logged: dict(operation, user,
+    command, status, actions, errors, lines).  status is 'success',
+    'failed', 'aborted' or 'running' (no end line yet); actions lists the
+    number, name and status of every action; errors holds the lines
+    starting with 'Error:' or 'ERROR!'; lines counts the lines logged.
+    """
+
+    def __init__(self):
+        self.operations = list()
+        self.current = None
+        self.expect_command = False
+
+    def feed(self, lines):
+        for line in lines:
+            self._parse_line(line)
+        return self.operations
+
+    def _parse_line(self, line):
+        match = LOG_START_RE.search(line)
+        if match:
+            self.current = dict(operation=match.group(1),
+                                user=match.group(2), command=None,
+                                status='running', actions=list(),
+                                errors=list(), lines=0)
+            self.operations.append(self.current)
+            self.expect_command = True
+        current = self.current
+        if current is None:
+            return
+        current['lines'] += 1
+        if match:
+            return
+
+        if self.expect_command:
+            match = LOG_COMMAND_RE.match(line)
+            if match:
+                current['command'] = match.group(1)
+                self.expect_command = False
+                return
+        match = LOG_END_RE.search(line)
+        if match:
+            current['status'] = LOG_STATUS[match.group(2)]
+            return
+        match = LOG_ACTION_RE.search(line)
+        if match:
+            status = LOG_STATUS[match.group(3)]
+            for action in current['actions']:
+                if action['number'] == match.group(1):
+                    action['status'] = status
+                    break
+            else:
+                current['actions'].append(dict(number=match.group(1),
+                                               name=match.group(2),
+                                               status=status))
+            return
+        if LOG_ERROR_RE.match(line):
+            current['errors'].append(line.strip())
+
+def parse_install_log(response):
+    """Return the records of InstallLogParser for a whole 'show install
+    log' response.
+    """
+    return InstallLogParser().feed(response.splitlines())
+
+def install_log_failed(operations):
+    """Return the operations of parse_install_log() that failed or were
+    aborted, or logged an error.
+    """
+    return [op for op in operations
+            if op['status'] in ('failed', 'aborted') or op['errors']]
+
+def install_log_summary(operation):
+    """Return a one line summary of an operation of parse_install_log():
+    'Install operation 9 (install add ...) success', with the errors
+    logged appended.
+    """
+    summary = 'Install operation %s (%s) %s' % (operation['operation'],
+                                                operation['command'],
+                                                operation['status'])
+    if operation['errors']:
+        summary += ': ' + ' '.join(operation['errors'])
+    return summary
+
+INSTALL_SECTIONS = ('active', 'inactive', 'committed')
+
+# polling of 'show install request' while an install operation runs
+INSTALL_POLL_INTERVAL = float(os.environ.get('IOSXR_INSTALL_POLL_INTERVAL', 0.5))
+INSTALL_POLL_MAX = float(os.environ.get('IOSXR_INSTALL_POLL_MAX', 10))
+INSTALL_STALL_TIMEOUT = int(os.environ.get('IOSXR_INSTALL_STALL_TIMEOUT', 300))
+INSTALL_TIMEOUT = int(os.environ.get('IOSXR_INSTALL_TIMEOUT', 7200))
+
+
+class InstallState(object):
+    """Snapshot of the packages on a device, per section and node.
+
+    Each section (active, inactive, committed) is kept both as
+    {node: set(ids)} and as an index {name: {version: set(nodes)}}, so a
+    package can be looked up by full id or by name alone without another
+    trip to the device.  Fetch one per task with InstallState.fetch() and
+    again after an install operation to verify its outcome.
+    """
+
+    def __init__(self, active='', inactive='', committed=''):
+        self.nodes = dict()
+        self.index = dict()
+        for section, response in zip(INSTALL_SECTIONS,
+                                      (active, inactive, committed)):
+            nodes = parse_packages(response)
+            index = dict()
+            for node, packages in nodes.items():
+                for package in packages:
+                    name, version = split_package(package)
+                    index.setdefault(name, dict()).setdefault(
+                        version, set()).add(node)
+            self.nodes[section] = nodes
+            self.index[section] = index
+
+    @classmethod
+    def fetch(cls, run):
+        """Read the three sections with run(), which takes a list of
+        commands and returns their responses.
+        """
+        return cls(*run(['show install %s' % section
+                         for section in INSTALL_SECTIONS]))
+
+    def packages(self, section):
+        """Return the ids in section, across all nodes."""
+        packages = set()
+        for ids in self.nodes[section].values():
+            packages.update(ids)
+        return packages
+
+    def find(self, package, section):
+        """Return the ids in section that package refers to.
+
+        package matches an id exactly, as a prefix up to a version or
+        release separator (classic XR lists 'asr9k-px-5.3.3.CSCux12345' as
+        'asr9k-px-5.3.3.CSCux12345-1.0.0'), or, given without a version,
+        every version of that name.
+        """
+        package = package_id(package)
+        name, version = split_package(package)
+        found = set()
+        if version is None:
+            for version in self.index[section].get(name, ()):
+                found.add(name if version is None else
+                          '%s-%s' % (name, version))
+            return found
+        for candidate in self.index[section].get(name, dict()):
+            candidate = '%s-%s' % (name, candidate)
+            if (candidate == package or
+                    candidate.startswith(package + '-') or
+                    candidate.startswith(package + '.')):
+                found.add(candidate)
+        return found
+
+    def nodes_with(self, package, section):
+        """Return the nodes that have package in section."""
+        found = self.find(package, section)
+        return set(node for node, ids in self.nodes[section].items()
+                   if ids & found)
+
+    def is_active(self, package):
+        return bool(self.find(package, 'active'))
+
+    def is_inactive(self, package):
+        return bool(self.find(package, 'inactive'))
+
+    def is_committed(self, package):
+        return bool(self.find(package, 'committed'))
+
+    def is_present(self, package):
+        return self.is_active(package) or self.is_inactive(package)
+
+    def is_committed_state(self):
+        """Return True if what is committed matches what is active."""
+        return self.nodes['active'] == self.nodes['committed']
+
+
+class InstallWaiter(object):
+    """Wait for the running install operation to complete.
+
+    'show install request' is polled every interval seconds at first,
+    backing off by half on every poll up to max_interval, so quick
+    operations return within a second and long ones cost few polls.
+    The operation may run as long as it keeps progressing: the wait only
+    gives up once percent and stage have not changed for stall_timeout
+    seconds, or after timeout seconds in all.
+    """
+
+    def __init__(self, interval=INSTALL_POLL_INTERVAL,
+                 max_interval=INSTALL_POLL_MAX,
+                 stall_timeout=INSTALL_STALL_TIMEOUT,
+                 timeout=INSTALL_TIMEOUT):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.stall_timeout = stall_timeout
+        self.timeout = timeout
+
+    def wait(self, poll):
+        """Call poll() for a 'show install request' response until no
+        operation is in progress.  Return dict(completed, elapsed, polls,
+        progress, phases), where phases lists stage, percent reached,
+        start and elapsed seconds of every stage the operation went
+        through, and progress is the last progress parsed (None once
+        the operation has completed).  poll() returns None once the
+        device cannot be asked any more, which ends the wait.
+        """
+        start = time.time()
+        interval = self.interval
+        phases = list()
+        timings = dict(completed=False, polls=0, progress=None,
+                       phases=phases)
+        progressed = start
+        last = None
+        while True:
+            response = poll()
+            now = time.time()
+            timings['polls'] += 1
+            if response is None:
+                timings['reason'] = 'device stopped answering'
+                break
+            progress = parse_install_request(response)
+            timings['progress'] = progress
+            if progress is None:
+                timings['completed'] = True
+                break
+
+            stage = progress['stage'] or 'in progress'
+            if (progress['stage'], progress['percent']) != last:
+                last = (progress['stage'], progress['percent'])
+                progressed = now
+            if not phases or phases[-1]['stage'] != stage:
+                phases.append(dict(stage=stage, percent=None,
+                                   start=round(now - start, 3)))
+            if progress['percent'] is not None:
+                phases[-1]['percent'] = progress['percent']
+
+            if now - progressed > self.stall_timeout:
+                timings['reason'] = ('no progress for %d seconds' %
+                                     self.stall_timeout)
+                break
+            if now - start > self.timeout:
+                timings['reason'] = ('still running after %d seconds' %
+                                     self.timeout)
+                break
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_interval)
+
+        end = round(time.time() - start, 3)
+        for phase, following in zip(phases, phases[1:] + [None]):
+            phase_end = following['start'] if following else end
+            phase['elapsed'] = round(phase_end - phase['start'], 3)
+        timings['elapsed'] = end
+        return timings
+
+
+def wait_for_install(module, poll):
+    """Wait with an InstallWaiter for the running install operation and
+    return its timings, failing the module if it does not complete.
+    """
+    timings = InstallWaiter().wait(poll)
+    if not timings['completed']:
+        module.fail_json(msg='timeout waiting for install to complete: %s' %
+                             timings['reason'], install_timings=timings)
+    return timings
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+#------------------------------------------------------------------------------
+#
+#    Copyright (C) 2016 Cisco Systems, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------
+#
+# Helper for the remote (on-box) modules: one shell in the XR network
+# namespace, started once per module run with /etc/profile sourced, that
+# every XR CLI command and helper program (xr_cli, config, reload, ...)
+# of the module is written to, instead of a new /bin/sh, profile and
+# nsenter per command.  Ansible ships it with the modules when
+# ANSIBLE_MODULE_UTILS points at remote/module_utils.
+#
+
+import atexit
+import os
+import select
+import subprocess
+import threading
+import time
+import uuid
+
+from ansible.module_utils.basic import get_exception
+from ansible.module_utils._text import to_bytes, to_native
+
+# the shell every command runs in, entered once
+XR_SHELL = ("source /etc/profile ; PATH=/pkg/sbin:/pkg/bin:${PATH} ; "
+            "export PATH ; exec nsenter -t 1 -n -- /bin/sh")
+
+
+class XrCliError(Exception):
+    pass
+
+
+def shell_quote(text):
+    return "'" + text.replace("'", "'\"'\"'") + "'"
+
+
+class XrCli(object):
+    """Long-lived shell in the XR namespace that runs commands one at a
+    time and returns (rc, out, err) like AnsibleModule.run_command().
+
+    Each command is followed by an end marker on stdout, carrying its
+    exit status, and on stderr, so the output of one command is told
+    apart from the next without closing the pipes.  The shell is started
+    on the first command and ends with the module.
+    """
+
+    def __init__(self, shell=XR_SHELL):
+        self.shell = shell
+        self.proc = None
+        self.marker = '__XRCLI_%s__' % uuid.uuid4().hex
+
+    def start(self):
+        self.proc = subprocess.Popen(['/bin/sh', '-c', self.shell],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+        atexit.register(self.close)
+
+    def run(self, command):
+        """Run a shell command line in the XR namespace."""
+        if self.proc is None:
+            self.start()
+        # stdin stays with the shell, commands read /dev/null
+        script = ("{ %s\n} < /dev/null\n"
+                  "printf '\\n%s %%d\\n' $? ; printf '\\n%s\\n' >&2\n" %
+                  (command, self.marker, self.marker))
+        try:
+            self.proc.stdin.write(to_bytes(script))
+            self.proc.stdin.flush()
+        except (IOError, OSError):
+            raise XrCliError('XR shell exited with status %s' %
+                             self.proc.poll())
+        return self._read()
+
+    def xr_cli(self, command):
+        """Run an XR exec command, e.g. 'show install active'."""
+        return self.run('xr_cli ' + shell_quote(command))
+
+    def _read(self):
+        """Read stdout and stderr up to their end markers, together, so
+        a command writing much to one cannot block on the other.  The
+        output is returned as native strings, bytes on Python 2, as
+        run_command() does.
+        """
+        # each end marker follows a newline of its own, not part of the
+        # output
+        end = to_bytes('\n' + self.marker)
+        data = {self.proc.stdout.fileno(): b'',
+                self.proc.stderr.fileno(): b''}
+        done = dict()
+        while len(done) < len(data):
+            ready, _, _ = select.select([fd for fd in data
+                                         if fd not in done], [], [])
+            for fd in ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise XrCliError('XR shell exited with status %s' %
+                                     self.proc.wait())
+                data[fd] += chunk
+                found = data[fd].find(end)
+                if found >= 0 and data[fd].endswith(b'\n'):
+                    done[fd] = (to_native(data[fd][:found],
+                                          errors='replace'),
+                                data[fd][found + len(end):])
+        out, status = done[self.proc.stdout.fileno()]
+        err, _ = done[self.proc.stderr.fileno()]
+        return int(status.split()[0]), out, err
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait()
+        except (IOError, OSError):
+            pass
+        self.proc = None
+
+
+_xr_cli = None
+
+def get_xr_cli():
+    """Return the XrCli shared by the module."""
+    global _xr_cli
+    if _xr_cli is None:
+        _xr_cli = XrCli()
+    return _xr_cli
+
+def xr_command(module, command):
+    """Run a shell command line in the XR namespace through the shared
+    shell, failing the module if the shell is gone.
+    """
+    try:
+        return get_xr_cli().run(command)
+    except XrCliError:
+        e = get_exception()
+        module.fail_json(msg=str(e), command=command)
+
+def xr_cli(module, command):
+    """Run an XR exec command through the shared shell."""
+    return xr_command(module, 'xr_cli ' + shell_quote(command))
+
+
+class XrCliPool(object):
+    """Run XR exec commands on up to parallelism shells at the same time,
+    each worker thread with an XrCli of its own.  Commands are started in
+    the order given, so list the slow ones first.
+    """
+
+    def __init__(self, parallelism=4, shell=XR_SHELL):
+        self.parallelism = parallelism
+        self.shell = shell
+
+    def run(self, commands):
+        """Return one dict(command, rc, stdout, stderr, seconds) per
+        command, in the order of commands.  A command whose shell exited
+        has rc None and the error in stderr.
+        """
+        results = [None] * len(commands)
+        queue = list(enumerate(commands))
+        lock = threading.Lock()
+
+        def worker():
+            cli = XrCli(self.shell)
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        index, command = queue.pop(0)
+                    start = time.time()
+                    try:
+                        rc, out, err = cli.xr_cli(command)
+                    except XrCliError:
+                        e = get_exception()
+                        rc, out, err = None, '', str(e)
+                        cli.close()
+                        cli = XrCli(self.shell)
+                    results[index] = dict(command=command, rc=rc,
+                                          stdout=out, stderr=err,
+                                          seconds=round(time.time() - start,
+                                                        3))
+            finally:
+                cli.close()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(min(self.parallelism, len(commands)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+def xr_cli_parallel(module, commands, parallelism=4):
+    """Run XR exec commands through an XrCliPool, failing the module if a
+    shell is gone.
+    """
+    results = XrCliPool(parallelism).run(commands)
+    for result in results:
+        if result['rc'] is None:
+            module.fail_json(msg=result['stderr'], command=result['command'])
+    return results